@@ -0,0 +1,87 @@
+import sqlite3
+from compatibility import donor_groups, normalize_group, preference_order
+from inventory import consume_lots, expire_lots
+
+
+def fulfilment_status(req_units, fulfilled):
+    if fulfilled >= req_units:
+        return "Fulfilled"
+    if fulfilled > 0:
+        return "Partially Fulfilled"
+    return "Pending"
+
+
+def read_stock(conn, groups):
+    marks = ",".join("?" * len(groups))
+    rows = conn.execute(
+        f"SELECT blood_group, available_units FROM BloodStock WHERE blood_group IN ({marks})",
+        tuple(groups),
+    )
+    return dict(rows)
+
+
+def plan_draws(recipient_group, units, stock):
+    # [(blood_group, units)] to take from the compatible stock, best first
+    draws = []
+    for group in preference_order(recipient_group, stock):
+        if units <= 0:
+            break
+        take = min(stock[group], units)
+        draws.append((group, take))
+        units -= take
+    return draws
+
+
+def take_stock(conn, draws):
+    for group, units in draws:
+        # guarded decrement: refuses to take more than is there
+        reserved = conn.execute(
+            """
+            UPDATE BloodStock
+            SET available_units = available_units - ?
+            WHERE blood_group=? AND available_units >= ?
+            RETURNING available_units
+            """,
+            (units, group, units),
+        ).fetchone()
+        if reserved is None:
+            raise sqlite3.OperationalError(f"stock for {group} changed during reservation")
+        consume_lots(conn, group, units)
+
+
+def record_allocations(conn, request_id, draws):
+    conn.executemany(
+        "INSERT INTO RequestAllocation (request_id, blood_group, units) VALUES (?, ?, ?)",
+        [(request_id, group, units) for group, units in draws],
+    )
+
+
+def allocate_request(conn, recipient_name, blood_group, req_units, request_date=None):
+    # reserve stock and record the request in one write transaction.
+    # BEGIN IMMEDIATE takes the write lock up front, so no other request can
+    # read the same stock level between our SELECT and UPDATE.
+    blood_group = normalize_group(blood_group)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # write off anything past its expiry before counting what is left
+        expire_lots(conn, donor_groups(blood_group))
+        stock = read_stock(conn, donor_groups(blood_group))
+        draws = plan_draws(blood_group, req_units, stock)
+        take_stock(conn, draws)
+
+        fulfilled = sum(units for _, units in draws)
+        status = fulfilment_status(req_units, fulfilled)
+        cur = conn.execute(
+            """
+            INSERT INTO Request (recipient_name, blood_group, req_units, fulfilled_units, status, request_date)
+            VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+            """,
+            (recipient_name, blood_group, req_units, fulfilled, status, request_date),
+        )
+        record_allocations(conn, cur.lastrowid, draws)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return cur.lastrowid, status, fulfilled, draws
@@ -0,0 +1,270 @@
+# api.py - versioned JSON API (/api/v1) for kiosks and hospital integrations
+#
+# list responses are columnar: {"fields": [...], "rows": [[...], ...]}
+# ?fields=a,b picks columns; ETag/If-None-Match answers 304 for unchanged
+# resources without running their query.
+import hashlib
+import json
+import sqlite3
+from datetime import datetime
+
+from flask import Blueprint, Response, request, session
+
+from allocation import allocate_request
+from compatibility import BLOOD_GROUPS, normalize_group
+from db_pool import get_request_db
+from donor_search import MAX_LIMIT as SEARCH_MAX_LIMIT, SEARCH_LIMIT, search as search_donors
+from fragments import table_versions
+from ingest import register_walk_in
+from pagination import active_filters, filter_conditions, keyset_page
+from stats import stats
+from events import publish_stock
+import ingest
+
+api = Blueprint("api_v1", __name__, url_prefix="/api/v1")
+
+# resource -> (table, key, selectable columns, {filter arg: condition})
+RESOURCES = {
+    "donors": (
+        "Donor", "donor_id",
+        ("donor_id", "name", "blood_group", "contact", "city", "aadhaar", "camp_location"),
+        {"blood_group": "blood_group = ?", "city": "city = ?", "name": "name = ?", "aadhaar": "aadhaar = ?"},
+    ),
+    "requests": (
+        "Request", "request_id",
+        ("request_id", "recipient_name", "blood_group", "req_units", "fulfilled_units", "status", "request_date"),
+        {
+            "status": "status = ?",
+            "blood_group": "blood_group = ?",
+            "recipient_name": "recipient_name = ?",
+            "date_from": "request_date >= ?",
+            "date_to": "request_date < date(?, '+1 day')",
+        },
+    ),
+}
+
+
+def dumps(data):
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def reply(data, status=200, etag=None):
+    response = Response(dumps(data), status=status, mimetype="application/json")
+    if etag:
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def error(message, status):
+    return reply({"error": message}, status)
+
+
+def make_etag(*parts):
+    return hashlib.sha1(dumps(parts).encode()).hexdigest()[:20]
+
+
+def not_modified(etag):
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def selected_fields(columns, key):
+    # ?fields=a,b -> validated column list (the key always comes first)
+    wanted = [f.strip() for f in request.args.get("fields", "").split(",") if f.strip()]
+    unknown = [f for f in wanted if f not in columns]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    return [key] + [f for f in wanted if f != key] if wanted else list(columns)
+
+
+def require(role=None):
+    # JSON 401/403 instead of the HTML routes' redirect
+    if "role" not in session:
+        return error("login required", 401)
+    if role and session.get("role") != role:
+        return error(f"{role} only", 403)
+    return None
+
+
+def list_resource(name):
+    table, key, columns, clauses = RESOURCES[name]
+    try:
+        fields = selected_fields(columns, key)
+    except ValueError as e:
+        return error(str(e), 400)
+
+    # the table's version pins the representation; args pick the slice
+    etag = make_etag(name, table_versions().get(table, 0), sorted(request.args.items(multi=True)))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    filters = active_filters(clauses)
+    if "blood_group" in filters:
+        filters["blood_group"] = normalize_group(filters["blood_group"])
+    conditions, params = filter_conditions(filters, clauses)
+    page = keyset_page(
+        get_request_db().cursor(), f"SELECT {', '.join(fields)} FROM {table}", key, conditions, params,
+        descending=name == "requests",
+    )
+    return reply({"fields": fields, "rows": page["rows"], "next": page["next"], "prev": page["prev"]}, etag=etag)
+
+
+# ----------------- STOCK -----------------
+
+def stock_reply(snapshot):
+    data = {
+        "fields": ["blood_group", "available_units"],
+        "rows": [list(pair) for pair in zip(snapshot["chart_labels"], snapshot["chart_values"])],
+        "total": snapshot["stock"],
+    }
+    etag = make_etag(data)
+    return not_modified(etag) or reply(data, etag=etag)
+
+
+@api.route("/stock")
+def stock():
+    denied = require()
+    if denied:
+        return denied
+    return stock_reply(stats.get(get_request_db(), table_versions()))
+
+
+# ----------------- DONORS -----------------
+
+@api.route("/donors")
+def donors():
+    return require("admin") or list_resource("donors")
+
+
+@api.route("/donors/search")
+def donor_search():
+    # typeahead: ?q=ram sha&blood_group=O-&city=Pune&limit=10
+    denied = require("admin")
+    if denied:
+        return denied
+    limit = min(max(request.args.get("limit", SEARCH_LIMIT, type=int), 1), SEARCH_MAX_LIMIT)
+    rows = search_donors(
+        get_request_db(),
+        request.args.get("q", ""),
+        normalize_group(request.args.get("blood_group", "")) or None,
+        request.args.get("city", "").strip() or None,
+        limit,
+    )
+    return reply({"fields": ["donor_id", "name", "blood_group", "city"], "rows": [list(row) for row in rows]})
+
+
+@api.route("/donors/<int:donor_id>")
+def donor(donor_id):
+    denied = require("admin")
+    if denied:
+        return denied
+    table, key, columns, _ = RESOURCES["donors"]
+    try:
+        fields = selected_fields(columns, key)
+    except ValueError as e:
+        return error(str(e), 400)
+
+    etag = make_etag("donor", donor_id, table_versions().get(table, 0), fields)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    row = get_request_db().execute(f"SELECT {', '.join(fields)} FROM {table} WHERE {key} = ?", (donor_id,)).fetchone()
+    if not row:
+        return error("donor not found", 404)
+    return reply(dict(zip(fields, row)), etag=etag)
+
+
+# ----------------- REQUESTS -----------------
+
+@api.route("/requests", methods=["GET"])
+def requests_list():
+    return require("admin") or list_resource("requests")
+
+
+@api.route("/requests", methods=["POST"])
+def submit_request():
+    # {"recipient_id": 1, "units": 450} or {"recipient_name": .., "blood_group": .., "units": ..}
+    denied = require("admin")
+    if denied:
+        return denied
+    body = request.get_json(silent=True) or {}
+    try:
+        units = int(body.get("units", 0))
+    except (TypeError, ValueError):
+        units = 0
+    if units <= 0:
+        return error("units must be a positive integer", 400)
+
+    conn = get_request_db()
+    if body.get("recipient_id") is not None:
+        recipient = conn.execute(
+            "SELECT name, blood_group FROM Recipient WHERE recipient_id=?", (body["recipient_id"],)
+        ).fetchone()
+        if not recipient:
+            return error("recipient not found", 404)
+        name, group = recipient
+    else:
+        name, group = body.get("recipient_name"), normalize_group(body.get("blood_group") or "")
+        if not name or group not in BLOOD_GROUPS:
+            return error("recipient_id, or recipient_name and a valid blood_group, required", 400)
+
+    try:
+        request_id, status, fulfilled, draws = allocate_request(conn, name, group, units)
+    except sqlite3.Error as e:
+        return error(f"database error: {e}", 503)
+    publish_stock(conn, [g for g, _ in draws])
+    return reply(
+        {
+            "request_id": request_id,
+            "status": status,
+            "fulfilled_units": fulfilled,
+            "draws": [{"blood_group": g, "units": u} for g, u in draws],
+        },
+        201,
+    )
+
+
+# ----------------- CAMP REGISTRATION -----------------
+
+@api.route("/camps/<int:camp_id>/registrations", methods=["POST"])
+def register(camp_id):
+    # walk-in registration, {"donor_name": .., "amount": .., "donor_id": optional}
+    denied = require("admin")
+    if denied:
+        return denied
+    body = request.get_json(silent=True) or {}
+    donor_name = body.get("donor_name")
+    try:
+        amount = int(body.get("amount", 0))
+    except (TypeError, ValueError):
+        amount = 0
+    if not donor_name or amount <= 0:
+        return error("donor_name and a positive amount required", 400)
+    donor_id = body.get("donor_id")
+    if donor_id is not None and not isinstance(donor_id, int):
+        return error("donor_id must be an integer", 400)
+
+    date = datetime.now().strftime("%Y-%m-%d")
+    if ingest.journal:
+        ingest.journal.append(
+            "walk_in", camp_id=camp_id, donor_name=donor_name, amount=amount, donation_date=date, donor_id=donor_id,
+        )
+        return reply({"status": "accepted"}, 202)
+
+    conn = get_request_db()
+    try:
+        group = register_walk_in(conn.cursor(), camp_id, donor_name, amount, date, donor_id)
+        conn.commit()
+    except sqlite3.IntegrityError as e:
+        conn.rollback()
+        return error(f"registration rejected: {e}", 409)
+    except sqlite3.Error as e:
+        conn.rollback()
+        return error(f"database error: {e}", 503)
+    ingest.after_batch(conn, [group] if group else [])
+    return reply({"status": "registered", "blood_group": group}, 201)
@@ -1,12 +1,64 @@
 # app.py
+import os
 from flask import Flask
 from routes import register_routes
+from api import api
+import db_pool
+import profiling
+import fragments
+from matcher import matcher
+from inventory import ExpirySweeper
+import ingest
+import events
+import async_views
+from db import init_db
 
 app = Flask(__name__)
 app.secret_key = "secret_key_123"
 
-# Register routes from routes.py
+# Migrate the schema before serving (one pragma read when it is current)
+init_db()
+
+# Per-route timings and the slow-query log; pooled connections are traced,
+# so this goes before anything opens one
+profiling.init_app(app, db_pool.pool)
+
+# One pooled DB connection per request
+db_pool.init_app(app)
+
+# Fragment cache, template bytecode cache and render timings
+fragments.init_app(app)
+
+
+def start_background():
+    # per-process state and threads. serve.py preloads this module in the
+    # gunicorn master (LIFELINK_PRELOAD=1) and calls this in each worker
+    # after the fork, since threads do not survive one
+
+    # Load open requests waiting for stock
+    with db_pool.pool.connection() as conn:
+        matcher.load(conn)
+
+    # Expire out-of-date blood lots in the background
+    ExpirySweeper(db_pool.pool).start()
+
+    # Camp-day intake: replay and drain the donation journal when INGEST_MODE=journal
+    ingest.start(db_pool.pool)
+
+    # Live events from every worker process when EVENT_MODE=relay
+    events.start()
+
+
+if not os.environ.get("LIFELINK_PRELOAD"):
+    start_background()
+
+# Register routes from routes.py, and the JSON API under /api/v1
 register_routes(app)
+app.register_blueprint(api)
+
+# Async dashboards, stock and unread count on bounded DB threads (503 when
+# overloaded), served from asgi.py's event loop when ASYNC_VIEWS=1
+async_views.init_app(app)
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,129 @@
+# asgi.py - ASGI entry point: /events on the event loop, the rest through Flask
+# usage: python serve.py (its default worker), or uvicorn asgi:application
+#
+# an SSE subscriber here is a coroutine parked on hub.wait_async between
+# events: an idle dashboard costs a socket and a few KB, no thread, so
+# thousands of them leave the request threads to the pages. Every other
+# request goes to the Flask app on a pool of WEB_THREADS threads (a2wsgi),
+# as under a threaded WSGI server, except the async views (ASYNC_VIEWS=1,
+# async_views.py): those run on the loop too, awaiting their reads on the
+# DB threads, so they are not capped at WEB_THREADS requests in flight.
+import asyncio
+import io
+import os
+
+from a2wsgi import WSGIMiddleware
+from a2wsgi.wsgi import build_environ
+from flask import request, session
+from werkzeug.exceptions import HTTPException
+
+import async_views
+import events
+from app import app as flask_app
+
+THREADS = int(os.environ.get("WEB_THREADS", 4))   # at most db_pool.POOL_SIZE
+
+SSE_HEADERS = [
+    (b"content-type", b"text/event-stream; charset=utf-8"),
+    (b"cache-control", b"no-cache"),
+    (b"x-accel-buffering", b"no"),
+]
+
+
+class Application:
+    def __init__(self, app, threads=THREADS, views=None):
+        self.app = app
+        self.wsgi = WSGIMiddleware(app, workers=threads)
+        # endpoint -> async view served on the loop
+        if views is None:
+            views = async_views.VIEWS if async_views.ASYNC_VIEWS else {}
+        self.views = views
+        self.urls = app.url_map.bind("localhost")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            if scope["path"] == "/events":
+                return await self.events(scope, receive, send)
+            view = self.async_view(scope)
+            if view:
+                return await self.dispatch(scope, send, view)
+        return await self.wsgi(scope, receive, send)
+
+    def async_view(self, scope):
+        if not self.views or scope["method"] not in ("GET", "HEAD"):
+            return None
+        try:
+            endpoint, _ = self.urls.match(scope["path"], scope["method"])
+        except HTTPException:   # 404, 405, or a redirect: Flask's to answer
+            return None
+        return self.views.get(endpoint)
+
+    async def dispatch(self, scope, send, view):
+        # Flask.wsgi_app for an async view, with the view awaited on this loop
+        environ = build_environ(scope, io.BytesIO())
+        ctx = self.app.request_context(environ)
+        error = None
+        try:
+            try:
+                ctx.push()
+                response = await async_views.full_dispatch(self.app, view)
+            except Exception as e:
+                error = e
+                response = self.app.handle_exception(e)
+            body, status, headers = response.get_wsgi_response(environ)
+            try:
+                body = b"".join(body)
+            finally:
+                response.close()
+        finally:
+            if error is not None and self.app.should_ignore_error(error):
+                error = None
+            ctx.pop(error)
+
+        await send({
+            "type": "http.response.start",
+            "status": int(status.split(" ", 1)[0]),
+            "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def subscriber(self, scope):
+        # events.subscription() for the Flask session in the request's cookie
+        with self.app.request_context(build_environ(scope, io.BytesIO())):
+            return events.subscription(session, request.headers, request.args)
+
+    async def events(self, scope, receive, send):
+        # the /events view of routes.py, without a thread per stream
+        subscriber = self.subscriber(scope)
+        if subscriber is None:
+            await send({
+                "type": "http.response.start",
+                "status": 401,
+                "headers": [(b"content-type", b"application/json")],
+            })
+            await send({"type": "http.response.body", "body": b'{"error":"login required"}'})
+            return
+
+        await send({"type": "http.response.start", "status": 200, "headers": SSE_HEADERS})
+        pump = asyncio.ensure_future(self.pump(subscriber, send))
+        gone = asyncio.ensure_future(self.disconnected(receive))
+        try:
+            await asyncio.wait((pump, gone), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            pump.cancel()
+            gone.cancel()
+
+    async def pump(self, subscriber, send):
+        frames = events.astream(*subscriber)
+        try:
+            async for text in frames:
+                await send({"type": "http.response.body", "body": text.encode(), "more_body": True})
+        finally:
+            await frames.aclose()
+
+    async def disconnected(self, receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+
+application = Application(flask_app)
@@ -0,0 +1,120 @@
+# async_views.py - async versions of the read-heavy endpoints
+#
+# off by default. With ASYNC_VIEWS=1, asgi.py serves these endpoints on its
+# event loop instead of handing them to a request thread (URLs and url_for
+# names unchanged; the sync views still answer under a WSGI server). Their
+# reads run on the DB threads of db_async.py, independent ones
+# concurrently, so a loop keeps many requests in flight while only the DB
+# threads block; when the DB queue is full the request gets 503 +
+# Retry-After. Access checks and pages are dashboards.py's, as in the sync
+# views; a fragment's rows are still only queried when the fragment is
+# stale, by the thread rendering the page.
+import asyncio
+import os
+
+from flask import g, jsonify, request, request_started, session
+
+import api
+import db_async
+import profiling
+from db_async import call, executor
+from dashboards import (
+    admin_page, donor_summary, link_donor, notice_state, require_admin, require_user, require_user_json,
+    user_donor, user_missing, user_page,
+)
+from db_pool import get_request_db
+from fragments import LazyRows, read_versions
+from notifications import unread_count
+from stats import stats
+
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS", "0") == "1"
+
+
+def deferred(fn, *args):
+    # LazyRows whose query runs on a DB thread, on a fragment miss only
+    return LazyRows(lambda: executor.submit(fn, *args).result())
+
+
+def versioned_snapshot(conn):
+    # the request's TableVersion rows and the stats snapshot they key, in one job
+    versions = read_versions(conn)
+    return versions, stats.get(conn, versions)
+
+
+async def on_thread(fn, *args):
+    # blocking work (a pooled-connection write, a page render that may
+    # query stale fragments) off the event loop, in this request's context
+    trace = profiling.current_trace()
+
+    def run():
+        with profiling.use_trace(trace):
+            return fn(*args)
+
+    return await asyncio.to_thread(run)
+
+
+async def snapshot():
+    versions, snap = await call(versioned_snapshot)
+    # fragment() reads the versions from g, so the request never takes a
+    # pooled connection
+    g.table_versions = versions
+    return snap
+
+
+async def admin_dashboard():
+    return require_admin() or await on_thread(admin_page, await snapshot(), deferred)
+
+
+async def user_dashboard():
+    denied = require_user()
+    if denied:
+        return denied
+
+    user_id = session["user_id"]
+    user_exists, donor_row = await call(user_donor, user_id)
+    if not user_exists:
+        return user_missing()
+    # first visit without a linked donor: the write goes through the
+    # request's own connection, the DB threads are read-only
+    donor_id, blood_group = donor_row or await on_thread(
+        lambda: link_donor(get_request_db(), user_id, session["username"])
+    )
+
+    summary, notices = await asyncio.gather(call(donor_summary, donor_id), call(notice_state, user_id))
+    return await on_thread(user_page, blood_group, summary, notices, deferred)
+
+
+async def notifications_unread():
+    return require_user_json() or jsonify({"unread": await call(unread_count, session["user_id"])})
+
+
+async def stock():
+    return api.require() or api.stock_reply(await snapshot())
+
+
+# endpoint -> async view
+VIEWS = {
+    "admin_dashboard": admin_dashboard,
+    "user_dashboard": user_dashboard,
+    "notifications_unread": notifications_unread,
+    "api_v1.stock": stock,
+}
+
+
+async def full_dispatch(app, view):
+    # Flask.full_dispatch_request for an async view, awaited on the caller's
+    # loop: hooks, error handlers and after_request as for the sync views
+    try:
+        request_started.send(app, _async_wrapper=app.ensure_sync)
+        rv = app.preprocess_request()
+        if rv is None:
+            rv = await view(**request.view_args)
+    except Exception as e:
+        rv = app.handle_user_exception(e)
+    return app.finalize_request(rv)
+
+
+def init_app(app):
+    # asgi.py dispatches VIEWS itself (when ASYNC_VIEWS=1); the app only
+    # needs the 503 handler for a full DB queue, which only they can hit
+    db_async.init_app(app)
@@ -0,0 +1,504 @@
+# bench.py - quick latency numbers for the hot data paths
+# usage: python bench.py [name ...]
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+import db
+
+
+def fresh_db():
+    # point the app at a throwaway database file
+    db.DB_FILE = os.path.join(tempfile.mkdtemp(), "bench.db")
+    db.init_db()
+    return db.get_db()
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    pct = lambda p: samples[min(len(samples) - 1, int(len(samples) * p))] * 1000
+    print(
+        f"{name:<28} n={len(samples):<7} mean={statistics.mean(samples) * 1000:.3f}ms "
+        f"p50={pct(0.50):.3f}ms p95={pct(0.95):.3f}ms p99={pct(0.99):.3f}ms"
+    )
+
+
+def bench_allocation(n=5000):
+    from allocation import allocate_request
+    from compatibility import BLOOD_GROUPS
+
+    conn = fresh_db()
+    conn.executemany(
+        "INSERT INTO BloodStock (blood_group, available_units) VALUES (?, ?)",
+        [(g, 10_000_000) for g in BLOOD_GROUPS],
+    )
+    conn.commit()
+
+    rng = random.Random(1)
+    samples = []
+    for i in range(n):
+        group = rng.choice(BLOOD_GROUPS)
+        start = time.perf_counter()
+        allocate_request(conn, f"recipient{i}", group, rng.randint(100, 900))
+        samples.append(time.perf_counter() - start)
+    report("allocation (8 groups)", samples)
+
+
+def bench_camp_dates(n=1_000_000, repeat=20):
+    # today's-camps lookup: date(camp_date) scan vs. range seek on idx_camp_date
+    from datetime import date, timedelta
+
+    conn = fresh_db()
+    start_day = date.today() - timedelta(days=n // 100)  # today sits mid-table
+    conn.executemany(
+        "INSERT INTO Camp (camp_name, location, camp_date) VALUES (?, ?, ?)",
+        ((f"Camp {i}", "City", (start_day + timedelta(days=i // 50)).isoformat()) for i in range(n)),
+    )
+    conn.commit()
+
+    queries = {
+        f"camps date() scan ({n:,})": "SELECT camp_id FROM Camp WHERE date(camp_date) = date('now')",
+        f"camps range seek ({n:,})": (
+            "SELECT camp_id FROM Camp WHERE camp_date >= date('now') AND camp_date < date('now', '+1 day')"
+        ),
+    }
+    for name, sql in queries.items():
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(sql).fetchall()
+            samples.append(time.perf_counter() - start)
+        report(name, samples)
+
+
+def bench_ingest(n=5000):
+    # camp-day walk-ins: commit per POST vs. journal append + group commit
+    import ingest
+
+    def setup():
+        conn = fresh_db()
+        conn.execute("INSERT INTO Camp (camp_name, location, camp_date) VALUES ('Camp', 'City', date('now'))")
+        conn.executemany(
+            "INSERT INTO Donor (name, blood_group, aadhaar) VALUES (?, ?, ?)",
+            [(f"donor{i}", "O+", str(i)) for i in range(n)],
+        )
+        conn.commit()
+        return conn
+
+    conn = setup()
+    samples = []
+    start = time.perf_counter()
+    for i in range(n):
+        t = time.perf_counter()
+        ingest.register_walk_in(conn.cursor(), 1, f"donor{i}", 350, "2025-01-01")
+        conn.commit()
+        samples.append(time.perf_counter() - t)
+    total = time.perf_counter() - start
+    report("ingest commit per POST", samples)
+    print(f"{'':<28} {n / total:,.0f} events/s applied")
+
+    conn = setup()
+    journal = ingest.Journal(os.path.join(os.path.dirname(db.DB_FILE), "journal.jsonl"))
+    samples = []
+    start = time.perf_counter()
+    for i in range(n):
+        t = time.perf_counter()
+        journal.append("walk_in", camp_id=1, donor_name=f"donor{i}", amount=350, donation_date="2025-01-01")
+        samples.append(time.perf_counter() - t)
+    acked = time.perf_counter() - start
+    ingest.replay(conn, journal)
+    total = time.perf_counter() - start
+    report("ingest journal ack", samples)
+    print(
+        f"{'':<28} {n / acked:,.0f} events/s acked, drain {total - acked:.2f}s "
+        f"({n / (total - acked):,.0f} events/s in batches of {ingest.INGEST_BATCH})"
+    )
+
+
+def bench_stock_history(years=5, moves_per_day=200, repeat=50):
+    # history + forecast over years of movements, read from StockDaily
+    from datetime import datetime, timedelta
+    from compatibility import BLOOD_GROUPS
+    from stock_history import group_report
+
+    conn = fresh_db()
+    conn.executemany(
+        "INSERT INTO BloodStock (blood_group, available_units) VALUES (?, ?)", [(g, 0) for g in BLOOD_GROUPS]
+    )
+    rng = random.Random(1)
+    start_day = datetime.utcnow() - timedelta(days=365 * years)
+    balance = dict.fromkeys(BLOOD_GROUPS, 100_000)
+
+    def movements():
+        for day in range(365 * years + 1):
+            for i in range(moves_per_day):
+                group = rng.choice(BLOOD_GROUPS)
+                delta = rng.randint(-450, 500)
+                balance[group] = max(balance[group] + delta, 0)
+                at = start_day + timedelta(days=day, seconds=i * 86400 // moves_per_day)
+                yield group, delta, balance[group], at.strftime("%Y-%m-%d %H:%M:%S")
+
+    conn.executemany("INSERT INTO StockMovement (blood_group, delta, balance, moved_at) VALUES (?, ?, ?, ?)", movements())
+    conn.commit()
+    count = conn.execute("SELECT COUNT(*) FROM StockMovement").fetchone()[0]
+
+    for resolution, periods in (("daily", 365), ("hourly", 24 * 14)):
+        samples = []
+        for _ in range(repeat):
+            t = time.perf_counter()
+            group_report(conn, "O+", resolution, periods)
+            samples.append(time.perf_counter() - t)
+        report(f"history {resolution} x{periods} ({count:,} moves)", samples)
+
+
+def bench_render(donors=20_000, repeat=50):
+    # full page time for the heavy admin pages, fragments cold vs. warm
+    conn = fresh_db()
+    conn.executemany(
+        "INSERT INTO Donor (name, blood_group, city, aadhaar) VALUES (?, 'O+', 'City', ?)",
+        [(f"donor{i}", str(i)) for i in range(donors)],
+    )
+    conn.executemany(
+        "INSERT INTO Donation (donor_id, amount, donation_date) VALUES (?, 350, '2025-01-01')",
+        [(i % donors + 1,) for i in range(donors)],
+    )
+    conn.execute("INSERT INTO Users (username, password, role) VALUES ('admin', 'admin', 'admin')")
+    conn.commit()
+
+    from app import app
+    from fragments import fragments
+
+    client = app.test_client()
+    client.post("/login", data={"username": "admin", "password": "admin"})
+    for page in ("/admin_dashboard", "/donors", "/record_donation"):
+        for label, clear in (("cold", True), ("warm", False)):
+            samples = []
+            for _ in range(repeat):
+                if clear:
+                    fragments.clear()
+                t = time.perf_counter()
+                client.get(page)
+                samples.append(time.perf_counter() - t)
+            report(f"{page} {label}", samples)
+
+
+def bench_events(subscribers=2000, events=20):
+    # publish -> every idle subscriber woken and handed the event
+    import threading
+    from events import EventHub
+
+    hub = EventHub()
+    delivered = threading.Semaphore(0)
+
+    def subscriber():
+        last_id = 0
+        while last_id < events:
+            batch, _ = hub.wait(last_id, timeout=5)
+            for event_id, *_ in batch:
+                last_id = event_id
+                delivered.release()
+
+    threads = [threading.Thread(target=subscriber, daemon=True) for _ in range(subscribers)]
+    for t in threads:
+        t.start()
+    time.sleep(0.5)  # let them park
+
+    samples = []
+    for i in range(events):
+        t = time.perf_counter()
+        hub.publish("notification", {"n": i})
+        for _ in range(subscribers):
+            delivered.acquire()
+        samples.append(time.perf_counter() - t)
+    report(f"fan-out to {subscribers:,} threads", samples)
+
+    # the same subscribers as coroutines on one event loop (asgi.py)
+    import asyncio
+
+    async def coroutines():
+        hub = EventHub()
+        counts = [0]
+
+        async def subscriber():
+            last_id = 0
+            while last_id < events:
+                batch, _ = await hub.wait_async(last_id, timeout=5)
+                for event_id, *_ in batch:
+                    last_id = event_id
+                    counts[0] += 1
+
+        tasks = [asyncio.ensure_future(subscriber()) for _ in range(subscribers)]
+        await asyncio.sleep(0.5)
+        samples = []
+        for i in range(events):
+            t = time.perf_counter()
+            hub.publish("notification", {"n": i})
+            while counts[0] < subscribers * (i + 1):
+                await asyncio.sleep(0)
+            samples.append(time.perf_counter() - t)
+        await asyncio.gather(*tasks)
+        return samples
+
+    report(f"fan-out to {subscribers:,} coroutines", asyncio.run(coroutines()))
+
+
+def bench_notifications(users=100_000, repeat=20):
+    # targeted delivery (one INSERT ... SELECT per audience) and unread lookups
+    import notifications
+    from compatibility import BLOOD_GROUPS
+
+    conn = fresh_db()
+    rng = random.Random(1)
+    cities = [f"City{i}" for i in range(20)]
+    conn.executemany(
+        "INSERT INTO Users (user_id, username, password, role) VALUES (?, ?, 'p', 'user')",
+        ((i, f"user{i}") for i in range(1, users + 1)),
+    )
+    conn.executemany(
+        "INSERT INTO Donor (user_id, name, blood_group, city, aadhaar) VALUES (?, ?, ?, ?, ?)",
+        ((i, f"user{i}", rng.choice(BLOOD_GROUPS), rng.choice(cities), str(i)) for i in range(1, users + 1)),
+    )
+    conn.commit()
+
+    for label, audience in (("group+city", {"blood_group": "O-", "city": "City1"}), ("group", {"blood_group": "O+"})):
+        samples, delivered = [], 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            delivered = notifications.send(conn, "Shortage", "Please donate", **audience)[3]
+            conn.commit()
+            samples.append(time.perf_counter() - start)
+        report(f"send to {label} ({delivered:,})", samples)
+
+    samples = []
+    for _ in range(repeat * 100):
+        user_id = rng.randint(1, users)
+        start = time.perf_counter()
+        notifications.unread_count(conn, user_id)
+        samples.append(time.perf_counter() - start)
+    report(f"unread count ({users:,} users)", samples)
+
+
+def bench_search(donors=1_000_000, repeat=200):
+    # donor typeahead: prefix, filtered prefix and typo'd queries
+    import donor_search
+    from compatibility import BLOOD_GROUPS
+
+    conn = fresh_db()
+    rng = random.Random(1)
+    syllables = "ra me sh su re ma he ga ne ja de vi ka ri ta pa ni la ya an ar ku mo ha sa di pu ro bh ch ve".split()
+    word = lambda: "".join(rng.choice(syllables) for _ in range(rng.randint(2, 3))).capitalize()
+    first, last = [word() for _ in range(3000)], [word() for _ in range(500)]
+    cities = [f"City{i}" for i in range(20)]
+    start = time.perf_counter()
+    conn.executemany(
+        "INSERT INTO Donor (name, blood_group, city, aadhaar) VALUES (?, ?, ?, ?)",
+        (
+            (f"{rng.choice(first)} {rng.choice(last)}", rng.choice(BLOOD_GROUPS), rng.choice(cities), str(i))
+            for i in range(donors)
+        ),
+    )
+    conn.commit()
+    print(f"{'':<28} {donors / (time.perf_counter() - start):,.0f} donors/s inserted (index kept by trigger)")
+
+    names = [name for (name,) in conn.execute("SELECT name FROM Donor WHERE donor_id % 997 = 0")]
+    typo = lambda name: name[:2] + name[3] + name[2] + name[4:]
+    cases = {
+        "prefix (2 letters)": lambda name: (name[:2], None, None),
+        "prefix (first + last)": lambda name: (name.split()[0] + " " + name.split()[1][:3], None, None),
+        "prefix + group + city": lambda name: (name[:4], "O-", "City1"),
+        "prefix (2) + group + city": lambda name: (name[:2], "O-", "City1"),
+        "typo (fuzzy)": lambda name: (typo(name), None, None),
+        "typo + group + city": lambda name: (typo(name), "O-", "City1"),
+    }
+    for label, make in cases.items():
+        samples = []
+        for _ in range(repeat):
+            q, group, city = make(rng.choice(names))
+            start = time.perf_counter()
+            donor_search.search(conn, q, group, city)
+            samples.append(time.perf_counter() - start)
+        report(f"search {label}", samples)
+
+
+def bench_profiling(n=50_000):
+    # per-statement cost of the traced connection (profiling.py)
+    import profiling
+
+    fresh_db()
+    for label, factory in (("plain", sqlite3.Connection), ("traced", profiling.TracedConnection)):
+        conn = db.get_db(factory=factory)
+        conn.executemany("INSERT OR IGNORE INTO Users (user_id, username, password, role) VALUES (?, ?, 'p', 'user')",
+                         [(i, f"user{i}") for i in range(1, 1001)])
+        conn.commit()
+        samples = []
+        for i in range(n):
+            start = time.perf_counter()
+            conn.execute("SELECT username FROM Users WHERE user_id = ?", (i % 1000 + 1,)).fetchone()
+            samples.append(time.perf_counter() - start)
+        report(f"pk lookup ({label})", samples)
+        start = time.perf_counter()
+        rows = sum(1 for _ in conn.execute("SELECT user_id, username FROM Users, (SELECT 1 FROM Users LIMIT 100)"))
+        print(f"{'':<28} iterate {rows:,} rows: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+
+def bench_serve(donors=20_000, requests=3000, concurrency=16):
+    # serve.py throughput by worker-process count, loaded over HTTP by
+    # loadtest.py (the client runs here, on the same cores as the server)
+    import subprocess
+    import urllib.request
+    import loadtest
+    import synth
+
+    conn = fresh_db()
+    synth.generate(conn, donors, log=lambda line: None)
+    conn.close()
+    ctx = loadtest.load_context(db.DB_FILE, synth.SYNTH_PASSWORD)
+    cores = os.cpu_count() or 1
+    serve = os.path.join(os.path.dirname(os.path.abspath(__file__)), "serve.py")
+    print(f"{'':<28} {cores} core(s), {concurrency} concurrent clients, mixed scenario")
+
+    for workers in sorted({1, 2, cores, 2 * cores}):
+        url = f"http://127.0.0.1:{8700 + workers}"
+        server = subprocess.Popen(
+            [sys.executable, serve, "--db", db.DB_FILE, "--bind", url[7:], "--workers", str(workers)],
+            cwd=os.path.dirname(db.DB_FILE), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            for _ in range(100):
+                try:
+                    urllib.request.urlopen(url + "/login", timeout=1).read()
+                    break
+                except OSError:
+                    time.sleep(0.2)
+            result = loadtest.run(lambda: loadtest.HttpSession(url), ctx, "mixed", requests, concurrency)
+        finally:
+            server.terminate()
+            server.wait()
+        total = result["total"]
+        print(
+            f"{f'serve {workers} worker(s)':<28} {total['rps']:>7.1f} req/s "
+            f"p50={total['p50']:.2f}ms p95={total['p95']:.2f}ms p99={total['p99']:.2f}ms errors={total['errors']}"
+        )
+
+
+def bench_sse(counts=(100, 1000, 5000), publishes=5, pings=20):
+    # idle /events connections held open against serve.py (one worker, 4
+    # threads) under each worker class: what they cost the worker, whether
+    # pages still answer, and publish -> every connection has the event.
+    # The clients run here, on the same cores as the server.
+    import asyncio
+    import subprocess
+    import loadtest
+    import synth
+
+    conn = fresh_db()
+    synth.generate(conn, 2000, log=lambda line: None)
+    conn.close()
+    serve = os.path.join(os.path.dirname(os.path.abspath(__file__)), "serve.py")
+
+    def worker_stats(master):
+        with open(f"/proc/{master}/task/{master}/children") as f:
+            pid = f.read().split()[0]
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f)
+        return int(fields["VmRSS"].split()[0]) // 1024, int(fields["Threads"])
+
+    async def listen(port, cookie, received, opened):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET /events HTTP/1.1\r\nHost: x\r\nCookie: {cookie}\r\n\r\n".encode())
+        status = (await reader.readline()).split()[1]
+        opened.append(status)
+        try:
+            while status == b"200":
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.startswith(b"event: notification"):
+                    received[0] += 1
+        finally:
+            writer.close()
+
+    async def run(port, admin, n):
+        cookie = "; ".join(f"{c.name}={c.value}" for c in admin.cookies)
+        received, opened, tasks = [0], [], []
+        for _ in range(n):
+            tasks.append(asyncio.ensure_future(listen(port, cookie, received, opened)))
+            if len(tasks) % 200 == 0:
+                await asyncio.sleep(0.05)
+        while len(opened) < n:
+            await asyncio.sleep(0.05)
+        streams = opened.count(b"200")
+        await asyncio.sleep(1)
+        rss, threads = worker_stats(server.pid)
+
+        loop = asyncio.get_running_loop()
+        samples = []
+        page = loadtest.HttpSession(f"http://127.0.0.1:{port}", timeout=8)
+        for _ in range(pings):
+            start = time.perf_counter()
+            status = await loop.run_in_executor(None, page.send, "/login")
+            samples.append(time.perf_counter() - start if status == 200 else 8.0)
+
+        fanout = []
+        for i in range(publishes):
+            expected = received[0] + streams
+            start = time.perf_counter()
+            await loop.run_in_executor(None, admin.send, "/send_notification", {"title": f"t{i}", "message": "m"})
+            while received[0] < expected and time.perf_counter() - start < 30:
+                await asyncio.sleep(0.001)
+            fanout.append(time.perf_counter() - start)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return streams, rss, threads, samples, fanout
+
+    for label, worker_class in (("asgi", "uvicorn_worker.UvicornWorker"), ("gthread", "gthread")):
+        port = 8790 + len(label)
+        server = subprocess.Popen(
+            [sys.executable, serve, "--db", db.DB_FILE, "--bind", f"127.0.0.1:{port}", "--workers", "1",
+             "--threads", "4", "--worker-class", worker_class],
+            cwd=os.path.dirname(db.DB_FILE), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            admin = loadtest.HttpSession(f"http://127.0.0.1:{port}")
+            for _ in range(100):
+                try:
+                    loadtest.login(admin, "admin", synth.SYNTH_PASSWORD)
+                    break
+                except OSError:
+                    time.sleep(0.2)
+            rss, threads = worker_stats(server.pid)
+            print(f"{f'sse {label}, idle':<28} worker rss={rss}MB threads={threads}")
+            for n in counts:
+                streams, rss, threads, samples, fanout = asyncio.run(run(port, admin, n))
+                print(f"{f'sse {label}, {n:,} clients':<28} {streams:,} streams, {n - streams:,} refused (503), "
+                      f"worker rss={rss}MB threads={threads}")
+                report(f"{'':<4}GET /login", samples)
+                report(f"{'':<4}fan-out to {streams:,}", fanout)
+        finally:
+            server.terminate()
+            server.wait()
+
+
+BENCHMARKS = {
+    "allocation": bench_allocation,
+    "camp_dates": bench_camp_dates,
+    "ingest": bench_ingest,
+    "stock_history": bench_stock_history,
+    "render": bench_render,
+    "events": bench_events,
+    "notifications": bench_notifications,
+    "search": bench_search,
+    "profiling": bench_profiling,
+    "serve": bench_serve,
+    "sse": bench_sse,
+}
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
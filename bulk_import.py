@@ -0,0 +1,260 @@
+# bulk_import.py - streaming CSV/JSONL import of donors, recipients and donations
+# usage: python bulk_import.py donors|recipients|donations FILE [--update] [--batch N]
+import argparse
+import csv
+import functools
+import io
+import json
+import sqlite3
+from datetime import datetime
+
+from compatibility import BLOOD_GROUPS, normalize_group
+from inventory import expiry_for
+from migrations import BULK_DEFERRED
+
+BATCH_SIZE = 5000     # rows per transaction
+MAX_ERRORS_KEPT = 1000
+
+# Verhoeff tables (the Aadhaar check digit)
+_D = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9), (1, 2, 3, 4, 0, 6, 7, 8, 9, 5), (2, 3, 4, 0, 1, 7, 8, 9, 5, 6),
+    (3, 4, 0, 1, 2, 8, 9, 5, 6, 7), (4, 0, 1, 2, 3, 9, 5, 6, 7, 8), (5, 9, 8, 7, 6, 0, 4, 3, 2, 1),
+    (6, 5, 9, 8, 7, 1, 0, 4, 3, 2), (7, 6, 5, 9, 8, 2, 1, 0, 4, 3), (8, 7, 6, 5, 9, 3, 2, 1, 0, 4),
+    (9, 8, 7, 6, 5, 4, 3, 2, 1, 0),
+)
+_P = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9), (1, 5, 7, 6, 2, 8, 3, 0, 9, 4), (5, 8, 0, 3, 7, 9, 6, 1, 4, 2),
+    (8, 9, 1, 6, 0, 4, 3, 5, 2, 7), (9, 4, 5, 3, 1, 2, 6, 8, 7, 0), (4, 2, 8, 6, 5, 7, 3, 9, 0, 1),
+    (2, 7, 9, 3, 8, 0, 6, 4, 1, 5), (7, 0, 4, 6, 9, 1, 3, 2, 5, 8),
+)
+
+
+_INV = (0, 4, 3, 2, 1, 5, 6, 7, 8, 9)
+
+# the _P row for each of the 12 Aadhaar positions (rightmost first), by digit character
+_POSITIONS = tuple({str(d): _P[i % 8][d] for d in range(10)} for i in range(12))
+
+
+def with_check_digit(digits):
+    # 11 digits -> 12-digit number whose last digit is the Verhoeff check
+    check = 0
+    for i, digit in enumerate(reversed(digits)):
+        check = _D[check][_P[(i + 1) % 8][int(digit)]]
+    return digits + str(_INV[check])
+
+
+def valid_aadhaar(value):
+    # 12 digits, not starting with 0/1, Verhoeff checksum
+    if len(value) != 12 or not value.isascii() or not value.isdigit() or value[0] in "01":
+        return False
+    check = 0
+    for position, digit in zip(_POSITIONS, reversed(value)):
+        check = _D[check][position[digit]]
+    return check == 0
+
+
+def _text(row, name, required=False):
+    value = (row.get(name) or "").strip()
+    if required and not value:
+        raise ValueError(f"missing {name}")
+    return value
+
+
+def _group(row):
+    group = normalize_group(_text(row, "blood_group", required=True))
+    if group not in BLOOD_GROUPS:
+        raise ValueError(f"invalid blood_group {row.get('blood_group')!r}")
+    return group
+
+
+def _aadhaar(row, name="aadhaar"):
+    value = _text(row, name, required=True).replace(" ", "")
+    if not valid_aadhaar(value):
+        raise ValueError(f"invalid {name} {value!r}")
+    return value
+
+
+def _donor(row):
+    return (
+        _text(row, "name", required=True), _group(row), _text(row, "contact"),
+        _text(row, "city"), _aadhaar(row), _text(row, "camp_location"),
+    )
+
+
+def _recipient(row):
+    return (_text(row, "name", required=True), _group(row), _text(row, "contact"), _aadhaar(row))
+
+
+@functools.lru_cache(maxsize=4096)
+def _expiry(donation_date):
+    # checks the date too; an import repeats the same few days many times
+    datetime.strptime(donation_date, "%Y-%m-%d")
+    return expiry_for(donation_date)
+
+
+def _donation(row):
+    amount = int(_text(row, "amount", required=True))
+    if amount <= 0:
+        raise ValueError("amount must be positive")
+    donation_date = _text(row, "donation_date", required=True)
+    return (amount, donation_date, _expiry(donation_date), _text(row, "camp_location"),
+            _aadhaar(row, "donor_aadhaar"))
+
+
+# kind -> (row validator, insert statement, conflict update for --update)
+KINDS = {
+    "donors": (
+        _donor,
+        """
+        INSERT INTO Donor (name, blood_group, contact, city, aadhaar, camp_location)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(aadhaar) DO {}
+        """,
+        """UPDATE SET name=excluded.name, blood_group=excluded.blood_group, contact=excluded.contact,
+        city=excluded.city, camp_location=excluded.camp_location""",
+    ),
+    "recipients": (
+        _recipient,
+        """
+        INSERT INTO Recipient (name, blood_group, contact, aadhaar)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(aadhaar) DO {}
+        """,
+        "UPDATE SET name=excluded.name, blood_group=excluded.blood_group, contact=excluded.contact",
+    ),
+    # historical donations: linked to the donor by Aadhaar, stock is not touched
+    "donations": (
+        _donation,
+        """
+        INSERT INTO Donation (donor_id, amount, donation_date, expiry_date, camp_location)
+        SELECT donor_id, ?, ?, ?, ? FROM Donor WHERE aadhaar = ?
+        """,
+        None,
+    ),
+}
+
+
+# kind -> table written
+TABLES = {"donors": "Donor", "recipients": "Recipient", "donations": "Donation"}
+
+
+def catch_up(table):
+    # the held-off triggers' work for a batch's rows, rowid > :last
+    return [sql for _, deferred_table, _, sql in BULK_DEFERRED if deferred_table == table]
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.skipped = 0    # Aadhaar already present, or unknown donor for donations
+        self.error_count = 0
+        self.errors = []    # (line, message), first MAX_ERRORS_KEPT only
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS_KEPT:
+            self.errors.append((line, message))
+
+    def summary(self):
+        return (
+            f"{self.rows} rows: {self.inserted} inserted, {self.skipped} skipped, "
+            f"{self.error_count} invalid"
+        )
+
+
+def read_rows(stream, fmt):
+    # lazily yield (line number, dict) from a text stream
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == "jsonl":
+        for line_no, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, e
+    else:
+        raise ValueError(f"unsupported format {fmt!r}")
+
+
+def guess_format(filename):
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def _flush(conn, kind, sql, batch, report):
+    # one transaction: the table's per-row INSERT triggers held off by its
+    # BulkLoad row, rows in, the triggers' work done set-wise. The row is
+    # gone again before commit, so other writers never skip their triggers;
+    # UPDATE triggers (--update conflicts) fire per row as usual.
+    table = TABLES[kind]
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("INSERT INTO BulkLoad (name) VALUES (?)", (table,))
+        last = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+        cur = conn.executemany(sql, batch)
+        rowcount = cur.rowcount
+        conn.execute("DELETE FROM BulkLoad WHERE name = ?", (table,))
+        for statement in catch_up(table):
+            conn.execute(statement, {"last": last})
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    report.inserted += rowcount
+    report.skipped += len(batch) - rowcount
+
+
+def import_stream(conn, kind, stream, fmt="csv", update=False, batch_size=BATCH_SIZE):
+    # validate rows as they stream in and write them in sized transactions
+    validate, sql, update_clause = KINDS[kind]
+    sql = sql.format(update_clause if update and update_clause else "NOTHING")
+    report = ImportReport()
+    batch = []
+    for line_no, row in read_rows(stream, fmt):
+        report.rows += 1
+        try:
+            if isinstance(row, Exception) or not isinstance(row, dict):
+                raise ValueError(f"unreadable row: {row}")
+            batch.append(validate(row))
+        except ValueError as e:
+            report.error(line_no, str(e))
+            continue
+        if len(batch) >= batch_size:
+            _flush(conn, kind, sql, batch, report)
+            batch = []
+    if batch:
+        _flush(conn, kind, sql, batch, report)
+    return report
+
+
+def import_upload(conn, kind, file_storage, update=False):
+    # Werkzeug upload -> decoded text stream, parsed without loading it whole
+    stream = io.TextIOWrapper(file_storage.stream, encoding="utf-8-sig", newline="")
+    return import_stream(conn, kind, stream, guess_format(file_storage.filename or ""), update)
+
+
+if __name__ == "__main__":
+    import time
+    import db
+
+    parser = argparse.ArgumentParser(description="Bulk import into the blood bank DB")
+    parser.add_argument("kind", choices=sorted(KINDS))
+    parser.add_argument("file")
+    parser.add_argument("--format", choices=("csv", "jsonl"))
+    parser.add_argument("--update", action="store_true", help="update rows whose Aadhaar already exists")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    conn = db.get_db()
+    start = time.perf_counter()
+    with open(args.file, encoding="utf-8-sig", newline="") as f:
+        report = import_stream(conn, args.kind, f, args.format or guess_format(args.file), args.update, args.batch)
+    elapsed = time.perf_counter() - start
+
+    for line, message in report.errors:
+        print(f"line {line}: {message}")
+    print(f"{report.summary()} in {elapsed:.1f}s ({report.rows / max(elapsed, 1e-9):,.0f} rows/s)")
@@ -0,0 +1,58 @@
+BLOOD_GROUPS = ("O-", "O+", "A-", "A+", "B-", "B+", "AB-", "AB+")
+_INDEX = {g: i for i, g in enumerate(BLOOD_GROUPS)}
+
+
+def _can_donate(donor, recipient):
+    # red cells: donor ABO antigens must be a subset of the recipient's,
+    # and Rh- recipients can only take Rh- blood
+    donor_abo, donor_rh = donor[:-1], donor[-1]
+    recipient_abo, recipient_rh = recipient[:-1], recipient[-1]
+    abo_ok = donor_abo == "O" or donor_abo == recipient_abo or recipient_abo == "AB"
+    rh_ok = donor_rh == "-" or recipient_rh == "+"
+    return abo_ok and rh_ok
+
+
+# COMPATIBLE[recipient][donor], precomputed once
+COMPATIBLE = tuple(
+    tuple(_can_donate(donor, recipient) for donor in BLOOD_GROUPS) for recipient in BLOOD_GROUPS
+)
+
+DONORS_FOR = {
+    r: tuple(d for d in BLOOD_GROUPS if COMPATIBLE[_INDEX[r]][_INDEX[d]]) for r in BLOOD_GROUPS
+}
+RECIPIENTS_FOR = {
+    d: tuple(r for r in BLOOD_GROUPS if COMPATIBLE[_INDEX[r]][_INDEX[d]]) for d in BLOOD_GROUPS
+}
+
+
+def normalize_group(group):
+    # "o +", "ab+" -> "O+", "AB+"; anything unrecognised is returned as-is
+    if group is None:
+        return group
+    cleaned = group.replace(" ", "").upper()
+    return cleaned if cleaned in _INDEX else group
+
+
+def can_donate(donor_group, recipient_group):
+    d, r = normalize_group(donor_group), normalize_group(recipient_group)
+    if d in _INDEX and r in _INDEX:
+        return COMPATIBLE[_INDEX[r]][_INDEX[d]]
+    return d == r
+
+
+def donor_groups(recipient_group):
+    # groups a recipient can receive from; unknown groups only match exactly
+    return DONORS_FOR.get(normalize_group(recipient_group), (recipient_group,))
+
+
+def recipient_groups(donor_group):
+    return RECIPIENTS_FOR.get(normalize_group(donor_group), (donor_group,))
+
+
+def preference_order(recipient_group, stock):
+    # exact match first, then compatible groups with the most units on hand.
+    # stock maps blood_group -> available_units.
+    exact = normalize_group(recipient_group)
+    others = [g for g in donor_groups(recipient_group) if g != exact and stock.get(g, 0) > 0]
+    others.sort(key=lambda g: stock[g], reverse=True)
+    return [exact] + others if stock.get(exact, 0) > 0 else others
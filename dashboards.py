@@ -0,0 +1,211 @@
+# dashboards.py - the dashboards' access checks, queries and pages, shared
+# by the sync views (routes.py) and their async versions (async_views.py)
+#
+# every query takes the connection first, so it runs the same on the
+# request's pooled connection or on a db_async thread. The pages take a
+# `rows(query, *args)` that wraps a list query in LazyRows, so a view
+# decides where its lists run and they still only run on a fragment miss.
+from datetime import datetime
+import sqlite3
+
+from flask import flash, jsonify, redirect, render_template, session, url_for
+
+from notifications import feed as notification_feed, last_seen, unread_count
+
+
+# ----------------- ACCESS -----------------
+
+def require_admin():
+    # a redirect to the login page for anyone but an admin, else None
+    if "username" not in session:
+        flash("⚠ Please login first.")
+        return redirect(url_for("login"))
+    if session.get("role") != "admin":
+        flash("⚠ Access denied. Admins only.")
+        return redirect(url_for("login"))
+    return None
+
+
+def require_user():
+    if "role" not in session or session.get("role") != "user":
+        flash("⚠ Access denied.")
+        return redirect("/login")
+    return None
+
+
+def require_user_json():
+    if session.get("role") != "user":
+        return jsonify({"error": "login required"}), 401
+    return None
+
+
+def user_missing():
+    flash("⚠ User record missing in database. Please re-login.")
+    return redirect("/logout")
+
+
+# ----------------- ADMIN -----------------
+
+def latest_requests(conn):
+    return conn.execute(
+        """
+        SELECT recipient_name, blood_group, req_units, status, fulfilled_units
+        FROM Request
+        ORDER BY request_id DESC
+        LIMIT 5
+        """
+    ).fetchall()
+
+
+def latest_notifications(conn):
+    return conn.execute(
+        """
+        SELECT title, message, created_at, audience
+        FROM Notifications
+        ORDER BY notification_id DESC
+        LIMIT 10
+        """
+    ).fetchall()
+
+
+def latest_camps(conn):
+    return conn.execute(
+        """
+        SELECT camp_name, location, camp_date, total_donations, total_units
+        FROM Camp
+        ORDER BY camp_date DESC
+        LIMIT 10
+        """
+    ).fetchall()
+
+
+def admin_page(snapshot, rows):
+    return render_template(
+        "admin_dashboard.html",
+        username=session["username"],
+        donors=snapshot["donors"],
+        stock=snapshot["stock"],
+        pending=snapshot["pending"],
+        fulfilled=snapshot["fulfilled"],
+        partial=snapshot["partial"],
+        expired=snapshot["expired"],
+        chart_labels=snapshot["chart_labels"],
+        chart_values=snapshot["chart_values"],
+        requests=rows(latest_requests),
+        notifications=rows(latest_notifications),
+        camps=rows(latest_camps),
+    )
+
+
+# ----------------- USER -----------------
+
+def user_donor(conn, user_id):
+    # -> (user row exists, (donor_id, blood_group) or None)
+    if conn.execute("SELECT user_id FROM Users WHERE user_id=?", (user_id,)).fetchone() is None:
+        return False, None
+    return True, conn.execute("SELECT donor_id, blood_group FROM Donor WHERE user_id=?", (user_id,)).fetchone()
+
+
+def link_donor(conn, user_id, username):
+    # no donor row for the user yet: link one by name, or create a
+    # temporary record -> (donor_id, blood_group); commits
+    cur = conn.cursor()
+    cur.execute("SELECT donor_id, blood_group FROM Donor WHERE name=?", (username,))
+    name_row = cur.fetchone()
+    if name_row:
+        cur.execute("UPDATE Donor SET user_id=? WHERE donor_id=?", (user_id, name_row[0]))
+        conn.commit()
+        return name_row
+
+    temp_aadhaar = f"TEMP{datetime.now().timestamp()}"
+    try:
+        cur.execute(
+            """
+            INSERT INTO Donor (user_id, name, blood_group, contact, city, camp_location, aadhaar)
+            VALUES (?, ?, 'Unknown', '', '', NULL, ?)
+            """,
+            (user_id, username, temp_aadhaar),
+        )
+    except sqlite3.IntegrityError:
+        cur.execute(
+            """
+            INSERT INTO Donor (user_id, name, blood_group, contact, city, camp_location, aadhaar)
+            VALUES (NULL, ?, 'Unknown', '', '', NULL, ?)
+            """,
+            (username, temp_aadhaar),
+        )
+    conn.commit()
+    return cur.lastrowid, "Unknown"
+
+
+def donor_summary(conn, donor_id):
+    # -> (donations, units, last donation, [(donation_date, amount)])
+    # totals are one DonorRollup row, kept by trigger
+    donations, units, last_donation = conn.execute(
+        "SELECT donations, units, last_donation FROM DonorRollup WHERE donor_id = ?", (donor_id,)
+    ).fetchone() or (0, 0, None)
+    history = conn.execute(
+        """
+        SELECT donation_date, amount
+        FROM Donation
+        WHERE donor_id = ?
+        ORDER BY donation_date
+        """,
+        (donor_id,),
+    ).fetchall()
+    return donations, units, last_donation, history
+
+
+def notice_state(conn, user_id):
+    # -> (read cursor, unread count)
+    return last_seen(conn, user_id), unread_count(conn, user_id)
+
+
+def user_requests(conn, username):
+    return conn.execute(
+        """
+        SELECT request_id, blood_group, req_units, status
+        FROM Request
+        WHERE recipient_name=?
+        ORDER BY request_id DESC LIMIT 5
+        """,
+        (username,),
+    ).fetchall()
+
+
+def user_camps(conn, user_id):
+    return conn.execute(
+        """
+        SELECT c.camp_name, c.location, c.camp_date, c.total_donations, c.total_units
+        FROM Camp c
+        JOIN CampRegistrations r ON c.camp_id = r.camp_id
+        WHERE r.user_id = ?
+        ORDER BY c.camp_date DESC
+        """,
+        (user_id,),
+    ).fetchall()
+
+
+def user_page(blood_group, summary, notices, rows):
+    # summary: donor_summary(); notices: notice_state(); the lists (recent
+    # requests, notifications, registered camps) load only on a fragment
+    # miss, and notification ids past the read cursor show as new
+    user_id, username = session["user_id"], session["username"]
+    total_donations, total_units, last_donation, donation_data = summary
+    last_seen_id, unread = notices
+    return render_template(
+        "user_dashboard.html",
+        user_id=user_id,
+        user_name=username,
+        user_blood_group=blood_group or "Unknown",
+        total_donations=total_donations or 0,
+        total_units=total_units or 0,
+        last_donation=last_donation or "—",
+        donation_dates=[d[0] for d in donation_data],
+        donation_values=[d[1] for d in donation_data],
+        user_requests=rows(user_requests, username),
+        notifications=rows(notification_feed, user_id),
+        last_seen_id=last_seen_id,
+        unread=unread,
+        user_camps=rows(user_camps, user_id),
+    )
@@ -1,187 +1,160 @@
+import argparse
 import sqlite3
 import os
+import threading
+import time
+import migrations
+from migrations import LATEST_VERSION, apply_migrations, current_version, plan
 
 DB_FILE = "blood_bank.db"
 
-def get_db():
-    # return DB connection with foreign keys enabled
-    conn = sqlite3.connect(DB_FILE)
+# connection profile tuned for many concurrent writers on camp days
+DB_PROFILE = {
+    "journal_mode": "WAL",       # readers no longer block behind writers
+    "synchronous": "NORMAL",     # safe with WAL, fsync only at checkpoints
+    "busy_timeout": 5000,        # ms to wait on a locked DB before erroring
+    "cache_size": -16000,        # negative = KiB, so ~16 MB page cache
+    "mmap_size": 128 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "wal_autocheckpoint": 1000,  # pages
+}
+
+# checkpoint policy: truncate the WAL once it grows past the size limit,
+# or at least every interval while writes keep coming in
+WAL_CHECKPOINT_BYTES = 64 * 1024 * 1024
+WAL_CHECKPOINT_INTERVAL = 300  # seconds
+# pool releases look at the WAL at most this often; wal_autocheckpoint
+# keeps it bounded in between
+WAL_CHECK_INTERVAL = 1.0       # seconds
+
+_checkpoint_lock = threading.Lock()
+_last_checkpoint = time.monotonic()
+_last_check = 0.0
+
+
+def apply_profile(conn, profile=DB_PROFILE):
+    # per-connection pragmas (journal_mode is persistent, set in migrate)
     conn.execute("PRAGMA foreign_keys = ON;")
+    for name in ("synchronous", "busy_timeout", "cache_size", "mmap_size",
+                 "temp_store", "wal_autocheckpoint"):
+        if name in profile:
+            conn.execute(f"PRAGMA {name} = {profile[name]};")
+
+
+def get_db(profile=DB_PROFILE, factory=sqlite3.Connection):
+    # return DB connection with foreign keys enabled
+    # (pooled connections may be reused by different request threads;
+    # profiling.py passes a factory that times every statement)
+    timeout = profile.get("busy_timeout", 5000) / 1000
+    conn = sqlite3.connect(DB_FILE, timeout=timeout, check_same_thread=False, factory=factory)
+    apply_profile(conn, profile)
     return conn
 
 
-def init_db():
-    # create DB file if missing
-    if not os.path.exists(DB_FILE):
-        open(DB_FILE, "w").close()
+def maybe_checkpoint(conn, force=False):
+    # called whenever a connection goes back to the pool; a clock read
+    # unless WAL_CHECK_INTERVAL has passed since the last look
+    global _last_checkpoint, _last_check
+    now = time.monotonic()
+    if not force:
+        if now - _last_check < WAL_CHECK_INTERVAL:
+            return False
+        _last_check = now
+    wal_file = DB_FILE + "-wal"
+    try:
+        wal_size = os.path.getsize(wal_file)
+    except OSError:
+        return False
+
+    due = (
+        force
+        or wal_size >= WAL_CHECKPOINT_BYTES
+        or (wal_size > 0 and now - _last_checkpoint >= WAL_CHECKPOINT_INTERVAL)
+    )
+    if not due or not _checkpoint_lock.acquire(blocking=False):
+        return False
+    try:
+        mode = "TRUNCATE" if wal_size >= WAL_CHECKPOINT_BYTES or force else "PASSIVE"
+        conn.execute(f"PRAGMA wal_checkpoint({mode});")
+        _last_checkpoint = now
+        return True
+    except sqlite3.OperationalError:
+        # busy readers/writers: try again on a later release
+        return False
+    finally:
+        _checkpoint_lock.release()
+
+
+def migrate(target=None, report=None):
+    # bring the schema to `target` (default: latest) -> [(version, description)]
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        conn.execute(f"PRAGMA journal_mode = {DB_PROFILE['journal_mode']};")
+        apply_profile(conn)
+        return apply_migrations(conn, target, report)
+    finally:
+        conn.close()
 
+
+def init_db():
+    # at boot: a current schema costs one pragma read, anything older is
+    # migrated first (journal_mode is set then, and persists in the file)
     conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute("PRAGMA foreign_keys = ON;")
-
-    # USERS TABLE
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS Users (
-            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            role TEXT CHECK(role IN ('admin', 'user')) NOT NULL
-        )
-    """)
-
-    # DONOR TABLE
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS Donor (
-            donor_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER UNIQUE,
-            name TEXT NOT NULL,
-            blood_group TEXT NOT NULL,
-            contact TEXT,
-            city TEXT,
-            camp_location TEXT,
-            aadhaar TEXT UNIQUE,
-            FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE CASCADE
-        )
-    """)
-
-    # DONOR PROFILE
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS DonorProfile (
-            donor_id INTEGER PRIMARY KEY,
-            full_name TEXT,
-            age INTEGER,
-            gender TEXT,
-            email TEXT,
-            address TEXT,
-            FOREIGN KEY(donor_id) REFERENCES Donor(donor_id) ON DELETE CASCADE
-        )
-    """)
-
-    # DONATION TABLE
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS Donation (
-            donation_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            donor_id INTEGER NOT NULL,
-            amount INTEGER CHECK(amount > 0),
-            donation_date TEXT,
-            expiry_date TEXT,
-            camp_location TEXT,
-            FOREIGN KEY (donor_id) REFERENCES Donor(donor_id) ON DELETE CASCADE
-        )
-    """)
-
-    # BLOOD STOCK
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS BloodStock (
-            blood_group TEXT PRIMARY KEY,
-            available_units INTEGER DEFAULT 0 CHECK(available_units >= 0),
-            expiry_date TEXT
-        )
-    """)
-
-    # RECIPIENT TABLE
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS Recipient (
-            recipient_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            blood_group TEXT NOT NULL,
-            contact TEXT,
-            aadhaar TEXT UNIQUE
-        )
-    """)
-
-    # REQUEST TABLE
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS Request (
-            request_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            recipient_name TEXT NOT NULL,
-            blood_group TEXT NOT NULL,
-            req_units INTEGER CHECK(req_units > 0),
-            fulfilled_units INTEGER DEFAULT 0 CHECK(fulfilled_units >= 0),
-            status TEXT CHECK(status IN ('Pending', 'Fulfilled', 'Partially Fulfilled', 'Rejected')),
-            request_date TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-
-    # ONLINE DONATION REQUESTS
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS OnlineDonationRequests (
-            request_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            name TEXT NOT NULL,
-            blood_group TEXT NOT NULL,
-            contact TEXT,
-            city TEXT,
-            amount INTEGER CHECK(amount > 0),
-            status TEXT DEFAULT 'Pending',
-            request_date TEXT,
-            FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE CASCADE
-        )
-    """)
-
-    # ONLINE BLOOD REQUESTS
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS OnlineRequest (
-            online_request_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            recipient_name TEXT NOT NULL,
-            blood_group TEXT NOT NULL,
-            req_units INTEGER CHECK(req_units > 0),
-            status TEXT DEFAULT 'Pending',
-            request_date TEXT,
-            FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE CASCADE
-        )
-    """)
-
-    # NOTIFICATIONS
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS Notifications (
-            notification_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            message TEXT NOT NULL,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            sent_by TEXT DEFAULT 'Admin'
-        )
-    """)
-
-    # CAMP TABLE
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS Camp (
-            camp_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            camp_name TEXT NOT NULL,
-            location TEXT NOT NULL,
-            camp_date TEXT NOT NULL,
-            description TEXT,
-            total_donations INTEGER DEFAULT 0,
-            total_units INTEGER DEFAULT 0
-        )
-    """)
-
-    # CAMP REGISTRATIONS
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS CampRegistrations (
-            registration_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            camp_id INTEGER NOT NULL,
-            user_id INTEGER,
-            donor_name TEXT,
-            amount INTEGER,
-            mode TEXT CHECK(mode IN ('online', 'admin')) DEFAULT 'online',
-            status TEXT CHECK(status IN ('Pending', 'Confirmed')) DEFAULT 'Pending',
-            registered_on TEXT DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (camp_id) REFERENCES Camp(camp_id) ON DELETE CASCADE,
-            FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE SET NULL,
-            UNIQUE (camp_id, user_id)
-        )
-    """)
-
-    # INDEXES
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_camp_date ON Camp(camp_date)")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_user_id ON CampRegistrations(user_id)")
-
-    conn.commit()
-    conn.close()
-    print("Database initialized successfully.")
+    try:
+        if current_version(conn) >= LATEST_VERSION:
+            return []
+    finally:
+        conn.close()
+    applied = migrate()
+    for number, description in applied:
+        print(f"Applied migration {number}: {description}")
+    return applied
+
+
+def print_progress(number, table, done, top):
+    print(f"  {number}: {table} backfill {done}/{top} rowids", end="\r" if done < top else "\n", flush=True)
 
 
 if __name__ == "__main__":
-    init_db()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Plan or apply schema migrations")
+    parser.add_argument("command", nargs="?", choices=("plan", "apply"), default="apply")
+    parser.add_argument("--db", help="database file (default: db.DB_FILE)")
+    parser.add_argument("--to", type=int, help="stop after this version")
+    parser.add_argument("--batch", type=int, help=f"rowids per backfill transaction (default {migrations.BACKFILL_BATCH})")
+    parser.add_argument(
+        "--yield", dest="yield_", type=float,
+        help=f"pause after each backfill range, as a fraction of its lock time (default {migrations.BACKFILL_YIELD:g}; "
+        "0 when nothing else is writing)",
+    )
+    args = parser.parse_args()
+
+    if args.db:
+        DB_FILE = args.db
+    if args.batch:
+        migrations.BACKFILL_BATCH = args.batch
+    if args.yield_ is not None:
+        migrations.BACKFILL_YIELD = args.yield_
+
+    conn = sqlite3.connect(DB_FILE)
+    print(f"{DB_FILE}: schema version {current_version(conn)}, latest {LATEST_VERSION}")
+    if args.command == "plan":
+        steps = plan(conn, args.to)
+        for number, description, statements, backfills in steps:
+            print(f"  {number}: {description} ({statements} statements)")
+            for table, rows, reached in backfills:
+                rows = "created by an earlier step" if rows is None else f"{rows} rows"
+                if reached is None:
+                    rows += ", already done"
+                elif reached:
+                    rows += f", resumes after rowid {reached}"
+                print(f"       backfill {table}: {rows}, in ranges of {migrations.BACKFILL_BATCH} rowids")
+        if not steps:
+            print("  nothing to apply")
+        conn.close()
+    else:
+        conn.close()
+        start = time.perf_counter()
+        applied = migrate(args.to, print_progress)
+        for number, description in applied:
+            print(f"  applied {number}: {description}")
+        print(f"  {len(applied)} applied in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,137 @@
+# db_async.py - asyncio access to SQLite for the read-heavy views
+#
+# sqlite3 calls block, so async views hand them to a few dedicated DB
+# threads, each holding its own read-only connection. Work waits in a
+# bounded queue: when the queue is full, or a job has waited longer than
+# ASYNC_DB_MAX_WAIT before a thread picks it up, the job fails with
+# Overloaded and the request is answered 503 + Retry-After instead of
+# piling more threads and work behind a backlog that cannot clear.
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from flask import Response, jsonify, request
+
+import db_pool
+import profiling
+
+ASYNC_DB_THREADS = int(os.environ.get("ASYNC_DB_THREADS", 4))
+ASYNC_DB_QUEUE = int(os.environ.get("ASYNC_DB_QUEUE", 64))          # jobs waiting for a thread
+ASYNC_DB_MAX_WAIT = float(os.environ.get("ASYNC_DB_MAX_WAIT", 2))   # seconds a job may wait
+RETRY_AFTER = 1                                                     # seconds, sent with the 503
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after=RETRY_AFTER):
+        super().__init__("database busy, retry later")
+        self.retry_after = retry_after
+
+
+class DBExecutor:
+    # jobs are fn(conn, *args), run on one of `threads` DB threads
+
+    def __init__(self, threads=ASYNC_DB_THREADS, depth=ASYNC_DB_QUEUE, max_wait=ASYNC_DB_MAX_WAIT):
+        self.threads = threads
+        self.max_wait = max_wait
+        self._jobs = queue.Queue(maxsize=depth)
+        self._lock = threading.Lock()
+        self._pid = None
+        self.completed = 0
+        self.rejected = 0
+
+    def _ensure_started(self):
+        # threads start on first use, so in each gunicorn worker after the
+        # fork (threads do not survive one)
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            for i in range(self.threads):
+                threading.Thread(target=self._run, name=f"async-db-{i}", daemon=True).start()
+            self._pid = os.getpid()
+
+    def submit(self, fn, *args):
+        # -> concurrent Future; raises Overloaded when the queue is full
+        self._ensure_started()
+        future = Future()
+        try:
+            self._jobs.put_nowait((time.monotonic(), profiling.current_trace(), future, fn, args))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise Overloaded()
+        return future
+
+    def _run(self):
+        # same factory as the pool, so statements are traced and profiled
+        conn = db_pool.pool.factory()
+        conn.execute("PRAGMA query_only = ON")
+        while True:
+            queued, trace, future, fn, args = self._jobs.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            if time.monotonic() - queued > self.max_wait:
+                # the caller has waited long enough; shed instead of running late
+                with self._lock:
+                    self.rejected += 1
+                future.set_exception(Overloaded())
+                continue
+            try:
+                with profiling.use_trace(trace):
+                    result = fn(conn, *args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+            with self._lock:
+                self.completed += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "threads": self.threads,
+                "queued": self._jobs.qsize(),
+                "depth": self._jobs.maxsize,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+
+executor = DBExecutor()
+
+
+async def call(fn, *args):
+    # await fn(conn, *args) on a DB thread
+    return await asyncio.wrap_future(executor.submit(fn, *args))
+
+
+def _query(conn, query, args, one):
+    result = conn.execute(query, args).fetchall()
+    return result[0] if (one and result) else result
+
+
+async def query_db(query, args=(), one=False):
+    # read-only counterpart of db_helpers.query_db (writes fail: query_only)
+    return await call(_query, query, args, one)
+
+
+def overloaded(e):
+    # 503 + Retry-After; JSON for the API and the unread-count poll
+    if request.path.startswith(("/api/", "/notifications/")) or request.accept_mimetypes.best == "application/json":
+        response = jsonify({"error": str(e)})
+    else:
+        response = Response(f"{e}\n", mimetype="text/plain")
+    response.status_code = 503
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+
+def init_app(app):
+    app.register_error_handler(Overloaded, overloaded)
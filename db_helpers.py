@@ -1,8 +1,9 @@
 import sqlite3
-from db import get_db
+from db_pool import get_request_db
 
 def query_db(query, args=(), one=False):
-    conn = get_db()
+    # runs on the current request's pooled connection
+    conn = get_request_db()
     cur = conn.cursor()
     cur.execute(query, args)
 
@@ -11,10 +12,8 @@ def query_db(query, args=(), one=False):
     # For SELECT queries → return data
     if query_type == "SELECT":
         result = cur.fetchall()
-        conn.close()
         return result[0] if (one and result) else result
 
     # For INSERT, UPDATE, DELETE → commit changes
     conn.commit()
-    conn.close()
     return None
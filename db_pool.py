@@ -0,0 +1,100 @@
+import sqlite3
+import threading
+import queue
+from contextlib import contextmanager
+from flask import g
+from db import get_db, maybe_checkpoint
+
+POOL_SIZE = 8          # max connections open at once
+ACQUIRE_TIMEOUT = 10   # seconds to wait when every connection is busy
+
+
+class ConnectionPool:
+    # bounded, thread-safe pool of warmed sqlite connections
+
+    def __init__(self, factory=get_db, size=POOL_SIZE, timeout=ACQUIRE_TIMEOUT):
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError("connection pool exhausted")
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.hits += 1
+        except queue.Empty:
+            try:
+                conn = self.factory()
+            except Exception:
+                self._slots.release()
+                raise
+            with self._lock:
+                self.misses += 1
+        return conn
+
+    def release(self, conn):
+        try:
+            # never hand out a connection with a half-finished transaction
+            if conn.in_transaction:
+                conn.rollback()
+            maybe_checkpoint(conn)
+            self._idle.put_nowait(conn)
+        except (sqlite3.Error, queue.Full):
+            conn.close()
+        finally:
+            self._slots.release()
+
+    def close_idle(self):
+        # before forking worker processes: an SQLite connection must not be
+        # used on both sides of a fork, so children start with an empty pool
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        # for code running outside a Flask request (workers, CLI)
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": self._idle.qsize(),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+pool = ConnectionPool()
+
+
+def get_request_db():
+    # one pooled connection per Flask request
+    if "db_conn" not in g:
+        g.db_conn = pool.acquire()
+    return g.db_conn
+
+
+def release_request_db(exc=None):
+    conn = g.pop("db_conn", None)
+    if conn is not None:
+        pool.release(conn)
+
+
+def init_app(app):
+    app.teardown_appcontext(release_request_db)
@@ -0,0 +1,209 @@
+# donor_search.py - donor typeahead over the DonorSearch FTS5 index
+#
+# every word of the query is matched as a prefix ("ram sha" finds "Ramesh
+# Sharma"), best bm25 rank first among the first RANK_CANDIDATES hits (a
+# short prefix matches too many donors to rank them all). When that finds no donor at all, each
+# word is also matched against indexed words within a small edit distance:
+# letters inserted, dropped, changed or swapped, and the word still being
+# typed against the start of each indexed word ("ramsh" finds "Ramesh").
+# Like most fuzzy matchers those must keep the word's first letter (or have
+# it as a stray or swapped first letter), which keeps the candidates to a
+# few short ranges of a sorted snapshot of DonorSearchTerms (counting a
+# term's donors walks its doclist, too slow per keystroke).
+import bisect
+import re
+import threading
+import time
+import unicodedata
+
+SEARCH_LIMIT = 10
+MAX_LIMIT = 50
+MAX_WORDS = 5
+RANK_CANDIDATES = 200  # hits ranked per query; a broader one ranks its first 200
+FUZZY_MIN_LENGTH = 3   # shorter words are only matched as prefixes
+FUZZY_TERMS = 8        # corrections tried per word
+TERMS_TTL = 60         # seconds a term snapshot is used before reloading
+
+WORD = re.compile(r"\w+")
+
+
+def fold(text):
+    # the tokenizer's folding: lower case, accents dropped
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def query_words(q):
+    return WORD.findall(fold(q or ""))[:MAX_WORDS]
+
+
+def quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def prefix_query(words):
+    return " AND ".join(quote(word) + "*" for word in words)
+
+
+def unmatched(a, b):
+    # letters of `a` left over once each is paired with a letter of `b`
+    rest = list(b)
+    count = 0
+    for ch in a:
+        if ch in rest:
+            rest.remove(ch)
+        else:
+            count += 1
+    return count
+
+
+def edit_distance(a, b, limit, prefix=False):
+    # Damerau-Levenshtein (optimal string alignment), or limit + 1 once
+    # every alignment is already over the limit. prefix: the distance from
+    # `a` to the closest prefix of `b` ("ramsh" is 1 from "ramesh...")
+    if len(a) - len(b) > limit or (len(b) - len(a) > limit and not prefix):
+        return limit + 1
+    # an edit pairs off at most one more letter (a swap none), so letters
+    # without a partner bound the distance from below, for a few times less
+    # than the table; a prefix within the limit lies in b[:len(a) + limit]
+    if prefix:
+        if unmatched(a, b[:len(a) + limit]) > limit:
+            return limit + 1
+    elif unmatched(a, b) > limit or unmatched(b, a) > limit:
+        return limit + 1
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+    return min(current) if prefix else current[-1]
+
+
+def allowed_edits(word):
+    return 1 if len(word) <= 5 else 2
+
+
+class TermSnapshot:
+    # sorted (term, donors) from DonorSearchTerms, reloaded every TERMS_TTL
+    # seconds; words newer than the snapshot still match as prefixes
+
+    def __init__(self, ttl=TERMS_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded = None
+        self._terms, self._donors = [], []
+
+    def between(self, conn, low, high):
+        with self._lock:
+            if self._loaded is None or time.monotonic() - self._loaded > self.ttl:
+                rows = conn.execute(
+                    "SELECT term, doc FROM DonorSearchTerms WHERE col = 'name' ORDER BY term"
+                ).fetchall()
+                self._terms = [term for term, _ in rows]
+                self._donors = [donors for _, donors in rows]
+                self._loaded = time.monotonic()
+            terms, donors = self._terms, self._donors
+        start, end = bisect.bisect_left(terms, low), bisect.bisect_left(terms, high)
+        return zip(terms[start:end], donors[start:end])
+
+    def clear(self):
+        with self._lock:
+            self._loaded = None
+
+
+term_snapshot = TermSnapshot()
+
+
+def heads(word):
+    # term prefixes fuzzy candidates are read from: the word's first letter,
+    # and its next two letters after a stray first letter or a swap
+    first = word[0]
+    return [first] + sorted({head for head in (word[1:3], word[1] + word[0]) if head[0] != first})
+
+
+def close_terms(conn, word, partial):
+    # indexed words within allowed_edits of `word`; the word still being
+    # typed (`partial`) is compared against each term's closest prefix.
+    # A word that is indexed itself (or, still being typed, begins an
+    # indexed word) is taken as typed: its near neighbours are other real
+    # names, which would crowd out its own matches and each add a doclist
+    end = word[:-1] + chr(ord(word[-1]) + 1) if partial else word + "\0"
+    if any(term_snapshot.between(conn, word, end)):
+        return []
+    limit = allowed_edits(word)
+    scored = []
+    for head in heads(word):
+        for term, donors in term_snapshot.between(conn, head, head[:-1] + chr(ord(head[-1]) + 1)):
+            if term.startswith(word):
+                continue    # the word's own prefix match ("word"*) has it
+            distance = edit_distance(word, term, limit, prefix=partial)
+            if distance <= limit:
+                scored.append((distance, -donors, term))
+    return [term for _, _, term in sorted(scored)[:FUZZY_TERMS]]
+
+
+def fuzzy_query(conn, words):
+    # each word or one of its corrections; None when nothing is close
+    groups, corrected = [], False
+    for i, word in enumerate(words):
+        partial = i == len(words) - 1
+        terms = close_terms(conn, word, partial) if len(word) >= FUZZY_MIN_LENGTH else []
+        corrected = corrected or bool(terms)
+        options = [quote(word) + "*"] + [quote(term) + ("*" if partial else "") for term in terms]
+        groups.append("(" + " OR ".join(options) + ")")
+    return " AND ".join(groups) if corrected else None
+
+
+def search_tag(blood_group, city):
+    # the tag column's token for this group and city (migrations.search_tag)
+    return "x" + f"{blood_group}|{city}".encode().hex()
+
+
+def match(conn, query, blood_group=None, city=None, limit=SEARCH_LIMIT):
+    query = f"name : ({query})"
+    if blood_group and city:
+        # both filters are one token, matched in the index with the name
+        query += " AND tag : " + quote(search_tag(blood_group, city))
+    conditions, params = ["DonorSearch MATCH ?"], [query]
+    if blood_group:
+        conditions.append("d.blood_group = ?")
+        params.append(blood_group)
+    if city:
+        conditions.append("d.city = ?")
+        params.append(city)
+    # CROSS JOIN keeps the index driving the join (filters are checked per
+    # hit). Only the first RANK_CANDIDATES hits that pass the filters are
+    # ranked: bm25 is computed per row, and ORDER BY rank on the match
+    # itself ranks every hit (a 2-letter prefix is ~50k of 1M donors)
+    return conn.execute(
+        f"""
+        SELECT donor_id, name, blood_group, city FROM (
+            SELECT d.donor_id, d.name, d.blood_group, d.city, s.rank AS rank
+            FROM DonorSearch s CROSS JOIN Donor d ON d.donor_id = s.rowid
+            WHERE {' AND '.join(conditions)}
+            LIMIT ?
+        )
+        ORDER BY rank
+        LIMIT ?
+        """,
+        params + [RANK_CANDIDATES, limit],
+    ).fetchall()
+
+
+def search(conn, q, blood_group=None, city=None, limit=SEARCH_LIMIT):
+    # -> [(donor_id, name, blood_group, city)]; fuzzy matches only when
+    # the words as typed match nobody
+    words = query_words(q)
+    if not words:
+        return []
+    rows = match(conn, prefix_query(words), blood_group, city, limit)
+    if not rows:
+        query = fuzzy_query(conn, words)
+        if query:
+            rows = match(conn, query, blood_group, city, limit)
+    return rows
@@ -0,0 +1,309 @@
+# events.py - pub/sub for live dashboards (served as SSE on /events)
+#
+# publishers append to a ring buffer and wake waiting subscribers; a
+# subscriber resumes from its Last-Event-ID as long as that event is still
+# in the ring, and gets a "reset" event (reload the page) otherwise.
+#
+# two kinds of subscriber: astream() is a coroutine for asgi.py, parked on
+# its event loop between events, so an idle dashboard costs a few KB and no
+# thread. A publish resolves one future per loop, which wakes all of that
+# loop's subscribers. stream() is the blocking version for WSGI servers,
+# where each subscriber holds a thread; routes.py caps those at
+# SSE_MAX_STREAMS per process and answers 503 past the cap.
+#
+# with several worker processes (serve.py) a process only sees its own
+# publishes, so EVENT_MODE=relay sends them through the EventLog table
+# instead: publish() inserts the row, and a relay thread in every process
+# copies new rows into its ring, ids and order shared by all processes.
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import deque
+
+from db import get_db
+
+RING_SIZE = 1000         # events kept for Last-Event-ID resume
+HEARTBEAT = 15           # seconds between keep-alive comments
+TOPICS = {"admin": ("notification", "stock"), "user": ("notification",)}
+
+# "local": publish straight into this process's ring (default)
+# "relay": publish through EventLog, for multi-process serving
+EVENT_MODE = os.environ.get("EVENT_MODE", "local")
+RELAY_POLL = 0.25        # seconds between EventLog polls
+RELAY_KEEP = 10 * RING_SIZE  # EventLog rows kept behind the newest
+
+# blocking stream() subscribers allowed per process; keep it below the
+# server's threads per process (serve.py sets it from --threads)
+SSE_MAX_STREAMS = int(os.environ.get("SSE_MAX_STREAMS", 8))
+SSE_RETRY_AFTER = 5      # seconds, sent with the 503 past the cap
+
+log = logging.getLogger(__name__)
+
+
+class EventHub:
+    def __init__(self, size=RING_SIZE):
+        self._ring = deque(maxlen=size)    # (id, topic, json data, recipient user ids or None)
+        self._last_id = 0
+        self._cond = threading.Condition()
+        self._waiters = {}                 # event loop -> future its subscribers await
+        self.streams = 0                   # open blocking stream() subscribers
+        self.relay = None                  # the EventRelay in relay mode
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def publish(self, topic, data, recipients=None):
+        data = json.dumps(data, separators=(",", ":"))
+        if self.relay is not None:
+            return self.relay.publish(topic, data, recipients)
+        with self._cond:
+            self._last_id += 1
+            self._ring.append((self._last_id, topic, data, recipients))
+            self._notify()
+            return self._last_id
+
+    def deliver(self, events):
+        # relay mode: (id, topic, json data, recipients) rows in id order.
+        # The ring's ids stay consecutive; after a gap (this process fell
+        # behind the pruned log) older subscribers are reset.
+        with self._cond:
+            for event in events:
+                if event[0] != self._last_id + 1:
+                    self._ring.clear()
+                self._ring.append(event)
+                self._last_id = event[0]
+            self._notify()
+
+    def start_at(self, last_id):
+        # relay startup: continue the log's id sequence
+        with self._cond:
+            self._ring.clear()
+            self._last_id = last_id
+
+    def _since(self, last_id):
+        # (events after `last_id`, False), or ([], True) when the subscriber
+        # cannot catch up: its events left the ring, or it predates a restart
+        if last_id > self._last_id:
+            return [], True
+        if last_id == self._last_id:
+            return [], False
+        if not self._ring or last_id < self._ring[0][0] - 1:
+            return [], True
+        first = self._ring[0][0]
+        return list(itertools.islice(self._ring, last_id - first + 1, None)), False
+
+    def _notify(self):
+        # under self._cond: wake blocked threads, and each loop with waiters once
+        self._cond.notify_all()
+        for loop in list(self._waiters):
+            try:
+                loop.call_soon_threadsafe(self._wake, loop)
+            except RuntimeError:  # loop closed
+                del self._waiters[loop]
+
+    def _wake(self, loop):
+        # on `loop`: resolve the future its subscribers are awaiting
+        with self._cond:
+            future = self._waiters.pop(loop, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    def wait(self, last_id, timeout=HEARTBEAT):
+        # block until something newer than `last_id` is published
+        with self._cond:
+            if last_id == self._last_id:
+                self._cond.wait(timeout)
+            return self._since(last_id)
+
+    async def wait_async(self, last_id, timeout=HEARTBEAT):
+        # wait() for coroutines: nothing but a future while idle
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if last_id != self._last_id:
+                return self._since(last_id)
+            future = self._waiters.get(loop)
+            if future is None:
+                future = self._waiters[loop] = loop.create_future()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            pass
+        with self._cond:
+            return self._since(last_id)
+
+    def open_stream(self, limit=SSE_MAX_STREAMS):
+        # claim one of the blocking stream() slots; False when all are taken
+        with self._cond:
+            if self.streams >= limit:
+                return False
+            self.streams += 1
+            return True
+
+    def close_stream(self):
+        with self._cond:
+            self.streams -= 1
+
+
+hub = EventHub()
+
+
+class EventRelay(threading.Thread):
+    # relay mode: publish() writes EventLog rows (one connection shared by
+    # the request threads), the thread tails the log into the hub's ring
+
+    def __init__(self, hub, connect=get_db, poll=RELAY_POLL):
+        super().__init__(name="event-relay", daemon=True)
+        self.hub = hub
+        self.poll = poll
+        self._writer = connect()
+        self._write_lock = threading.Lock()
+        self._reader = connect()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        # start a ring's worth back, so subscribers of a restarted worker resume
+        newest = self._reader.execute("SELECT COALESCE(MAX(event_id), 0) FROM EventLog").fetchone()[0]
+        self._last_id = max(newest - RING_SIZE, 0)
+        self._pruned = self._last_id
+        hub.start_at(self._last_id)
+
+    def publish(self, topic, data, recipients=None):
+        with self._write_lock:
+            event_id = self._writer.execute(
+                "INSERT INTO EventLog (topic, data, recipients) VALUES (?, ?, ?) RETURNING event_id",
+                (topic, data, json.dumps(sorted(recipients)) if recipients is not None else None),
+            ).fetchone()[0]
+            self._writer.commit()
+        self._wake.set()
+        return event_id
+
+    def pull(self):
+        rows = self._reader.execute(
+            "SELECT event_id, topic, data, recipients FROM EventLog WHERE event_id > ? ORDER BY event_id LIMIT ?",
+            (self._last_id, RING_SIZE),
+        ).fetchall()
+        if not rows:
+            return 0
+        self.hub.deliver([
+            (event_id, topic, data, frozenset(json.loads(recipients)) if recipients is not None else None)
+            for event_id, topic, data, recipients in rows
+        ])
+        self._last_id = rows[-1][0]
+        return len(rows)
+
+    def prune(self):
+        # every process prunes; the DELETE is the same whoever runs it
+        with self._write_lock:
+            self._writer.execute("DELETE FROM EventLog WHERE event_id <= ?", (self._last_id - RELAY_KEEP,))
+            self._writer.commit()
+        self._pruned = self._last_id
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                if self.pull() == RING_SIZE:
+                    continue  # more waiting
+                if self._last_id - self._pruned >= RELAY_KEEP:
+                    self.prune()
+            except sqlite3.Error as e:
+                log.warning("event relay: %s", e)
+            self._wake.wait(self.poll)
+            self._wake.clear()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+
+
+def start(mode=EVENT_MODE, hub=hub):
+    # relay mode: route publishes through EventLog and start tailing it
+    if mode != "relay":
+        return None
+    relay = EventRelay(hub)
+    hub.relay = relay
+    relay.start()
+    return relay
+
+
+def sse(event_id, topic, data):
+    return f"id: {event_id}\nevent: {topic}\ndata: {data}\n\n"
+
+
+def subscription(session, headers, args):
+    # (last event id or None, topics, user id or None) for the logged-in
+    # session, or None when nobody is
+    role = session.get("role")
+    if role not in TOPICS:
+        return None
+    last_id = headers.get("Last-Event-ID") or args.get("last_event_id", "")
+    return (
+        int(last_id) if last_id.isdigit() else None,
+        TOPICS[role],
+        session.get("user_id") if role == "user" else None,
+    )
+
+
+def frames(events, reset, last_id, topics, user_id, hub=hub):
+    # -> (SSE text for one wake-up, new last id). Targeted events only
+    # reach their recipients (user_id None sees all)
+    if reset:
+        # the page reloads and carries on from here
+        last_id = hub.last_id
+        return sse(last_id, "reset", "{}"), last_id
+    if not events:
+        return ": keep-alive\n\n", last_id
+    text = "".join(
+        sse(event_id, topic, data)
+        for event_id, topic, data, recipients in events
+        if topic in topics and (user_id is None or recipients is None or user_id in recipients)
+    )
+    return text, events[-1][0]
+
+
+def stream(last_id, topics, user_id=None, hub=hub):
+    # SSE text for one subscriber, on the calling thread; never touches the
+    # DB or request context
+    yield "retry: 3000\n\n"
+    if last_id is None:
+        last_id = hub.last_id
+    while True:
+        events, reset = hub.wait(last_id)
+        text, last_id = frames(events, reset, last_id, topics, user_id, hub)
+        if text:
+            yield text
+
+
+async def astream(last_id, topics, user_id=None, hub=hub):
+    # stream() as an async generator, for asgi.py
+    yield "retry: 3000\n\n"
+    if last_id is None:
+        last_id = hub.last_id
+    while True:
+        events, reset = await hub.wait_async(last_id)
+        text, last_id = frames(events, reset, last_id, topics, user_id, hub)
+        if text:
+            yield text
+
+
+def publish_notification(title, message, created_at=None, audience=None, recipients=None):
+    hub.publish(
+        "notification",
+        {"title": title, "message": message, "created_at": created_at, "audience": audience},
+        recipients,
+    )
+
+
+def publish_stock(conn, blood_groups):
+    # current level of each touched group, read after the writer committed
+    groups = sorted(set(blood_groups))
+    if not groups:
+        return
+    marks = ", ".join("?" * len(groups))
+    for group, units in conn.execute(
+        f"SELECT blood_group, available_units FROM BloodStock WHERE blood_group IN ({marks})", groups
+    ):
+        hub.publish("stock", {"blood_group": group, "available_units": units})
@@ -0,0 +1,228 @@
+# export.py - streaming CSV/JSONL/columnar dumps of Donation and Request for audits
+# usage: python export.py donations|requests [-o FILE] [--format csv|jsonl|columns|parquet]
+#        [--from YYYY-MM-DD] [--to YYYY-MM-DD] [--blood-group G] [--status S]
+import argparse
+import csv
+import io
+import json
+import sys
+
+from compatibility import normalize_group
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # no parquet; the "columns" format needs nothing extra
+    pyarrow = None
+
+FETCH_SIZE = 1000           # rows pulled from sqlite per fetchmany
+ROW_GROUP_SIZE = 64 * 1024  # rows per parquet row group, the most held in memory
+
+# kind -> (select, {filter name: condition}, primary key)
+EXPORTS = {
+    "donations": (
+        """
+        SELECT d.donation_id, d.donor_id, dn.name AS donor_name, dn.blood_group, d.amount,
+               d.donation_date, d.expiry_date, d.camp_location
+        FROM Donation d JOIN Donor dn ON d.donor_id = dn.donor_id
+        """,
+        {
+            "blood_group": "dn.blood_group = ?",
+            "date_from": "d.donation_date >= ?",
+            "date_to": "d.donation_date < date(?, '+1 day')",
+        },
+        "d.donation_id",
+    ),
+    "requests": (
+        """
+        SELECT request_id, recipient_name, blood_group, req_units, fulfilled_units, status, request_date
+        FROM Request
+        """,
+        {
+            "status": "status = ?",
+            "blood_group": "blood_group = ?",
+            "date_from": "request_date >= ?",
+            "date_to": "request_date < date(?, '+1 day')",
+        },
+        "request_id",
+    ),
+}
+
+# format -> (mimetype, file extension)
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    # columnar JSON lines: {"fields": [..]}, then per fetched batch
+    # {"rows": n, "columns": [[first column's values], ..]}
+    "columns": ("application/x-ndjson", "columns.jsonl"),
+}
+if pyarrow:
+    FORMATS["parquet"] = ("application/vnd.apache.parquet", "parquet")
+
+# exported columns stored as integers in parquet; the rest are strings
+INTEGER_COLUMNS = {"donation_id", "donor_id", "amount", "request_id", "req_units", "fulfilled_units"}
+
+
+def export_query(kind, filters):
+    # SQL and params for `kind` with the non-empty filters applied, in key order
+    sql, clauses, key = EXPORTS[kind]
+    filters = {name: value for name, value in filters.items() if name in clauses and value}
+    if "blood_group" in filters:
+        filters["blood_group"] = normalize_group(filters["blood_group"])
+    conditions = [clauses[name] for name in filters]
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"{sql.strip()}{where} ORDER BY {key}", list(filters.values())
+
+
+def iter_rows(conn, sql, params=(), size=FETCH_SIZE):
+    # yields (header, batches...) without ever holding more than `size` rows
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    try:
+        yield [col[0] for col in cur.description]
+        while True:
+            batch = cur.fetchmany(size)
+            if not batch:
+                break
+            yield batch
+    finally:
+        cur.close()
+
+
+class ParquetSink:
+    # write-only file for ParquetWriter; take() hands over what it wrote so far
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def parquet_chunks(header, batches):
+    # (bytes, row count) per row group of ROW_GROUP_SIZE rows, footer last
+    schema = pyarrow.schema(
+        [(name, pyarrow.int64() if name in INTEGER_COLUMNS else pyarrow.string()) for name in header]
+    )
+    sink = ParquetSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    pending = []
+
+    def row_group():
+        columns = list(zip(*pending)) or [()] * len(header)
+        writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema,
+        ))
+        return sink.take(), len(pending)
+
+    for batch in batches:
+        pending.extend(batch)
+        if len(pending) >= ROW_GROUP_SIZE:
+            yield row_group()
+            pending = []
+    if pending:
+        yield row_group()
+    writer.close()
+    yield sink.take(), 0
+
+
+def iter_chunks(conn, kind, filters, fmt="csv", size=FETCH_SIZE):
+    # (text, row count) per fetched batch, bytes for parquet; a header rides on the first
+    sql, params = export_query(kind, filters)
+    batches = iter_rows(conn, sql, params, size)
+    header = next(batches)
+    if fmt == "parquet":
+        yield from parquet_chunks(header, batches)
+        return
+    buf = io.StringIO()
+    writer = csv.writer(buf) if fmt == "csv" else None
+    if writer:
+        writer.writerow(header)
+    elif fmt == "columns":
+        buf.write(json.dumps({"fields": header}, separators=(",", ":")))
+        buf.write("\n")
+    for batch in batches:
+        if writer:
+            writer.writerows(batch)
+        elif fmt == "columns":
+            buf.write(json.dumps({"rows": len(batch), "columns": list(zip(*batch))}, separators=(",", ":")))
+            buf.write("\n")
+        else:
+            for row in batch:
+                buf.write(json.dumps(dict(zip(header, row)), separators=(",", ":")))
+                buf.write("\n")
+        yield buf.getvalue(), len(batch)
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue(), 0
+
+
+def iter_export(conn, kind, filters, fmt="csv", size=FETCH_SIZE):
+    for chunk, _ in iter_chunks(conn, kind, filters, fmt, size):
+        yield chunk
+
+
+def export_to(conn, kind, filters, out, fmt="csv"):
+    rows = 0
+    for chunk, count in iter_chunks(conn, kind, filters, fmt):
+        out.write(chunk)
+        rows += count
+    return rows
+
+
+if __name__ == "__main__":
+    import resource
+    import time
+    import db
+
+    parser = argparse.ArgumentParser(description="Stream Donation/Request rows out of the blood bank DB")
+    parser.add_argument("kind", choices=sorted(EXPORTS))
+    parser.add_argument("-o", "--output", help="file to write (default: stdout)")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--from", dest="date_from")
+    parser.add_argument("--to", dest="date_to")
+    parser.add_argument("--blood-group")
+    parser.add_argument("--status", help="requests only, e.g. Pending")
+    args = parser.parse_args()
+    if args.status and "status" not in EXPORTS[args.kind][1]:
+        parser.error(f"--status does not apply to {args.kind}")
+
+    filters = {
+        "date_from": args.date_from, "date_to": args.date_to, "blood_group": args.blood_group, "status": args.status,
+    }
+    conn = db.get_db()
+    start = time.perf_counter()
+    binary = args.format == "parquet"
+    if not args.output:
+        rows = export_to(conn, args.kind, filters, sys.stdout.buffer if binary else sys.stdout, args.format)
+    elif binary:
+        with open(args.output, "wb") as f:
+            rows = export_to(conn, args.kind, filters, f, args.format)
+    else:
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            rows = export_to(conn, args.kind, filters, f, args.format)
+    elapsed = time.perf_counter() - start
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(
+        f"{rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s), peak RSS {peak_mb:.0f} MB",
+        file=sys.stderr,
+    )
@@ -0,0 +1,162 @@
+# fragments.py - cached template fragments keyed on table versions, a
+# persistent Jinja bytecode cache, and per-endpoint render timings
+#
+# in a template:
+#   {% call fragment("dashboard-camps", "Camp") %} ...expensive block... {% endcall %}
+# the block is rendered once per combination of name, `vary` and the
+# versions of the listed tables (bumped by triggers on every write).
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, request
+from flask.signals import before_render_template, template_rendered
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+
+from db_pool import get_request_db
+
+FRAGMENT_CACHE_SIZE = 512
+
+
+class LazyRows:
+    # query rows fetched on first use, so a cached fragment never runs its query
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._rows = None
+
+    def _load(self):
+        if self._rows is None:
+            self._rows = self._loader() or []
+        return self._rows
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __bool__(self):
+        return bool(self._load())
+
+    def __getitem__(self, index):
+        return self._load()[index]
+
+
+class FragmentCache:
+    # bounded LRU of rendered HTML; stale keys just age out
+
+    def __init__(self, size=FRAGMENT_CACHE_SIZE):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            html = self._items.get(key)
+            if html is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._items.move_to_end(key)
+            return html
+
+    def put(self, key, html):
+        with self._lock:
+            self._items[key] = html
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+fragments = FragmentCache()
+
+
+def read_versions(conn):
+    return dict(conn.execute("SELECT name, version FROM TableVersion"))
+
+
+def table_versions():
+    # every table's version, read once per request (async views set it
+    # from a DB thread)
+    if "table_versions" not in g:
+        g.table_versions = read_versions(get_request_db())
+    return g.table_versions
+
+
+def fragment(name, *tables, vary=None, caller=None):
+    versions = table_versions()
+    key = (name, vary, tuple(versions.get(table, 0) for table in tables))
+    html = fragments.get(key)
+    if html is None:
+        html = caller()
+        fragments.put(key, html)
+    return Markup(html)
+
+
+class RenderTimer:
+    # template render time per endpoint (ms), for /render_stats
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, endpoint, ms):
+        with self._lock:
+            count, total, worst, _ = self._stats.get(endpoint, (0, 0.0, 0.0, 0.0))
+            self._stats[endpoint] = (count + 1, total + ms, max(worst, ms), ms)
+
+    def stats(self):
+        with self._lock:
+            return {
+                endpoint: {
+                    "renders": count,
+                    "mean_ms": round(total / count, 3),
+                    "max_ms": round(worst, 3),
+                    "last_ms": round(last, 3),
+                }
+                for endpoint, (count, total, worst, last) in sorted(self._stats.items())
+            }
+
+
+render_timer = RenderTimer()
+
+
+def _render_started(sender, template, context, **extra):
+    g.render_started = time.perf_counter()
+
+
+def _render_finished(sender, template, context, **extra):
+    started = g.pop("render_started", None)
+    if started is not None:
+        g.render_ms = (time.perf_counter() - started) * 1000
+        render_timer.record(request.endpoint or template.name, g.render_ms)
+
+
+def init_app(app):
+    # no directory given: Jinja keeps a private (0700) one per user and
+    # refuses one another user created, whose planted bytecode it would run
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+    app.jinja_env.globals["fragment"] = fragment
+
+    before_render_template.connect(_render_started, app)
+    template_rendered.connect(_render_finished, app)
+
+    @app.after_request
+    def add_server_timing(response):
+        if "render_ms" in g:
+            timing = f"render;dur={g.render_ms:.2f}"
+            existing = response.headers.get("Server-Timing")
+            response.headers["Server-Timing"] = f"{existing}, {timing}" if existing else timing
+        return response
@@ -0,0 +1,232 @@
+# index_advisor.py - EXPLAIN QUERY PLAN over every statement the app runs
+# usage: python index_advisor.py [--donors N]
+#
+# seeds a synthetic database, drives the pages and API endpoints in VISITS
+# through Flask's test client and records each distinct statement the
+# pooled (traced) connections execute, then explains it with the
+# parameters it actually ran with. Exits 1 when a statement full-scans a
+# large table; tests/test_query_plans.py runs the same walk under pytest,
+# so a query changed in routes.py or api.py is checked as it now is.
+import argparse
+import os
+import re
+import sys
+import tempfile
+from contextlib import contextmanager
+
+import db
+import synth
+from profiling import TracedCursor
+
+# tables expected to grow without bound
+LARGE_TABLES = {
+    "Users", "Donor", "DonorProfile", "Donation", "Recipient", "Request", "RequestAllocation",
+    "Notifications", "Camp", "CampRegistrations", "BloodLot", "StockMovement", "StockHourly", "StockDaily",
+}
+
+# statement fragment -> reason a scan is accepted
+ACCEPTED = {
+    "FROM Camp ORDER BY camp_date DESC": "lists every camp for a dropdown or the camp page",
+    "WHERE audience IS NULL ORDER BY notification_id DESC LIMIT ?": "newest broadcasts off a partial index, stops after LIMIT",
+}
+
+# (role, method, path, form or JSON body); role None is logged out
+VISITS = [
+    (None, "GET", "/login", None),
+
+    # admin pages, each list with every filter it offers
+    ("admin", "GET", "/admin_dashboard", None),
+    ("admin", "GET", "/donors", None),
+    ("admin", "GET", "/donors?blood_group=O%2B", None),
+    ("admin", "GET", "/donors?city=Pune", None),
+    ("admin", "GET", "/donors?after=50", None),
+    ("admin", "GET", "/donors?before=50", None),
+    ("admin", "GET", "/recipients", None),
+    ("admin", "GET", "/recipients?blood_group=O%2B", None),
+    ("admin", "GET", "/requests", None),
+    ("admin", "GET", "/requests?status=Pending", None),
+    ("admin", "GET", "/requests?blood_group=O%2B", None),
+    ("admin", "GET", "/requests?date_from=2025-01-01&date_to=2025-02-01", None),
+    ("admin", "GET", "/record_donation", None),
+    ("admin", "GET", "/record_donation?blood_group=O%2B", None),
+    ("admin", "GET", "/record_donation?date_from=2025-01-01&date_to=2025-02-01", None),
+    ("admin", "GET", "/camp_registrations", None),
+    ("admin", "GET", "/camp_registrations?camp_id=1", None),
+    ("admin", "GET", "/camp_registrations?status=Confirmed", None),
+    ("admin", "GET", "/add_camp", None),
+    ("admin", "GET", "/camp_register_admin", None),
+    ("admin", "GET", "/send_notification", None),
+    ("admin", "GET", "/api/stock_history?blood_group=O%2B", None),
+    ("admin", "GET", "/api/stock_history?resolution=hourly&periods=48", None),
+    ("admin", "GET", "/export/donations?blood_group=O%2B", None),
+    ("admin", "GET", "/export/requests?status=Pending", None),
+    ("admin", "POST", "/record_donation", {"donor_id": "2", "amount": "350", "camp_id": "1"}),
+    ("admin", "POST", "/requests", {"recipient_id": "1", "req_units": "450"}),
+    ("admin", "POST", "/send_notification", {"title": "t", "message": "m", "blood_group": "O+", "city": "Pune"}),
+    ("admin", "POST", "/send_notification", {"title": "t", "message": "m", "camp_id": "1"}),
+    ("admin", "POST", "/camp_register_admin", {"camp_id": "1", "donor_name": "walk in", "amount": "300"}),
+
+    # JSON API
+    ("admin", "GET", "/api/v1/stock", None),
+    ("admin", "GET", "/api/v1/donors", None),
+    ("admin", "GET", "/api/v1/donors?blood_group=O%2B&city=Pune", None),
+    ("admin", "GET", "/api/v1/donors?name=Ramesh%20Sharma", None),
+    ("admin", "GET", "/api/v1/donors?aadhaar=1", None),
+    ("admin", "GET", "/api/v1/donors/search?q=ram", None),
+    ("admin", "GET", "/api/v1/donors/search?q=ram&blood_group=O%2B&city=Pune", None),
+    ("admin", "GET", "/api/v1/donors/search?q=ramsh", None),
+    ("admin", "GET", "/api/v1/donors/1", None),
+    ("admin", "GET", "/api/v1/requests", None),
+    ("admin", "GET", "/api/v1/requests?status=Pending", None),
+    ("admin", "GET", "/api/v1/requests?recipient_name=user1", None),
+    ("admin", "POST", "/api/v1/requests", {"recipient_id": 1, "units": 450}),
+    ("admin", "POST", "/api/v1/camps/1/registrations", {"donor_name": "walk in", "amount": 300, "donor_id": 3}),
+
+    # user pages
+    ("user", "GET", "/user_dashboard", None),
+    ("user", "GET", "/notifications/unread", None),
+    ("user", "POST", "/notifications/read", None),
+    ("user", "GET", "/profile", None),
+    ("user", "GET", "/donate", None),
+    ("user", "POST", "/donate", {"camp_id": "1", "amount": "350"}),
+    ("user", "GET", "/request_blood", None),
+    ("user", "POST", "/request_blood", {"req_units": "450"}),
+]
+
+# logins for VISITS' roles (synth.py users; user1 owns donor 1)
+LOGINS = {"admin": "admin", "user": "user1"}
+
+SCAN_RE = re.compile(r"^SCAN (\w+)")
+TABLE_RE = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!WHERE|JOIN|LEFT|ORDER|ON|LIMIT)(\w+))?", re.I)
+EXPLAINED = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+def explain(conn, sql, params=()):
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def full_scans(sql, plan):
+    # large tables read end to end. A scan feeding a LIMIT with no WHERE and
+    # no sort step stops after LIMIT rows, so it does not count.
+    bounded = "LIMIT" in sql.upper() and " WHERE " not in f" {sql.upper()} " and not any(
+        "TEMP B-TREE" in step for step in plan
+    )
+    aliases = {alias or table: table for table, alias in TABLE_RE.findall(sql)}
+    scans = []
+    for step in plan:
+        match = SCAN_RE.match(step)
+        table = aliases.get(match.group(1), match.group(1)) if match else None
+        if table in LARGE_TABLES and not bounded:
+            scans.append(step)
+    return scans
+
+
+def accepted(sql):
+    return next((reason for fragment, reason in ACCEPTED.items() if fragment in sql), None)
+
+
+@contextmanager
+def capture():
+    # {statement: first params it ran with} for every statement executed on
+    # a traced connection, in any thread, while the block runs
+    statements = {}
+    begin = TracedCursor._begin
+
+    def recording(cursor, sql, params):
+        if params is not None:
+            statements.setdefault(" ".join(sql.split()), params)
+        begin(cursor, sql, params)
+
+    TracedCursor._begin = recording
+    try:
+        yield statements
+    finally:
+        TracedCursor._begin = begin
+
+
+def check(conn, statements):
+    # {statement: [offending plan steps]} for every unexcused full scan
+    problems = {}
+    for sql, params in statements.items():
+        if not sql.upper().startswith(EXPLAINED):
+            continue
+        scans = full_scans(sql, explain(conn, sql, params))
+        if scans and not accepted(sql):
+            problems[sql] = scans
+    return problems
+
+
+def seed(path, donors=2000):
+    # a synthetic database at `path`, migrated and analysed
+    db.DB_FILE = path
+    db.init_db()
+    conn = db.get_db()
+    synth.generate(conn, donors=donors, days=120, log=lambda *args: None)
+    conn.close()
+
+
+def load_app():
+    # the Flask app on db.DB_FILE, without its background threads
+    os.environ.setdefault("LIFELINK_PRELOAD", "1")
+    from app import app
+    import db_pool
+    from fragments import fragments
+
+    # a connection or fragment left over from another database would hide
+    # statements from the walk
+    db_pool.pool.close_idle()
+    fragments.clear()
+    app.testing = True
+    return app
+
+
+def walk(app, visits=VISITS):
+    # run every visit; returns the statements executed and the
+    # [(method, path, status)] of responses that were server errors
+    from matcher import matcher
+    import db_pool
+
+    clients, failures = {}, []
+    with capture() as statements:
+        with db_pool.pool.connection() as conn:
+            matcher.load(conn)
+        for role, method, path, body in visits:
+            client = clients.get(role)
+            if client is None:
+                client = clients[role] = app.test_client()
+                if role:
+                    client.post("/login", data={"username": LOGINS[role], "password": synth.SYNTH_PASSWORD})
+            if body is None or not path.startswith("/api/"):
+                response = client.open(path, method=method, data=body)
+            else:
+                response = client.open(path, method=method, json=body)
+            response.get_data()
+            if response.status_code >= 500:
+                failures.append((method, path, response.status_code))
+    return statements, failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="explain every statement the app runs")
+    parser.add_argument("--donors", type=int, default=2000)
+    args = parser.parse_args()
+
+    seed(os.path.join(tempfile.mkdtemp(), "advisor.db"), args.donors)
+    statements, failures = walk(load_app())
+    conn = db.get_db()
+    for sql, params in statements.items():
+        if not sql.upper().startswith(EXPLAINED):
+            continue
+        plan = explain(conn, sql, params)
+        reason = accepted(sql)
+        note = f"  (accepted: {reason})" if reason and full_scans(sql, plan) else ""
+        print(f"{sql}{note}")
+        for step in plan:
+            print(f"    {step}")
+
+    for method, path, status in failures:
+        print(f"{status} from {method} {path}")
+    problems = check(conn, statements)
+    for sql, scans in problems.items():
+        print(f"FULL SCAN: {'; '.join(scans)}\n    {sql}")
+    sys.exit(1 if problems or failures else 0)
@@ -0,0 +1,318 @@
+# ingest.py - camp-day donation intake: apply now, or journal and group-commit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from inventory import add_donation, positive_units
+from matcher import matcher
+from events import publish_stock
+
+# "sync": each POST commits its own transaction (default)
+# "journal": POSTs append to JOURNAL_FILE and a worker applies them in batches
+INGEST_MODE = os.environ.get("INGEST_MODE", "sync")
+JOURNAL_FILE = "ingest_journal.jsonl"
+INGEST_BATCH = 500        # events per transaction
+INGEST_IDLE_WAIT = 1.0    # seconds the worker sleeps when the journal is drained
+JOURNAL_POLL = 0.1        # seconds between size checks for other processes' appends
+
+log = logging.getLogger(__name__)
+
+journal = None  # the open Journal when INGEST_MODE == "journal"
+
+try:
+    import fcntl
+except ImportError:  # Windows: one process, the threading locks are enough
+    fcntl = None
+
+
+@contextmanager
+def file_lock(f, exclusive=False):
+    # advisory lock between worker processes sharing the journal: appends
+    # share it, cutting the file (or a torn tail) takes it alone
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    try:
+        yield
+    finally:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def register_online(cur, camp_id, user_id, username, amount, donation_date):
+    # /donate: registration + donation + stock (camp totals by trigger).
+    # Returns the blood group that received stock.
+    amount = positive_units(amount)
+    cur.execute(
+        """
+        INSERT INTO CampRegistrations (camp_id, user_id, donor_name, amount, mode, status)
+        VALUES (?, ?, ?, ?, 'online', 'Confirmed')
+        """,
+        (camp_id, user_id, username, amount),
+    )
+
+    # donor linked info
+    cur.execute("SELECT donor_id, blood_group FROM Donor WHERE user_id=?", (user_id,))
+    donor = cur.fetchone()
+    donor_id, blood_group = donor if donor else (None, "Unknown")
+
+    cur.execute("SELECT location FROM Camp WHERE camp_id=?", (camp_id,))
+    camp = cur.fetchone()
+    add_donation(cur, donor_id, blood_group, amount, donation_date, camp[0] if camp else None, camp_id)
+    return blood_group
+
+
+def register_walk_in(cur, camp_id, donor_name, amount, donation_date, donor_id=None):
+    # /camp_register_admin: registration, plus a donation when the donor is
+    # known (picked from the typeahead, or an exact name match). Returns the
+    # blood group that received stock, or None.
+    amount = positive_units(amount)
+    cur.execute(
+        """
+        INSERT INTO CampRegistrations (camp_id, donor_name, amount, mode, status)
+        VALUES (?, ?, ?, 'admin', 'Confirmed')
+        """,
+        (camp_id, donor_name, amount),
+    )
+    if donor_id:
+        cur.execute("SELECT donor_id, blood_group FROM Donor WHERE donor_id=?", (donor_id,))
+    else:
+        cur.execute("SELECT donor_id, blood_group FROM Donor WHERE name=?", (donor_name,))
+    donor = cur.fetchone()
+    if not donor:
+        return None
+    add_donation(cur, donor[0], donor[1], amount, donation_date, camp_id=camp_id)
+    return donor[1]
+
+
+# event type -> handler taking (cur, **fields)
+HANDLERS = {
+    "online": register_online,
+    "walk_in": register_walk_in,
+}
+
+
+class Journal:
+    # append-only JSON-lines file; an event is durable once append() returns
+
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._appended = threading.Condition(self._lock)
+        self._file = open(path, "ab")
+        self._drain_lock = None
+        self._drop_torn_tail()
+
+    def _drop_torn_tail(self):
+        # a crash mid-append leaves a partial last line; cut back to the
+        # last newline so later appends start on a fresh line
+        with file_lock(self._file, exclusive=True):
+            with open(self.path, "rb") as f:
+                data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end != len(data):
+                self._file.truncate(end)
+                os.fsync(self._file.fileno())
+
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def append(self, event_type, **fields):
+        line = json.dumps({"type": event_type, **fields}, separators=(",", ":")).encode() + b"\n"
+        with self._lock, file_lock(self._file):
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._appended.notify_all()
+
+    def read(self, offset, limit=INGEST_BATCH):
+        # up to `limit` complete events from `offset`: ([(event, end offset)], end)
+        events = []
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n") or len(events) >= limit:
+                    break
+                offset += len(line)
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    event = {"type": None, "raw": line.decode(errors="replace")}
+                events.append((event, offset))
+        return events, offset
+
+    def wait(self, offset, timeout):
+        # block until the file grows past `offset` (or timeout); appends in
+        # this process wake us, other processes' are seen by polling the size
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while self.size() <= offset:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                self._appended.wait(min(remaining, JOURNAL_POLL))
+
+    def claim_drain(self):
+        # every worker process appends, but only one drains: the holder of
+        # an exclusive lock on the .lock file (freed when its process exits)
+        if fcntl is None or self._drain_lock is not None:
+            return True
+        f = open(self.path + ".lock", "a")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._drain_lock = f
+        return True
+
+    def truncate_if_drained(self, offset, reset):
+        # restart the file once everything in it has been applied. `reset`
+        # zeroes the stored offset while appends are still held off.
+        with self._lock, file_lock(self._file, exclusive=True):
+            if offset and self.size() == offset:
+                self._file.truncate(0)
+                os.fsync(self._file.fileno())
+                reset()
+
+    def close(self):
+        self._file.close()
+
+
+def applied_offset(conn):
+    row = conn.execute("SELECT value FROM IngestOffset WHERE name='journal'").fetchone()
+    return row[0] if row else 0
+
+
+def set_offset(conn, offset):
+    conn.execute(
+        "INSERT INTO IngestOffset (name, value) VALUES ('journal', ?) "
+        "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+        (offset,),
+    )
+
+
+def apply_batch(conn, events, end_offset):
+    # every event in one transaction together with the new offset, so a
+    # crash either keeps the whole batch or replays it. A bad event is
+    # rolled back to its savepoint and skipped instead of failing the batch.
+    groups = set()
+    failed = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cur = conn.cursor()
+        for event, _ in events:
+            cur.execute("SAVEPOINT event")
+            try:
+                # any JSON value can sit on a line; only an object is an event
+                if not isinstance(event, dict):
+                    raise ValueError(f"not an event object: {event!r}")
+                fields = dict(event)
+                handler = HANDLERS.get(fields.pop("type", None))
+                if handler is None:
+                    raise ValueError(f"unknown event {event!r}")
+                group = handler(cur, **fields)
+                cur.execute("RELEASE event")
+            except (sqlite3.Error, ValueError, TypeError) as e:
+                cur.execute("ROLLBACK TO event")
+                cur.execute("RELEASE event")
+                log.warning("skipping journal event %s: %s", event, e)
+                failed += 1
+                continue
+            if group:
+                groups.add(group)
+        set_offset(conn, end_offset)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return groups, failed
+
+
+def replay(conn, journal, on_applied=None, batch=INGEST_BATCH):
+    # apply everything past the stored offset; returns events applied
+    offset = applied_offset(conn)
+    if offset > journal.size():
+        # crashed between restarting the file and committing offset 0
+        set_offset(conn, 0)
+        conn.commit()
+        offset = 0
+    total = 0
+    while True:
+        events, end = journal.read(offset, batch)
+        if not events:
+            break
+        groups, _ = apply_batch(conn, events, end)
+        total += len(events)
+        offset = end
+        if on_applied:
+            on_applied(conn, groups)
+
+    def reset():
+        set_offset(conn, 0)
+        conn.commit()
+
+    journal.truncate_if_drained(offset, reset)
+    return total
+
+
+class IngestWorker(threading.Thread):
+    # drains the journal into SQLite, one transaction per batch
+
+    def __init__(self, pool, journal, on_applied=None):
+        super().__init__(name="ingest-worker", daemon=True)
+        self.pool = pool
+        self.journal = journal
+        self.on_applied = on_applied
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            if not self.journal.claim_drain():
+                # another process drains; take over if it goes away
+                self._stop_event.wait(INGEST_IDLE_WAIT)
+                continue
+            try:
+                with self.pool.connection() as conn:
+                    replay(conn, self.journal, self.on_applied)
+                    offset = applied_offset(conn)
+            except sqlite3.Error as e:
+                log.warning("journal replay failed, retrying: %s", e)
+                offset = None
+            except Exception:
+                # a bug must not end intake for good; the batch is retried
+                log.exception("journal replay failed, retrying")
+                offset = None
+            if offset is not None:
+                self.journal.wait(offset, INGEST_IDLE_WAIT)
+            else:
+                self._stop_event.wait(INGEST_IDLE_WAIT)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def after_batch(conn, groups):
+    # new stock from a batch goes to waiting requests
+    for group in groups:
+        try:
+            matcher.match(conn, group)
+        except sqlite3.Error as e:
+            log.warning("backlog matching for %s failed: %s", group, e)
+    publish_stock(conn, groups)
+
+
+def start(pool, mode=INGEST_MODE):
+    # open the journal and start draining it (replaying anything left
+    # over from a crash) when journalling is on
+    global journal
+    if mode != "journal":
+        return None
+    journal = Journal()
+    worker = IngestWorker(pool, journal, after_batch)
+    worker.start()
+    return worker
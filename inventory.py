@@ -0,0 +1,174 @@
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+
+from events import publish_stock
+
+SHELF_LIFE_DAYS = 42     # refrigerated red cells
+SWEEP_INTERVAL = 3600    # seconds between background expiry sweeps
+SWEEP_BATCH = 1000       # lots expired per statement
+
+
+def expiry_for(donation_date):
+    collected = datetime.strptime(donation_date[:10], "%Y-%m-%d").date()
+    return (collected + timedelta(days=SHELF_LIFE_DAYS)).isoformat()
+
+
+def refresh_stock_expiry(cur, blood_group):
+    # BloodStock.expiry_date = earliest expiry among the group's open lots
+    cur.execute(
+        """
+        UPDATE BloodStock
+        SET expiry_date = (
+            SELECT MIN(expiry_date) FROM BloodLot
+            WHERE blood_group=? AND remaining_units > 0
+        )
+        WHERE blood_group=?
+        """,
+        (blood_group, blood_group),
+    )
+
+
+def add_stock(cur, blood_group, units):
+    cur.execute(
+        """
+        INSERT INTO BloodStock (blood_group, available_units)
+        VALUES (?, ?)
+        ON CONFLICT(blood_group) DO UPDATE
+        SET available_units = available_units + excluded.available_units
+        """,
+        (blood_group, units),
+    )
+
+
+def positive_units(amount):
+    # a form, JSON or journal amount as a positive int; ValueError otherwise.
+    # SQLite would store 'abc' as TEXT, and TEXT passes CHECK(amount > 0)
+    if isinstance(amount, bool) or (isinstance(amount, float) and not amount.is_integer()):
+        raise ValueError(f"invalid amount {amount!r}")
+    try:
+        units = int(amount)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid amount {amount!r}") from None
+    if units <= 0:
+        raise ValueError(f"invalid amount {amount!r}")
+    return units
+
+
+def add_donation(cur, donor_id, blood_group, amount, donation_date, camp_location=None, camp_id=None):
+    # donation row + its lot + the BloodStock aggregate, on the caller's
+    # transaction. Camp/donor/day rollups follow by trigger.
+    amount = positive_units(amount)
+    expiry_date = expiry_for(donation_date)
+    cur.execute(
+        """
+        INSERT INTO Donation (donor_id, amount, donation_date, expiry_date, camp_location, camp_id)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (donor_id, amount, donation_date, expiry_date, camp_location, camp_id),
+    )
+    donation_id = cur.lastrowid
+    cur.execute(
+        """
+        INSERT INTO BloodLot (donation_id, blood_group, units, remaining_units, collected_on, expiry_date)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (donation_id, blood_group, amount, amount, donation_date, expiry_date),
+    )
+    add_stock(cur, blood_group, amount)
+    refresh_stock_expiry(cur, blood_group)
+    return donation_id
+
+
+def consume_lots(conn, blood_group, units):
+    # first-expiring-first-out; stock recorded before lots existed has no
+    # lot rows, so this may cover less than `units`
+    lots = conn.execute(
+        """
+        SELECT lot_id, remaining_units FROM BloodLot
+        WHERE blood_group=? AND remaining_units > 0 AND expiry_date >= ?
+        ORDER BY expiry_date, lot_id
+        """,
+        (blood_group, date.today().isoformat()),
+    )
+    updates = []
+    for lot_id, remaining in lots:
+        if units <= 0:
+            break
+        take = min(remaining, units)
+        updates.append((take, lot_id))
+        units -= take
+    conn.executemany("UPDATE BloodLot SET remaining_units = remaining_units - ? WHERE lot_id=?", updates)
+    refresh_stock_expiry(conn, blood_group)
+
+
+def expire_lots(conn, blood_groups, today=None, batch=SWEEP_BATCH):
+    # write off expired lots of the given groups; the caller owns the
+    # transaction. Returns the number of lots expired.
+    today = today or date.today().isoformat()
+    expired = 0
+    for group in blood_groups:
+        while True:
+            rows = conn.execute(
+                """
+                SELECT lot_id, remaining_units FROM BloodLot
+                WHERE blood_group=? AND remaining_units > 0 AND expiry_date < ?
+                LIMIT ?
+                """,
+                (group, today, batch),
+            ).fetchall()
+            if not rows:
+                break
+            conn.executemany(
+                """
+                UPDATE BloodLot SET expired_units = remaining_units, remaining_units = 0
+                WHERE lot_id=?
+                """,
+                [(lot_id,) for lot_id, _ in rows],
+            )
+            # legacy stock may already be below the lot total, so clamp at 0
+            conn.execute(
+                "UPDATE BloodStock SET available_units = MAX(available_units - ?, 0) WHERE blood_group=?",
+                (sum(units for _, units in rows), group),
+            )
+            expired += len(rows)
+        refresh_stock_expiry(conn, group)
+    return expired
+
+
+def sweep_expired(conn, batch=SWEEP_BATCH):
+    # one transaction per group keeps the write lock short
+    groups = [g for g, in conn.execute("SELECT blood_group FROM BloodStock")]
+    expired = 0
+    for group in groups:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            expired += expire_lots(conn, [group], batch=batch)
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+    return expired
+
+
+class ExpirySweeper(threading.Thread):
+    # background thread expiring lots every SWEEP_INTERVAL seconds
+
+    def __init__(self, pool, interval=SWEEP_INTERVAL):
+        super().__init__(name="expiry-sweeper", daemon=True)
+        self.pool = pool
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                with self.pool.connection() as conn:
+                    if sweep_expired(conn):
+                        publish_stock(conn, [g for g, in conn.execute("SELECT blood_group FROM BloodStock")])
+            except sqlite3.Error:
+                pass  # locked or busy: try again next round
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,320 @@
+# loadtest.py - replay mixed admin/user traffic and report latency per route
+# usage: python loadtest.py [path/to/db] [--scenario mixed] [--requests N] [--concurrency C]
+#                           [--url http://127.0.0.1:5000] [--save base.json] [--compare base.json]
+#
+# runs against a database built by synth.py (its users, donors and today's
+# camps drive the requests). Without --url requests go through the Flask
+# test client in this process, one client per worker thread; with --url
+# they go to a running server over HTTP. Each worker logs in once as the
+# admin and once as a random synthetic user.
+# --save writes the per-route numbers as JSON; --compare prints them next
+# to a saved baseline and exits 1 when a route's p95 regressed by more than
+# --threshold (and by at least --min-ms, so sub-millisecond noise is ignored).
+import argparse
+import http.cookiejar
+import itertools
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import db
+from synth import BLOOD_GROUP_WEIGHTS, CITY_WEIGHTS, SYNTH_PASSWORD
+
+SAMPLE = 1000        # donors / users / recipients sampled from the database
+WARMUP = 20          # unrecorded requests per worker (caches, pool, templates)
+
+
+def page(path, **args):
+    return path + ("?" + urllib.parse.urlencode(args) if args else "")
+
+
+def some_group(rng):
+    return rng.choice(list(BLOOD_GROUP_WEIGHTS))
+
+
+def some_city(rng):
+    return rng.choice(list(CITY_WEIGHTS))
+
+
+def typed_prefix(rng, ctx):
+    # what an admin has typed into the donor box so far
+    first, _, last = rng.choice(ctx["donors"])[1].partition(" ")
+    q = first[:rng.randint(2, max(2, len(first)))]
+    return q + " " + last[:rng.randint(1, 3)] if last and rng.random() < 0.3 else q
+
+
+def walk_in(rng, ctx):
+    donor_id, name = rng.choice(ctx["donors"])
+    return {"camp_id": rng.choice(ctx["camps"]), "donor_name": name, "donor_id": donor_id, "amount": 350}
+
+
+# route label -> (role, request maker); a maker returns (path, form data or None for GET)
+ROUTES = {
+    "GET /admin_dashboard": ("admin", lambda rng, ctx: ("/admin_dashboard", None)),
+    "GET /donors": ("admin", lambda rng, ctx: (page("/donors", blood_group=some_group(rng), city=some_city(rng)), None)),
+    "GET /requests": ("admin", lambda rng, ctx: (page("/requests", status=rng.choice(("Pending", "Fulfilled"))), None)),
+    "GET /camp_registrations": ("admin", lambda rng, ctx: ("/camp_registrations", None)),
+    "GET /record_donation": ("admin", lambda rng, ctx: ("/record_donation", None)),
+    "POST /record_donation": ("admin", lambda rng, ctx: (
+        "/record_donation", {"donor_id": rng.choice(ctx["donors"])[0], "amount": 350, "camp_id": ""},
+    )),
+    "GET /camp_register_admin": ("admin", lambda rng, ctx: ("/camp_register_admin", None)),
+    "POST /camp_register_admin": ("admin", lambda rng, ctx: ("/camp_register_admin", walk_in(rng, ctx))),
+    "GET /api/v1/donors/search": ("admin", lambda rng, ctx: (page("/api/v1/donors/search", q=typed_prefix(rng, ctx)), None)),
+    "GET /api/v1/stock": ("admin", lambda rng, ctx: ("/api/v1/stock", None)),
+    "GET /api/v1/donors": ("admin", lambda rng, ctx: (page("/api/v1/donors", blood_group=some_group(rng)), None)),
+    "GET /api/v1/requests": ("admin", lambda rng, ctx: (page("/api/v1/requests", status="Pending"), None)),
+    "GET /api/stock_history": ("admin", lambda rng, ctx: (page("/api/stock_history", blood_group=some_group(rng)), None)),
+    "GET /user_dashboard": ("user", lambda rng, ctx: ("/user_dashboard", None)),
+    "GET /notifications/unread": ("user", lambda rng, ctx: ("/notifications/unread", None)),
+    "GET /donate": ("user", lambda rng, ctx: ("/donate", None)),
+    "POST /donate": ("user", lambda rng, ctx: ("/donate", {"camp_id": rng.choice(ctx["camps"]), "amount": 350})),
+    "GET /request_blood": ("user", lambda rng, ctx: ("/request_blood", None)),
+    "GET /profile": ("user", lambda rng, ctx: ("/profile", None)),
+}
+
+# scenario -> {route label: weight}
+SCENARIOS = {
+    # an ordinary day: mostly reads, a trickle of donations
+    "mixed": {
+        "GET /admin_dashboard": 10, "GET /donors": 6, "GET /requests": 5, "GET /camp_registrations": 2,
+        "GET /record_donation": 3, "POST /record_donation": 3, "GET /api/v1/donors/search": 8,
+        "GET /api/v1/stock": 4, "GET /api/v1/donors": 2, "GET /api/v1/requests": 2, "GET /api/stock_history": 2,
+        "GET /user_dashboard": 20, "GET /notifications/unread": 15, "GET /donate": 6, "POST /donate": 2,
+        "GET /request_blood": 4, "GET /profile": 6,
+    },
+    # camp day: desks registering walk-ins as fast as they can type
+    "camp_day": {
+        "POST /camp_register_admin": 30, "GET /api/v1/donors/search": 30, "GET /camp_register_admin": 5,
+        "POST /donate": 10, "GET /donate": 5, "GET /admin_dashboard": 5, "GET /user_dashboard": 10,
+        "GET /notifications/unread": 5,
+    },
+    # dashboards left open and refreshing
+    "dashboard": {
+        "GET /admin_dashboard": 30, "GET /user_dashboard": 30, "GET /notifications/unread": 25,
+        "GET /api/v1/stock": 10, "GET /api/stock_history": 5,
+    },
+}
+
+
+def load_context(path, password):
+    # request ingredients sampled from the target database
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    rows = lambda sql: conn.execute(sql + f" ORDER BY random() LIMIT {SAMPLE}").fetchall()
+    ctx = {
+        "password": password,
+        "donors": rows("SELECT donor_id, name FROM Donor"),
+        "users": [name for (name,) in rows(
+            "SELECT u.username FROM Users u JOIN Donor d ON d.user_id = u.user_id WHERE u.role = 'user'"
+        )],
+        "admins": [name for (name,) in rows("SELECT username FROM Users WHERE role = 'admin'")],
+        "camps": [camp_id for (camp_id,) in rows("SELECT camp_id FROM Camp WHERE camp_date = date('now')")],
+    }
+    conn.close()
+    missing = [name for name in ("donors", "users", "admins", "camps") if not ctx[name]]
+    if missing:
+        sys.exit(f"{path} has no {', '.join(missing)} to drive requests (build it with synth.py)")
+    return ctx
+
+
+class TestClientSession:
+    # in-process: Flask test client with its own cookie jar
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def send(self, path, data=None):
+        response = self.client.open(path, method="GET" if data is None else "POST", data=data)
+        response.get_data()
+        response.close()
+        return response.status_code
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpSession:
+    # over the network: urllib with a cookie jar; redirects are returned, not followed
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), NoRedirect())
+
+    def send(self, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(urllib.request.Request(self.base_url + path, data=body), timeout=self.timeout) as r:
+                r.read()
+                return r.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+def login(session, username, password):
+    if session.send("/login", {"username": username, "password": password}) != 302:
+        raise RuntimeError(f"login failed for {username}")
+    return session
+
+
+class Worker(threading.Thread):
+    def __init__(self, new_session, ctx, weights, counter, total, ready, seed):
+        super().__init__(daemon=True)
+        self.rng = random.Random(seed)
+        self.ctx = ctx
+        self.labels, self.weights = list(weights), list(weights.values())
+        self.counter, self.total, self.ready = counter, total, ready
+        self.sessions = {
+            "admin": login(new_session(), self.rng.choice(ctx["admins"]), ctx["password"]),
+            "user": login(new_session(), self.rng.choice(ctx["users"]), ctx["password"]),
+        }
+        self.samples = {label: [] for label in weights}
+        self.errors = {label: 0 for label in weights}
+
+    def hit(self, label):
+        role, make = ROUTES[label]
+        path, data = make(self.rng, self.ctx)
+        start = time.perf_counter()
+        try:
+            ok = self.sessions[role].send(path, data) < 400
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    def run(self):
+        for _ in range(WARMUP):
+            self.hit(self.rng.choices(self.labels, self.weights)[0])
+        self.ready.wait()
+        while next(self.counter) < self.total:
+            label = self.rng.choices(self.labels, self.weights)[0]
+            elapsed, ok = self.hit(label)
+            self.samples[label].append(elapsed)
+            self.errors[label] += not ok
+
+
+def percentile(samples, p):
+    return samples[min(len(samples) - 1, int(len(samples) * p))] * 1000
+
+
+def summarize(samples, errors, wall):
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "errors": errors,
+        "p50": round(percentile(samples, 0.50), 3),
+        "p95": round(percentile(samples, 0.95), 3),
+        "p99": round(percentile(samples, 0.99), 3),
+        "rps": round(len(samples) / wall, 1),
+    }
+
+
+def run(new_session, ctx, scenario, total, concurrency, seed=1):
+    weights = SCENARIOS[scenario]
+    counter = itertools.count()
+    ready = threading.Barrier(concurrency + 1)
+    workers = [Worker(new_session, ctx, weights, counter, total, ready, seed + i) for i in range(concurrency)]
+    # the clock starts once every worker is logged in and warmed up
+    for worker in workers:
+        worker.start()
+    ready.wait()
+    started = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    wall = time.perf_counter() - started
+
+    routes, every, failed = {}, [], 0
+    for label in weights:
+        samples = [s for worker in workers for s in worker.samples[label]]
+        errors = sum(worker.errors[label] for worker in workers)
+        if samples:
+            routes[label] = summarize(samples, errors, wall)
+            every += samples
+            failed += errors
+    return {
+        "scenario": scenario,
+        "requests": total,
+        "concurrency": concurrency,
+        "seconds": round(wall, 2),
+        "total": summarize(every, failed, wall),
+        "routes": routes,
+    }
+
+
+def print_report(result, baseline=None):
+    base = (baseline or {}).get("routes", {})
+    print(f"scenario={result['scenario']} requests={result['requests']} concurrency={result['concurrency']} "
+          f"wall={result['seconds']}s")
+    print(f"{'route':<30} {'n':>6} {'err':>5} {'p50':>9} {'p95':>9} {'p99':>9} {'req/s':>8}"
+          + (f" {'base p95':>9} {'change':>7}" if baseline else ""))
+    for label, row in sorted(result["routes"].items()) + [("total", result["total"])]:
+        line = (f"{label:<30} {row['n']:>6} {row['errors']:>5} {row['p50']:>7.2f}ms {row['p95']:>7.2f}ms "
+                f"{row['p99']:>7.2f}ms {row['rps']:>8.1f}")
+        old = baseline.get("total") if label == "total" and baseline else base.get(label)
+        if old:
+            line += f" {old['p95']:>7.2f}ms {(row['p95'] / old['p95'] - 1) * 100 if old['p95'] else 0:>+6.0f}%"
+        print(line)
+
+
+def regressions(result, baseline, threshold, min_ms):
+    # route labels whose p95 grew by more than threshold (fraction) and min_ms
+    slower = []
+    for label, row in result["routes"].items():
+        old = baseline.get("routes", {}).get(label)
+        if old and row["p95"] > old["p95"] * (1 + threshold) and row["p95"] - old["p95"] >= min_ms:
+            slower.append(label)
+    return slower
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay mixed traffic and report latency per route")
+    parser.add_argument("db", nargs="?", default="synthetic.db")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--url", help="load a running server instead of an in-process test client")
+    parser.add_argument("--password", default=SYNTH_PASSWORD)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", metavar="FILE", help="write the results as a baseline")
+    parser.add_argument("--compare", metavar="FILE", help="baseline to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p95 growth (0.2 = 20%%)")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="ignore p95 growth below this")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        sys.exit(f"{args.db} not found (build it with synth.py)")
+    ctx = load_context(args.db, args.password)
+
+    if args.url:
+        new_session = lambda: HttpSession(args.url)
+    else:
+        # the app opens db.DB_FILE when imported
+        db.DB_FILE = args.db
+        from app import app
+        new_session = lambda: TestClientSession(app)
+
+    result = run(new_session, ctx, args.scenario, args.requests, args.concurrency, args.seed)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"baseline saved to {args.save}")
+    if baseline:
+        slower = regressions(result, baseline, args.threshold, args.min_ms)
+        if slower:
+            sys.exit(f"p95 regressed by more than {args.threshold:.0%}: {', '.join(sorted(slower))}")
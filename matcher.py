@@ -0,0 +1,164 @@
+import sqlite3
+import threading
+from collections import deque
+from heapq import merge
+from allocation import fulfilment_status
+from compatibility import normalize_group, recipient_groups
+from inventory import consume_lots, expire_lots
+
+MATCH_BATCH = 500  # max requests touched per transaction
+
+
+def tagged(queue):
+    # (request_id, entry, queue) per entry; a generator expression written
+    # inline would see only the comprehension's last queue
+    return ((entry[0], entry, queue) for entry in queue)
+
+
+class BacklogMatcher:
+    # per-blood-group FIFO of open requests, filled whenever stock arrives.
+    # Only requests newer than the high-water mark are read on each pass,
+    # so the Request history is never rescanned.
+
+    def __init__(self):
+        self._queues = {}       # blood_group -> deque of [request_id, req_units, fulfilled_units]
+        self._high_water = 0    # highest request_id already looked at
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self, conn):
+        # full load of the open backlog (startup, or after a conflict)
+        with self._lock:
+            self._queues.clear()
+            self._high_water = 0
+            self._load_new(conn)
+            self._loaded = True
+
+    def _load_new(self, conn):
+        top = conn.execute("SELECT COALESCE(MAX(request_id), 0) FROM Request").fetchone()[0]
+        if top <= self._high_water:
+            return
+        rows = conn.execute(
+            """
+            SELECT request_id, blood_group, req_units, fulfilled_units
+            FROM Request
+            WHERE status IN ('Pending', 'Partially Fulfilled')
+              AND request_id > ? AND request_id <= ?
+            ORDER BY request_id
+            """,
+            (self._high_water, top),
+        )
+        for request_id, group, req_units, fulfilled in rows:
+            self._queues.setdefault(normalize_group(group), deque()).append([request_id, req_units, fulfilled])
+        self._high_water = top
+
+    def pending(self, blood_group=None):
+        with self._lock:
+            if blood_group is not None:
+                return len(self._queues.get(blood_group, ()))
+            return sum(len(q) for q in self._queues.values())
+
+    def match(self, conn, blood_group):
+        # allocate new stock of blood_group to the oldest open requests it can serve
+        blood_group = normalize_group(blood_group)
+        filled = 0
+        while True:
+            done, units = self._match_batch(conn, blood_group)
+            filled += units
+            if done:
+                return filled
+
+    def _candidates(self, blood_group):
+        # same-group recipients first (they have no alternatives), then every
+        # other compatible recipient group, oldest request first
+        exact = self._queues.get(blood_group, ())
+        others = [
+            tagged(queue)
+            for group, queue in self._queues.items()
+            if group != blood_group and group in recipient_groups(blood_group)
+        ]
+        yield from ((entry, exact) for entry in exact)
+        for _, entry, queue in merge(*others, key=lambda item: item[0]):
+            yield entry, queue
+
+    def _match_batch(self, conn, blood_group):
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if not self._loaded:
+                    self._queues.clear()
+                    self._high_water = 0
+                    self._loaded = True
+                self._load_new(conn)
+                expire_lots(conn, [blood_group])
+
+                row = conn.execute(
+                    "SELECT available_units FROM BloodStock WHERE blood_group=?", (blood_group,)
+                ).fetchone()
+                available_units = row[0] if row else 0
+                if available_units <= 0:
+                    conn.commit()
+                    return True, 0
+
+                # plan the batch without touching the queues until commit
+                planned = []
+                updates = []
+                taken = 0
+                for entry, queue in self._candidates(blood_group):
+                    if taken >= available_units or len(updates) >= MATCH_BATCH:
+                        break
+                    request_id, req_units, fulfilled = entry
+                    give = min(req_units - fulfilled, available_units - taken)
+                    new_fulfilled = fulfilled + give
+                    status = fulfilment_status(req_units, new_fulfilled)
+                    updates.append((new_fulfilled, status, request_id, fulfilled))
+                    planned.append((queue, status, new_fulfilled))
+                    taken += give
+                if not updates:
+                    conn.commit()
+                    return True, 0
+
+                # guards against rows changed behind our back (another worker
+                # process filled or rejected them): any miss reloads the queues
+                cur = conn.executemany(
+                    """
+                    UPDATE Request SET fulfilled_units=?, status=?
+                    WHERE request_id=? AND fulfilled_units=? AND status IN ('Pending', 'Partially Fulfilled')
+                    """,
+                    updates,
+                )
+                if cur.rowcount != len(updates):
+                    conn.rollback()
+                    self._loaded = False
+                    return False, 0
+
+                conn.execute(
+                    """
+                    UPDATE BloodStock SET available_units = available_units - ?
+                    WHERE blood_group=? AND available_units >= ?
+                    """,
+                    (taken, blood_group, taken),
+                )
+                consume_lots(conn, blood_group, taken)
+                conn.executemany(
+                    "INSERT INTO RequestAllocation (request_id, blood_group, units) VALUES (?, ?, ?)",
+                    [(request_id, blood_group, new - old) for new, _, request_id, old in updates],
+                )
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                self._loaded = False
+                raise
+
+            # each queue is consumed from its head, in order
+            for queue, status, new_fulfilled in planned:
+                if status == "Fulfilled":
+                    queue.popleft()
+                else:
+                    queue[0][2] = new_fulfilled
+
+            done = taken >= available_units or len(updates) < MATCH_BATCH
+            return done, taken
+
+
+matcher = BacklogMatcher()
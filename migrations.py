@@ -0,0 +1,868 @@
+# migrations.py - versioned schema changes, tracked in PRAGMA user_version
+#
+# a migration is a list of steps run in order: SQL statements, which commit
+# together with the version bump, and backfill() steps, which rewrite a
+# large table in rowid ranges, one short transaction each, so writers get
+# the lock between ranges. Progress past a backfill is kept in
+# MigrationProgress, so an interrupted migration resumes where it stopped
+# (and a second process starting up joins in rather than redoing work).
+#
+# plan / apply from the command line: python db.py plan|apply
+import sqlite3
+import time
+
+# tables whose every write bumps TableVersion (fragments.py cache keys)
+VERSIONED_TABLES = ("Donor", "Donation", "Request", "Notifications", "Camp", "CampRegistrations")
+# added later, for the dashboard snapshot (stats.py)
+SNAPSHOT_TABLES = ("StatsCounter", "BloodStock")
+
+BACKFILL_BATCH = 2000    # rowids per backfill transaction
+# pause after each range, as a fraction of the time it held the write lock:
+# a writer's busy handler polls every few to 100ms, and would keep missing
+# a lock that is released only for an instant
+BACKFILL_YIELD = 1.0
+
+
+def version_statements(tables):
+    # a TableVersion row per table, bumped by a trigger on every write
+    return [
+        *[f"INSERT OR IGNORE INTO TableVersion (name, version) VALUES ('{table}', 0)" for table in tables],
+        *[
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_version_{table.lower()}_{op.lower()} AFTER {op} ON {table} BEGIN
+                UPDATE TableVersion SET version = version + 1 WHERE name = '{table}';
+            END
+            """
+            for table in tables
+            for op in ("INSERT", "UPDATE", "DELETE")
+        ],
+    ]
+
+
+def backfill(table, sql, batch=None):
+    # a step run over `table` in rowid ranges; `sql` limits itself with
+    # `rowid > :lo AND rowid <= :hi` and must be idempotent (a range cut
+    # short by a crash runs again). Rows added after the backfill starts
+    # are the new code's to fill.
+    return ("backfill", table, sql, batch)
+
+
+def is_backfill(step):
+    return isinstance(step, tuple)
+
+# the schema init_db used to create with IF NOT EXISTS on every boot. It is
+# unchanged since migration 1 was added, so any database at version >= 1
+# already has all of it; a new or pre-migration (version 0) one gets it
+# with migration 1.
+BASE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS Users (
+        user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        role TEXT CHECK(role IN ('admin', 'user')) NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Donor (
+        donor_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER UNIQUE,
+        name TEXT NOT NULL,
+        blood_group TEXT NOT NULL,
+        contact TEXT,
+        city TEXT,
+        camp_location TEXT,
+        aadhaar TEXT UNIQUE,
+        FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS DonorProfile (
+        donor_id INTEGER PRIMARY KEY,
+        full_name TEXT,
+        age INTEGER,
+        gender TEXT,
+        email TEXT,
+        address TEXT,
+        FOREIGN KEY(donor_id) REFERENCES Donor(donor_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Donation (
+        donation_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        donor_id INTEGER NOT NULL,
+        amount INTEGER CHECK(amount > 0),
+        donation_date TEXT,
+        expiry_date TEXT,
+        camp_location TEXT,
+        FOREIGN KEY (donor_id) REFERENCES Donor(donor_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS BloodStock (
+        blood_group TEXT PRIMARY KEY,
+        available_units INTEGER DEFAULT 0 CHECK(available_units >= 0),
+        expiry_date TEXT
+    )
+    """,
+    # one lot per donation, consumed first-expiring-first-out
+    """
+    CREATE TABLE IF NOT EXISTS BloodLot (
+        lot_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        donation_id INTEGER UNIQUE,
+        blood_group TEXT NOT NULL,
+        units INTEGER CHECK(units > 0),
+        remaining_units INTEGER CHECK(remaining_units >= 0),
+        expired_units INTEGER DEFAULT 0,
+        collected_on TEXT,
+        expiry_date TEXT NOT NULL,
+        FOREIGN KEY (donation_id) REFERENCES Donation(donation_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Recipient (
+        recipient_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        blood_group TEXT NOT NULL,
+        contact TEXT,
+        aadhaar TEXT UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Request (
+        request_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        recipient_name TEXT NOT NULL,
+        blood_group TEXT NOT NULL,
+        req_units INTEGER CHECK(req_units > 0),
+        fulfilled_units INTEGER DEFAULT 0 CHECK(fulfilled_units >= 0),
+        status TEXT CHECK(status IN ('Pending', 'Fulfilled', 'Partially Fulfilled', 'Rejected')),
+        request_date TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # per-group allocations for a request
+    """
+    CREATE TABLE IF NOT EXISTS RequestAllocation (
+        allocation_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        request_id INTEGER NOT NULL,
+        blood_group TEXT NOT NULL,
+        units INTEGER CHECK(units > 0),
+        allocated_on TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (request_id) REFERENCES Request(request_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS OnlineDonationRequests (
+        request_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        name TEXT NOT NULL,
+        blood_group TEXT NOT NULL,
+        contact TEXT,
+        city TEXT,
+        amount INTEGER CHECK(amount > 0),
+        status TEXT DEFAULT 'Pending',
+        request_date TEXT,
+        FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS OnlineRequest (
+        online_request_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        recipient_name TEXT NOT NULL,
+        blood_group TEXT NOT NULL,
+        req_units INTEGER CHECK(req_units > 0),
+        status TEXT DEFAULT 'Pending',
+        request_date TEXT,
+        FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Notifications (
+        notification_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        message TEXT NOT NULL,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        sent_by TEXT DEFAULT 'Admin'
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Camp (
+        camp_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        camp_name TEXT NOT NULL,
+        location TEXT NOT NULL,
+        camp_date TEXT NOT NULL,
+        description TEXT,
+        total_donations INTEGER DEFAULT 0,
+        total_units INTEGER DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS CampRegistrations (
+        registration_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        camp_id INTEGER NOT NULL,
+        user_id INTEGER,
+        donor_name TEXT,
+        amount INTEGER,
+        mode TEXT CHECK(mode IN ('online', 'admin')) DEFAULT 'online',
+        status TEXT CHECK(status IN ('Pending', 'Confirmed')) DEFAULT 'Pending',
+        registered_on TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (camp_id) REFERENCES Camp(camp_id) ON DELETE CASCADE,
+        FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE SET NULL,
+        UNIQUE (camp_id, user_id)
+    )
+    """,
+
+    "CREATE INDEX IF NOT EXISTS idx_camp_date ON Camp(camp_date)",
+    "CREATE INDEX IF NOT EXISTS idx_user_id ON CampRegistrations(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_allocation_request ON RequestAllocation(request_id)",
+    # list filters (rowid is implicit in each index, so keyset order comes free)
+    "CREATE INDEX IF NOT EXISTS idx_donor_blood_group ON Donor(blood_group)",
+    "CREATE INDEX IF NOT EXISTS idx_donor_city ON Donor(city)",
+    "CREATE INDEX IF NOT EXISTS idx_recipient_blood_group ON Recipient(blood_group)",
+    "CREATE INDEX IF NOT EXISTS idx_request_status ON Request(status)",
+    "CREATE INDEX IF NOT EXISTS idx_request_blood_group ON Request(blood_group)",
+    "CREATE INDEX IF NOT EXISTS idx_request_date ON Request(request_date)",
+    "CREATE INDEX IF NOT EXISTS idx_donation_date ON Donation(donation_date)",
+    "CREATE INDEX IF NOT EXISTS idx_registration_camp ON CampRegistrations(camp_id)",
+    """
+    CREATE INDEX IF NOT EXISTS idx_lot_group_expiry ON BloodLot(blood_group, expiry_date)
+    WHERE remaining_units > 0
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_lot_expired ON BloodLot(expired_units) WHERE expired_units > 0",
+
+    # stats counters, kept current by triggers so dashboards never scan Donor/Request
+    """
+    CREATE TABLE IF NOT EXISTS StatsCounter (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    # seeded from the current data (a pre-migration database may have rows)
+    "INSERT OR IGNORE INTO StatsCounter SELECT 'donors', COUNT(*) FROM Donor",
+    "INSERT OR IGNORE INTO StatsCounter SELECT 'stock_units', COALESCE(SUM(available_units), 0) FROM BloodStock",
+    "INSERT OR IGNORE INTO StatsCounter SELECT 'expired_lots', COUNT(*) FROM BloodLot WHERE expired_units > 0",
+    *[
+        f"INSERT OR IGNORE INTO StatsCounter SELECT 'requests:{status}', COUNT(*) FROM Request WHERE status='{status}'"
+        for status in ("Pending", "Fulfilled", "Partially Fulfilled", "Rejected")
+    ],
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_donor_ins AFTER INSERT ON Donor BEGIN
+        UPDATE StatsCounter SET value = value + 1 WHERE name = 'donors';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_donor_del AFTER DELETE ON Donor BEGIN
+        UPDATE StatsCounter SET value = value - 1 WHERE name = 'donors';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_request_ins AFTER INSERT ON Request BEGIN
+        UPDATE StatsCounter SET value = value + 1 WHERE name = 'requests:' || NEW.status;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_request_upd AFTER UPDATE OF status ON Request
+    WHEN OLD.status IS NOT NEW.status BEGIN
+        UPDATE StatsCounter SET value = value - 1 WHERE name = 'requests:' || OLD.status;
+        UPDATE StatsCounter SET value = value + 1 WHERE name = 'requests:' || NEW.status;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_request_del AFTER DELETE ON Request BEGIN
+        UPDATE StatsCounter SET value = value - 1 WHERE name = 'requests:' || OLD.status;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_stock_ins AFTER INSERT ON BloodStock BEGIN
+        UPDATE StatsCounter SET value = value + COALESCE(NEW.available_units, 0) WHERE name = 'stock_units';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_stock_upd AFTER UPDATE OF available_units ON BloodStock BEGIN
+        UPDATE StatsCounter SET value = value + NEW.available_units - OLD.available_units
+        WHERE name = 'stock_units';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_stock_del AFTER DELETE ON BloodStock BEGIN
+        UPDATE StatsCounter SET value = value - OLD.available_units WHERE name = 'stock_units';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_lot_expired AFTER UPDATE OF expired_units ON BloodLot
+    WHEN OLD.expired_units = 0 AND NEW.expired_units > 0 BEGIN
+        UPDATE StatsCounter SET value = value + 1 WHERE name = 'expired_lots';
+    END
+    """,
+]
+
+
+def search_tag(row=""):
+    # a donor's blood group and city as one DonorSearch token (hex keeps it
+    # a single word); donor_search.py builds the same for a filtered search
+    return f"'x' || hex({row}blood_group || '|' || {row}city)"
+
+
+# per-row INSERT triggers that a bulk load holds off while a BulkLoad row
+# names their table (bulk_import.py), as (trigger, table, per-row body, the
+# same work done once for every row past :last). Migration 11 added the
+# guard; a later migration changing one of them re-creates it from here.
+BULK_DEFERRED = [
+    (
+        "trg_stats_donor_ins", "Donor",
+        "UPDATE StatsCounter SET value = value + 1 WHERE name = 'donors'",
+        """
+        UPDATE StatsCounter SET value = value + (SELECT COUNT(*) FROM Donor WHERE donor_id > :last)
+        WHERE name = 'donors'
+        """,
+    ),
+    (
+        "trg_version_donor_insert", "Donor",
+        "UPDATE TableVersion SET version = version + 1 WHERE name = 'Donor'",
+        "UPDATE TableVersion SET version = version + 1 WHERE name = 'Donor'",
+    ),
+    (
+        "trg_search_donor_ins", "Donor",
+        f"INSERT INTO DonorSearch (rowid, name, tag) VALUES (NEW.donor_id, NEW.name, {search_tag('NEW.')})",
+        "INSERT INTO DonorSearch (rowid, name, tag) SELECT donor_id, name, tag FROM DonorSearchSource WHERE donor_id > :last",
+    ),
+    (
+        "trg_rollup_donor_ins", "Donation",
+        """
+        INSERT INTO DonorRollup (donor_id, donations, units, last_donation)
+        VALUES (NEW.donor_id, 1, NEW.amount, NEW.donation_date)
+        ON CONFLICT(donor_id) DO UPDATE SET
+            donations = donations + 1,
+            units = units + excluded.units,
+            last_donation = COALESCE(MAX(last_donation, excluded.last_donation), last_donation, excluded.last_donation)
+        """,
+        """
+        INSERT INTO DonorRollup (donor_id, donations, units, last_donation)
+        SELECT donor_id, COUNT(*), SUM(amount), MAX(donation_date) FROM Donation
+        WHERE donation_id > :last GROUP BY donor_id
+        ON CONFLICT(donor_id) DO UPDATE SET
+            donations = donations + excluded.donations,
+            units = units + excluded.units,
+            last_donation = COALESCE(MAX(last_donation, excluded.last_donation), last_donation, excluded.last_donation)
+        """,
+    ),
+    (
+        "trg_version_donation_insert", "Donation",
+        "UPDATE TableVersion SET version = version + 1 WHERE name = 'Donation'",
+        "UPDATE TableVersion SET version = version + 1 WHERE name = 'Donation'",
+    ),
+]
+
+
+def guarded_triggers(deferred):
+    # re-create each trigger to skip its rows while its table is being bulk loaded
+    return [
+        statement
+        for name, table, body, _ in deferred
+        for statement in (
+            f"DROP TRIGGER IF EXISTS {name}",
+            f"""
+            CREATE TRIGGER {name} AFTER INSERT ON {table}
+            WHEN NOT EXISTS (SELECT 1 FROM BulkLoad WHERE name = '{table}') BEGIN
+                {body};
+            END
+            """,
+        )
+    ]
+
+
+# (version, description, steps), applied in order
+MIGRATIONS = [
+    (1, "base schema, indexes for the remaining routes.py lookups", [
+        *BASE_SCHEMA,
+        # user_dashboard / camp_register_admin link donors by name
+        "CREATE INDEX IF NOT EXISTS idx_donor_name ON Donor(name)",
+        # request_blood finds the user's Recipient row by name
+        "CREATE INDEX IF NOT EXISTS idx_recipient_name ON Recipient(name)",
+        # user_dashboard recent requests (rowid order comes with the index)
+        "CREATE INDEX IF NOT EXISTS idx_request_recipient ON Request(recipient_name)",
+        # user_dashboard stats + history, covering so Donation is never touched
+        "CREATE INDEX IF NOT EXISTS idx_donation_donor_date ON Donation(donor_id, donation_date, amount)",
+        # latest-notifications lists
+        "CREATE INDEX IF NOT EXISTS idx_notification_created ON Notifications(created_at)",
+    ]),
+    (2, "normalise Camp.camp_date to ISO dates", [
+        # rows whose date() form differs (e.g. '2025-03-01T10:00'); unparseable
+        # values are left alone rather than nulled
+        backfill("Camp", """
+            UPDATE Camp SET camp_date = date(camp_date)
+            WHERE date(camp_date) IS NOT NULL AND camp_date <> date(camp_date)
+              AND rowid > :lo AND rowid <= :hi
+        """),
+    ]),
+    (3, "journal offset for group-committed camp intake", [
+        # last journal byte applied; updated in the same transaction as the events
+        """
+        CREATE TABLE IF NOT EXISTS IngestOffset (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+        """,
+    ]),
+    (4, "trigger-maintained camp, donor and group/day donation rollups", [
+        # which camp a donation came from (camp_location is display text only)
+        "ALTER TABLE Donation ADD COLUMN camp_id INTEGER REFERENCES Camp(camp_id) ON DELETE SET NULL",
+        "CREATE INDEX IF NOT EXISTS idx_donation_camp ON Donation(camp_id)",
+        # record_donation stored 'name — location'; donate stored the bare
+        # location, which is only trusted when a single camp has it
+        backfill("Donation", """
+            UPDATE Donation SET camp_id = COALESCE(
+                (SELECT c.camp_id FROM Camp c WHERE Donation.camp_location = c.camp_name || ' — ' || c.location),
+                (SELECT MAX(c.camp_id) FROM Camp c WHERE c.location = Donation.camp_location
+                 HAVING COUNT(*) = 1)
+            )
+            WHERE camp_id IS NULL AND camp_location IS NOT NULL AND rowid > :lo AND rowid <= :hi
+        """),
+
+        # per camp: Camp.total_donations / total_units, now derived from Donation
+        """
+        UPDATE Camp SET
+            total_donations = (SELECT COUNT(*) FROM Donation d WHERE d.camp_id = Camp.camp_id),
+            total_units = (SELECT COALESCE(SUM(amount), 0) FROM Donation d WHERE d.camp_id = Camp.camp_id)
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_camp_ins AFTER INSERT ON Donation
+        WHEN NEW.camp_id IS NOT NULL BEGIN
+            UPDATE Camp SET total_donations = total_donations + 1, total_units = total_units + NEW.amount
+            WHERE camp_id = NEW.camp_id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_camp_del AFTER DELETE ON Donation
+        WHEN OLD.camp_id IS NOT NULL BEGIN
+            UPDATE Camp SET total_donations = total_donations - 1, total_units = total_units - OLD.amount
+            WHERE camp_id = OLD.camp_id;
+        END
+        """,
+
+        # per donor: what user_dashboard shows
+        """
+        CREATE TABLE IF NOT EXISTS DonorRollup (
+            donor_id INTEGER PRIMARY KEY REFERENCES Donor(donor_id) ON DELETE CASCADE,
+            donations INTEGER NOT NULL DEFAULT 0,
+            units INTEGER NOT NULL DEFAULT 0,
+            last_donation TEXT
+        )
+        """,
+        """
+        INSERT INTO DonorRollup (donor_id, donations, units, last_donation)
+        SELECT donor_id, COUNT(*), COALESCE(SUM(amount), 0), MAX(donation_date) FROM Donation GROUP BY donor_id
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_donor_ins AFTER INSERT ON Donation BEGIN
+            INSERT INTO DonorRollup (donor_id, donations, units, last_donation)
+            VALUES (NEW.donor_id, 1, NEW.amount, NEW.donation_date)
+            ON CONFLICT(donor_id) DO UPDATE SET
+                donations = donations + 1,
+                units = units + excluded.units,
+                last_donation = COALESCE(MAX(last_donation, excluded.last_donation), last_donation, excluded.last_donation);
+        END
+        """,
+        # last_donation may be the deleted row: re-read it (idx_donation_donor_date)
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_donor_del AFTER DELETE ON Donation BEGIN
+            UPDATE DonorRollup SET
+                donations = donations - 1,
+                units = units - OLD.amount,
+                last_donation = (SELECT MAX(donation_date) FROM Donation WHERE donor_id = OLD.donor_id)
+            WHERE donor_id = OLD.donor_id;
+        END
+        """,
+
+        # per blood group per day: units collected, from the donation's lot
+        """
+        CREATE TABLE IF NOT EXISTS GroupDailyRollup (
+            blood_group TEXT NOT NULL,
+            day TEXT NOT NULL,
+            donations INTEGER NOT NULL DEFAULT 0,
+            units INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (blood_group, day)
+        ) WITHOUT ROWID
+        """,
+        """
+        INSERT INTO GroupDailyRollup (blood_group, day, donations, units)
+        SELECT blood_group, collected_on, COUNT(*), SUM(units) FROM BloodLot
+        WHERE collected_on IS NOT NULL GROUP BY blood_group, collected_on
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_group_ins AFTER INSERT ON BloodLot
+        WHEN NEW.collected_on IS NOT NULL BEGIN
+            INSERT INTO GroupDailyRollup (blood_group, day, donations, units)
+            VALUES (NEW.blood_group, NEW.collected_on, 1, NEW.units)
+            ON CONFLICT(blood_group, day) DO UPDATE SET
+                donations = donations + 1, units = units + excluded.units;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_group_del AFTER DELETE ON BloodLot
+        WHEN OLD.collected_on IS NOT NULL BEGIN
+            UPDATE GroupDailyRollup SET donations = donations - 1, units = units - OLD.units
+            WHERE blood_group = OLD.blood_group AND day = OLD.collected_on;
+        END
+        """,
+    ]),
+    (5, "append-only stock movement ledger with hourly/daily aggregates", [
+        # one row per change of BloodStock.available_units, whoever made it
+        """
+        CREATE TABLE IF NOT EXISTS StockMovement (
+            movement_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            blood_group TEXT NOT NULL,
+            delta INTEGER NOT NULL,
+            balance INTEGER NOT NULL,
+            moved_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now'))
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS StockHourly (
+            blood_group TEXT NOT NULL,
+            hour TEXT NOT NULL,
+            units_in INTEGER NOT NULL DEFAULT 0,
+            units_out INTEGER NOT NULL DEFAULT 0,
+            closing INTEGER NOT NULL,
+            PRIMARY KEY (blood_group, hour)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS StockDaily (
+            blood_group TEXT NOT NULL,
+            day TEXT NOT NULL,
+            units_in INTEGER NOT NULL DEFAULT 0,
+            units_out INTEGER NOT NULL DEFAULT 0,
+            closing INTEGER NOT NULL,
+            PRIMARY KEY (blood_group, day)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_movement_stock_ins AFTER INSERT ON BloodStock
+        WHEN COALESCE(NEW.available_units, 0) <> 0 BEGIN
+            INSERT INTO StockMovement (blood_group, delta, balance)
+            VALUES (NEW.blood_group, NEW.available_units, NEW.available_units);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_movement_stock_upd AFTER UPDATE OF available_units ON BloodStock
+        WHEN NEW.available_units IS NOT OLD.available_units BEGIN
+            INSERT INTO StockMovement (blood_group, delta, balance)
+            VALUES (NEW.blood_group, COALESCE(NEW.available_units, 0) - COALESCE(OLD.available_units, 0),
+                    COALESCE(NEW.available_units, 0));
+        END
+        """,
+        # downsampled as each movement lands; closing = balance after the last one
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_movement_rollup AFTER INSERT ON StockMovement BEGIN
+            INSERT INTO StockHourly (blood_group, hour, units_in, units_out, closing)
+            VALUES (NEW.blood_group, substr(NEW.moved_at, 1, 13) || ':00',
+                    MAX(NEW.delta, 0), MAX(-NEW.delta, 0), NEW.balance)
+            ON CONFLICT(blood_group, hour) DO UPDATE SET
+                units_in = units_in + excluded.units_in,
+                units_out = units_out + excluded.units_out,
+                closing = excluded.closing;
+            INSERT INTO StockDaily (blood_group, day, units_in, units_out, closing)
+            VALUES (NEW.blood_group, substr(NEW.moved_at, 1, 10),
+                    MAX(NEW.delta, 0), MAX(-NEW.delta, 0), NEW.balance)
+            ON CONFLICT(blood_group, day) DO UPDATE SET
+                units_in = units_in + excluded.units_in,
+                units_out = units_out + excluded.units_out,
+                closing = excluded.closing;
+        END
+        """,
+        # opening balances (delta 0, so they are not counted as inflow)
+        """
+        INSERT INTO StockMovement (blood_group, delta, balance)
+        SELECT blood_group, 0, available_units FROM BloodStock WHERE available_units <> 0
+        """,
+    ]),
+    (6, "table version counters for the fragment cache", [
+        "CREATE TABLE IF NOT EXISTS TableVersion (name TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)",
+        *version_statements(VERSIONED_TABLES),
+    ]),
+    (7, "targeted notifications, per-user read cursors and unread counters", [
+        # NULL = everyone; otherwise a label such as "O- in Pune"
+        "ALTER TABLE Notifications ADD COLUMN audience TEXT",
+        # broadcast feed in id order without touching targeted rows
+        "CREATE INDEX IF NOT EXISTS idx_notification_broadcast ON Notifications(notification_id) WHERE audience IS NULL",
+        # one row per recipient of a targeted notification
+        """
+        CREATE TABLE IF NOT EXISTS NotificationInbox (
+            user_id INTEGER NOT NULL REFERENCES Users(user_id) ON DELETE CASCADE,
+            notification_id INTEGER NOT NULL REFERENCES Notifications(notification_id) ON DELETE CASCADE,
+            PRIMARY KEY (user_id, notification_id)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_inbox_notification ON NotificationInbox(notification_id)",
+        # audience selection (blood group + city, user_id covered)
+        "CREATE INDEX IF NOT EXISTS idx_donor_group_city ON Donor(blood_group, city, user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_registration_camp_user ON CampRegistrations(camp_id, user_id)",
+        # read cursor; unread = broadcasts - seen_broadcasts + targeted_unread
+        """
+        CREATE TABLE IF NOT EXISTS NotificationCursor (
+            user_id INTEGER PRIMARY KEY REFERENCES Users(user_id) ON DELETE CASCADE,
+            last_seen_id INTEGER NOT NULL DEFAULT 0,
+            seen_broadcasts INTEGER NOT NULL DEFAULT 0,
+            targeted_unread INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        "INSERT OR IGNORE INTO StatsCounter SELECT 'notifications:broadcast', COUNT(*) FROM Notifications",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_notification_broadcast_ins AFTER INSERT ON Notifications
+        WHEN NEW.audience IS NULL BEGIN
+            UPDATE StatsCounter SET value = value + 1 WHERE name = 'notifications:broadcast';
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_notification_broadcast_del AFTER DELETE ON Notifications
+        WHEN OLD.audience IS NULL BEGIN
+            UPDATE StatsCounter SET value = value - 1 WHERE name = 'notifications:broadcast';
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_inbox_unread_ins AFTER INSERT ON NotificationInbox BEGIN
+            INSERT INTO NotificationCursor (user_id, targeted_unread) VALUES (NEW.user_id, 1)
+            ON CONFLICT(user_id) DO UPDATE SET
+                targeted_unread = targeted_unread + (NEW.notification_id > last_seen_id);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_inbox_unread_del AFTER DELETE ON NotificationInbox BEGIN
+            UPDATE NotificationCursor SET targeted_unread = MAX(targeted_unread - 1, 0)
+            WHERE user_id = OLD.user_id AND OLD.notification_id > last_seen_id;
+        END
+        """,
+    ]),
+    (8, "full-text donor name index for typeahead search", [
+        # word tokens of Donor.name (case and accent folded), with 2- and
+        # 3-letter prefix indexes so short typeahead prefixes stay cheap
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS DonorSearch USING fts5(
+            name, content='Donor', content_rowid='donor_id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        """,
+        # distinct indexed words, for fuzzy matching (donor_search.py)
+        "CREATE VIRTUAL TABLE IF NOT EXISTS DonorSearchTerms USING fts5vocab(DonorSearch, 'row')",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_search_donor_ins AFTER INSERT ON Donor BEGIN
+            INSERT INTO DonorSearch (rowid, name) VALUES (NEW.donor_id, NEW.name);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_search_donor_del AFTER DELETE ON Donor BEGIN
+            INSERT INTO DonorSearch (DonorSearch, rowid, name) VALUES ('delete', OLD.donor_id, OLD.name);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_search_donor_upd AFTER UPDATE OF name ON Donor BEGIN
+            INSERT INTO DonorSearch (DonorSearch, rowid, name) VALUES ('delete', OLD.donor_id, OLD.name);
+            INSERT INTO DonorSearch (rowid, name) VALUES (NEW.donor_id, NEW.name);
+        END
+        """,
+        "INSERT INTO DonorSearch (DonorSearch) VALUES ('rebuild')",
+    ]),
+    (9, "event log for multi-process SSE, versions for the dashboard snapshot", [
+        # every worker process appends its events here and tails everyone's
+        # (events.py relay mode); AUTOINCREMENT so pruned ids are never reused
+        """
+        CREATE TABLE IF NOT EXISTS EventLog (
+            event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic TEXT NOT NULL,
+            data TEXT NOT NULL,
+            recipients TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # stats.py reuses its snapshot until one of these changes in any process
+        *version_statements(SNAPSHOT_TABLES),
+    ]),
+    (10, "index for the camp registrations status filter", [
+        # camp_registrations?status= pages newest first (rowid order comes with the index)
+        "CREATE INDEX IF NOT EXISTS idx_registration_status ON CampRegistrations(status)",
+    ]),
+    (11, "bulk-load guard on the per-row insert bookkeeping triggers", [
+        # a row per table being bulk loaded; inserted and deleted inside the
+        # load's own transaction, so other connections never see one
+        "CREATE TABLE IF NOT EXISTS BulkLoad (name TEXT PRIMARY KEY) WITHOUT ROWID",
+        *guarded_triggers(BULK_DEFERRED),
+    ]),
+    (12, "blood group + city token in the donor search index", [
+        # a search filtered on both narrows the match inside the index
+        # instead of joining every name hit to Donor to check them
+        "DROP TRIGGER IF EXISTS trg_search_donor_ins",
+        "DROP TRIGGER IF EXISTS trg_search_donor_del",
+        "DROP TRIGGER IF EXISTS trg_search_donor_upd",
+        "DROP TABLE IF EXISTS DonorSearchTerms",
+        "DROP TABLE IF EXISTS DonorSearch",
+        f"CREATE VIEW IF NOT EXISTS DonorSearchSource AS SELECT donor_id, name, {search_tag()} AS tag FROM Donor",
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS DonorSearch USING fts5(
+            name, tag, content='DonorSearchSource', content_rowid='donor_id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        """,
+        # bm25 on the name only
+        "INSERT INTO DonorSearch (DonorSearch, rank) VALUES ('rank', 'bm25(1.0, 0.0)')",
+        # per-column counts, so the fuzzy matcher reads name words only
+        "CREATE VIRTUAL TABLE IF NOT EXISTS DonorSearchTerms USING fts5vocab(DonorSearch, 'col')",
+        *guarded_triggers([trigger for trigger in BULK_DEFERRED if trigger[0] == "trg_search_donor_ins"]),
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_search_donor_del AFTER DELETE ON Donor BEGIN
+            INSERT INTO DonorSearch (DonorSearch, rowid, name, tag)
+            VALUES ('delete', OLD.donor_id, OLD.name, {search_tag('OLD.')});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_search_donor_upd AFTER UPDATE OF name, blood_group, city ON Donor BEGIN
+            INSERT INTO DonorSearch (DonorSearch, rowid, name, tag)
+            VALUES ('delete', OLD.donor_id, OLD.name, {search_tag('OLD.')});
+            INSERT INTO DonorSearch (rowid, name, tag) VALUES (NEW.donor_id, NEW.name, {search_tag('NEW.')});
+        END
+        """,
+        "INSERT INTO DonorSearch (DonorSearch) VALUES ('rebuild')",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def begin(conn, number):
+    # write lock for migration `number`; False when another process
+    # finished it while we waited
+    conn.execute("BEGIN IMMEDIATE")
+    if current_version(conn) >= number:
+        conn.rollback()
+        return False
+    return True
+
+
+PROGRESS_TABLE = """
+    CREATE TABLE IF NOT EXISTS MigrationProgress (
+        version INTEGER PRIMARY KEY,
+        step INTEGER NOT NULL,     -- index of the first step not yet committed
+        cursor INTEGER NOT NULL    -- rowid that step's backfill has reached
+    )
+"""
+
+
+def load_progress(conn, number):
+    row = conn.execute("SELECT step, cursor FROM MigrationProgress WHERE version = ?", (number,)).fetchone()
+    return row or (0, 0)
+
+
+def save_progress(conn, number, step, cursor):
+    conn.execute(
+        """
+        INSERT INTO MigrationProgress (version, step, cursor) VALUES (?, ?, ?)
+        ON CONFLICT(version) DO UPDATE SET step = excluded.step, cursor = excluded.cursor
+        """,
+        (number, step, cursor),
+    )
+
+
+def run_backfill(conn, number, index, step, cursor, report=None):
+    # entered and left holding the write lock; the steps before this one
+    # commit with its first range. -> (next step, its cursor), or None when
+    # another process finished the migration in between
+    _, table, sql, batch = step
+    batch = batch or BACKFILL_BATCH
+    top = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+    lo = cursor
+    locked = time.perf_counter()
+    while lo < top:
+        hi = min(lo + batch, top)
+        conn.execute(sql, {"lo": lo, "hi": hi})
+        save_progress(conn, number, index, hi)
+        conn.commit()
+        held = time.perf_counter() - locked
+        if report:
+            report(number, table, hi, top)
+        time.sleep(held * BACKFILL_YIELD)
+        locked = time.perf_counter()
+        if not begin(conn, number):
+            return None
+        # a second process may be running the same backfill
+        at_step, at_cursor = load_progress(conn, number)
+        if at_step > index:
+            return at_step, at_cursor
+        lo = max(hi, at_cursor)
+    return index + 1, 0
+
+
+def apply_migration(conn, number, steps, report=None):
+    # -> False when another process applied it first
+    if not begin(conn, number):
+        return False
+    try:
+        tracked = any(is_backfill(step) for step in steps)
+        index, cursor = 0, 0
+        if tracked:
+            conn.execute(PROGRESS_TABLE)
+            index, cursor = load_progress(conn, number)
+        while index < len(steps):
+            step = steps[index]
+            if not is_backfill(step):
+                conn.execute(step)
+                index += 1
+                continue
+            resumed = run_backfill(conn, number, index, step, cursor, report)
+            if resumed is None:
+                return False
+            index, cursor = resumed
+        if tracked:
+            conn.execute("DELETE FROM MigrationProgress WHERE version = ?", (number,))
+        conn.execute(f"PRAGMA user_version = {number}")
+        conn.commit()
+    except BaseException:
+        # a backfill's finished ranges stay committed, with their progress
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    return True
+
+
+def pending(conn, target=None):
+    version = current_version(conn)
+    target = LATEST_VERSION if target is None else target
+    return [m for m in MIGRATIONS if version < m[0] <= target]
+
+
+def plan(conn, target=None):
+    # -> [(version, description, statement count, [(table, rows, reached)])];
+    # rows is None for a table an earlier step creates; reached is the rowid
+    # an interrupted run got to (0: from the start, None: already done)
+    try:
+        interrupted = {number for (number,) in conn.execute("SELECT version FROM MigrationProgress")}
+    except sqlite3.OperationalError:
+        interrupted = set()
+    planned = []
+    for number, description, steps in pending(conn, target):
+        at_step, at_cursor = load_progress(conn, number) if number in interrupted else (0, 0)
+        backfills = []
+        for index, step in enumerate(steps):
+            if not is_backfill(step):
+                continue
+            try:
+                rows = conn.execute(f"SELECT COUNT(*) FROM {step[1]}").fetchone()[0]
+            except sqlite3.OperationalError:
+                rows = None
+            reached = None if index < at_step else at_cursor if index == at_step else 0
+            backfills.append((step[1], rows, reached))
+        planned.append((number, description, len(steps) - len(backfills), backfills))
+    return planned
+
+
+def apply_migrations(conn, target=None, report=None):
+    # each migration and its version bump commit together, or not at all
+    # (a backfill commits range by range and resumes)
+    applied = []
+    for number, description, steps in pending(conn, target):
+        if apply_migration(conn, number, steps, report):
+            applied.append((number, description))
+    return applied
@@ -0,0 +1,122 @@
+# notifications.py - broadcast and targeted notifications, per-user read
+# cursors and unread counts
+#
+# a broadcast is one Notifications row (audience NULL). A targeted one also
+# gets a NotificationInbox row per recipient, written by a single
+# INSERT ... SELECT however large the audience. Triggers keep the broadcast
+# total (StatsCounter) and each user's targeted_unread (NotificationCursor)
+# current, so the unread count is two primary-key lookups.
+
+FEED_SIZE = 5
+
+UNREAD_SQL = """
+    SELECT MAX(b.value - COALESCE(c.seen_broadcasts, 0) + COALESCE(c.targeted_unread, 0), 0)
+    FROM StatsCounter b
+    LEFT JOIN NotificationCursor c ON c.user_id = ?
+    WHERE b.name = 'notifications:broadcast'
+"""
+
+
+def audience_filter(conn, blood_group=None, city=None, camp_id=None):
+    # (label or None, conditions on Users.user_id, params); no filter = broadcast
+    donor, label, conditions, params = [], [], [], []
+    if blood_group:
+        donor.append("blood_group = ?")
+        params.append(blood_group)
+        label.append(f"{blood_group} donors")
+    if city:
+        donor.append("city = ?")
+        params.append(city)
+        label.append(f"in {city}")
+    if donor:
+        conditions.append(f"user_id IN (SELECT user_id FROM Donor WHERE {' AND '.join(donor)})")
+    if camp_id:
+        conditions.append("user_id IN (SELECT user_id FROM CampRegistrations WHERE camp_id = ?)")
+        params.append(camp_id)
+        camp = conn.execute("SELECT camp_name FROM Camp WHERE camp_id = ?", (camp_id,)).fetchone()
+        label.append(f"registered for {camp[0] if camp else f'camp #{camp_id}'}")
+    if not conditions:
+        return None, [], []
+    if not blood_group:
+        label.insert(0, "users")
+    return " ".join(label), conditions, params
+
+
+def send(conn, title, message, blood_group=None, city=None, camp_id=None):
+    # -> (notification_id, created_at, audience, recipient count or None for
+    # everyone); the caller commits
+    audience, conditions, params = audience_filter(conn, blood_group, city, camp_id)
+    notification_id, created_at = conn.execute(
+        "INSERT INTO Notifications (title, message, audience) VALUES (?, ?, ?) RETURNING notification_id, created_at",
+        (title, message, audience),
+    ).fetchone()
+    if not conditions:
+        return notification_id, created_at, None, None
+    delivered = conn.execute(
+        f"""
+        INSERT INTO NotificationInbox (user_id, notification_id)
+        SELECT user_id, ? FROM Users WHERE role = 'user' AND {' AND '.join(conditions)}
+        """,
+        [notification_id] + params,
+    ).rowcount
+    return notification_id, created_at, audience, delivered
+
+
+def recipients(conn, notification_id):
+    # user ids a targeted notification was delivered to (for live push)
+    return frozenset(
+        user_id for (user_id,) in conn.execute(
+            "SELECT user_id FROM NotificationInbox WHERE notification_id = ?", (notification_id,)
+        )
+    )
+
+
+def feed(conn, user_id, limit=FEED_SIZE):
+    # latest broadcasts merged with the user's inbox, newest first
+    return conn.execute(
+        """
+        SELECT title, message, created_at, notification_id, audience
+        FROM Notifications
+        WHERE notification_id IN (
+            SELECT notification_id FROM (
+                SELECT notification_id FROM Notifications WHERE audience IS NULL
+                ORDER BY notification_id DESC LIMIT ?
+            )
+            UNION ALL
+            SELECT notification_id FROM (
+                SELECT notification_id FROM NotificationInbox WHERE user_id = ?
+                ORDER BY notification_id DESC LIMIT ?
+            )
+        )
+        ORDER BY notification_id DESC LIMIT ?
+        """,
+        (limit, user_id, limit, limit),
+    ).fetchall()
+
+
+def last_seen(conn, user_id):
+    row = conn.execute("SELECT last_seen_id FROM NotificationCursor WHERE user_id = ?", (user_id,)).fetchone()
+    return row[0] if row else 0
+
+
+def mark_read(conn, user_id):
+    # move the cursor past everything sent so far; the caller commits
+    conn.execute(
+        """
+        INSERT INTO NotificationCursor (user_id, last_seen_id, seen_broadcasts, targeted_unread)
+        SELECT ?, COALESCE((SELECT MAX(notification_id) FROM Notifications), 0),
+               (SELECT value FROM StatsCounter WHERE name = 'notifications:broadcast'), 0
+        WHERE true
+        ON CONFLICT(user_id) DO UPDATE SET
+            last_seen_id = excluded.last_seen_id,
+            seen_broadcasts = excluded.seen_broadcasts,
+            targeted_unread = 0
+        """,
+        (user_id,),
+    )
+
+
+def unread_count(conn, user_id):
+    # two primary-key lookups; not cached in-process, since a cursor moved
+    # by another worker process would leave a cached count stale
+    return conn.execute(UNREAD_SQL, (user_id,)).fetchone()[0]
@@ -0,0 +1,101 @@
+from collections.abc import Mapping
+
+from flask import request, url_for
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def page_size():
+    try:
+        size = int(request.args.get("size", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        size = DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def cursor_arg(name):
+    value = request.args.get(name, "")
+    return int(value) if value.isdigit() else None
+
+
+def active_filters(clauses):
+    # non-empty filter values from the query string, for the given
+    # {arg name: SQL condition} mapping
+    return {name: request.args[name].strip() for name in clauses if request.args.get(name, "").strip()}
+
+
+def filter_conditions(filters, clauses):
+    return [clauses[name] for name in filters], [filters[name] for name in filters]
+
+
+def keyset_page(cur, sql, key, conditions=(), params=(), descending=False):
+    # one page of `sql` ordered by the unique integer `key` (which must be
+    # the first selected column). Seeks past the cursor instead of using
+    # OFFSET, so every page costs the same however deep it is.
+    size = page_size()
+    after, before = cursor_arg("after"), cursor_arg("before")
+    backwards = before is not None and after is None
+
+    conditions, params = list(conditions), list(params)
+    if backwards:
+        conditions.append(f"{key} {'>' if descending else '<'} ?")
+        params.append(before)
+    elif after is not None:
+        conditions.append(f"{key} {'<' if descending else '>'} ?")
+        params.append(after)
+
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    order = "ASC" if descending == backwards else "DESC"
+    cur.execute(f"{sql}{where} ORDER BY {key} {order} LIMIT ?", (*params, size + 1))
+    rows = cur.fetchall()
+
+    has_more = len(rows) > size
+    rows = rows[:size]
+    if backwards:
+        rows.reverse()
+
+    page = {"rows": rows, "next": None, "prev": None}
+    if rows:
+        if has_more or backwards:
+            page["next"] = rows[-1][0]
+        if (has_more and backwards) or (not backwards and after is not None):
+            page["prev"] = rows[0][0]
+    return page
+
+
+def page_links(page, endpoint, filters):
+    # next/prev URLs that keep the current filters and page size
+    args = dict(filters)
+    if "size" in request.args:
+        args["size"] = page_size()
+    page["next_url"] = url_for(endpoint, after=page["next"], **args) if page["next"] is not None else None
+    page["prev_url"] = url_for(endpoint, before=page["prev"], **args) if page["prev"] is not None else None
+    page["filters"] = filters
+    return page
+
+
+class LazyPage(Mapping):
+    # a page whose filters are known up front but whose rows and links are
+    # only queried on first use (a cached fragment may never need them)
+
+    def __init__(self, filters, loader):
+        self.filters = filters
+        self._loader = loader
+        self._page = None
+
+    def _load(self):
+        if self._page is None:
+            self._page = self._loader()
+        return self._page
+
+    def __getitem__(self, key):
+        if key == "filters":
+            return self.filters
+        return self._load()[key]
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
@@ -0,0 +1,370 @@
+# profiling.py - per-route timings, a slow-query log and Prometheus metrics
+#
+# pooled connections are TracedConnections, whose cursors time every
+# execute and fetch. Time, statements and rows add up on the current
+# request's trace (a thread-local, set by the before_request hook), and
+# after_request files them under the endpoint:
+#   wall    until the view returned a response (streamed bodies excluded)
+#   db      execute + fetch time of every statement
+#   render  template rendering (fragments.py measures it)
+# a statement slower than SLOW_QUERY_MS is logged to SLOW_QUERY_LOG with
+# the types of its parameters, never their values (passwords, Aadhaar
+# numbers), and kept for /slow_queries, which explains its query plan when
+# an admin looks; /metrics serves everything in the Prometheus text format.
+import functools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import g, has_request_context, request
+
+from db import get_db
+
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 100))
+SLOW_QUERY_LOG = os.environ.get("SLOW_QUERY_LOG", "slow_queries.log")
+SLOW_QUERY_KEEP = 100      # recent slow statements served by /slow_queries
+
+# histogram upper bounds (Prometheus "le"), seconds / counts
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+# name -> (kind, help, buckets)
+METRICS = {
+    "lifelink_request_duration_seconds": ("histogram", "Wall time per request.", TIME_BUCKETS),
+    "lifelink_request_db_seconds": ("histogram", "Time in SQLite execute and fetch calls per request.", TIME_BUCKETS),
+    "lifelink_request_render_seconds": ("histogram", "Template render time per request.", TIME_BUCKETS),
+    "lifelink_request_queries": ("histogram", "SQL statements executed per request.", COUNT_BUCKETS),
+    "lifelink_request_rows": ("histogram", "Rows fetched per request.", COUNT_BUCKETS),
+    "lifelink_responses_total": ("counter", "Responses by endpoint and status code.", None),
+    "lifelink_slow_queries_total": ("counter", f"Statements slower than {SLOW_QUERY_MS:g}ms.", None),
+}
+
+log = logging.getLogger("lifelink.slow_query")
+
+_local = threading.local()
+
+
+class RequestTrace:
+    __slots__ = ("started", "db", "queries", "rows")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db = 0.0
+        self.queries = 0
+        self.rows = 0
+
+
+def current_trace():
+    # the request's own trace first: asgi.py interleaves async views on the
+    # event loop's thread, whose thread-local is whichever started last
+    if has_request_context():
+        return g.get("trace")
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def use_trace(trace):
+    # account statements run on another thread (db_async.py) to `trace`
+    previous = getattr(_local, "trace", None)
+    _local.trace = trace
+    try:
+        yield
+    finally:
+        _local.trace = previous
+
+
+def _account(seconds, rows=0, query=False):
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        trace.db += seconds
+        trace.rows += rows
+        trace.queries += query
+
+
+class TracedCursor(sqlite3.Cursor):
+    # times execute/fetch calls; a statement's time runs until its rows are
+    # exhausted, the cursor is re-executed, closed or dropped. Rows read by
+    # iteration are only tallied per row and added to the trace at the end.
+
+    _sql = None
+    _params = None
+    _elapsed = 0.0
+    _iterated = 0.0
+    _iterated_rows = 0
+
+    def _begin(self, sql, params):
+        self._finish()
+        self._sql, self._params, self._elapsed = sql, params, 0.0
+
+    def _finish(self):
+        if self._iterated_rows or self._iterated:
+            _account(self._iterated, self._iterated_rows)
+            self._elapsed += self._iterated
+            self._iterated, self._iterated_rows = 0.0, 0
+        sql, self._sql = self._sql, None
+        if sql is not None and self._elapsed * 1000 >= SLOW_QUERY_MS:
+            slow_queries.record(self.connection, sql, self._params, self._elapsed)
+
+    def _timed(self, start, rows=0, query=False):
+        elapsed = time.perf_counter() - start
+        self._elapsed += elapsed
+        _account(elapsed, rows, query)
+
+    def execute(self, sql, params=()):
+        self._begin(sql, params)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            self._timed(start, query=True)
+
+    def executemany(self, sql, seq_of_params):
+        self._begin(sql, None)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_params)
+        finally:
+            self._timed(start, query=True)
+            self._finish()
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._timed(start, row is not None)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._timed(start, len(rows))
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._timed(start, len(rows))
+        self._finish()
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._iterated += time.perf_counter() - start
+            self._finish()
+            raise
+        self._iterated += time.perf_counter() - start
+        self._iterated_rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class TracedConnection(sqlite3.Connection):
+    # Connection.execute() would build a plain cursor, so route it through ours
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or TracedCursor)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+
+def param_types(params):
+    # what is kept of a statement's parameters: their types, in order or by name
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {name: type(value).__name__ for name, value in params.items()}
+    return [type(value).__name__ for value in params]
+
+
+def query_plan(conn, sql, types):
+    # EXPLAIN QUERY PLAN detail lines, on an untraced cursor. The plan does
+    # not depend on the values bound, so NULLs stand in for them
+    if types is None:
+        return ["(executemany: plan not captured)"]
+    nulls = dict.fromkeys(types) if isinstance(types, dict) else [None] * len(types)
+    try:
+        return [row[3] for row in sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, nulls)]
+    except sqlite3.Error as e:
+        return [f"(no plan: {e})"]
+
+
+class SlowQueryLog:
+    # recent slow statements, also appended to SLOW_QUERY_LOG as JSON lines
+
+    def __init__(self, keep=SLOW_QUERY_KEEP):
+        self._recent = deque(maxlen=keep)
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def record(self, conn, sql, params, elapsed):
+        # on the thread that ran the statement: no query plan here, it
+        # would only make a slow request slower
+        entry = {
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "endpoint": getattr(_local, "endpoint", None) or threading.current_thread().name,
+            "ms": round(elapsed * 1000, 3),
+            "sql": " ".join(sql.split()),
+            "params": param_types(params),
+        }
+        with self._lock:
+            self.total += 1
+            self._recent.append(entry)
+        log.warning(json.dumps(entry, ensure_ascii=False))
+
+    def recent(self, conn=None):
+        # newest first; with `conn` each entry gets its query plan,
+        # explained on that connection the first time it is served
+        with self._lock:
+            entries = list(reversed(self._recent))
+        if conn is not None:
+            for entry in entries:
+                if "plan" not in entry:
+                    entry["plan"] = query_plan(conn, entry["sql"], entry["params"])
+        return entries
+
+
+slow_queries = SlowQueryLog()
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    # (metric name, label items) -> Histogram or counter value
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = Histogram(METRICS[name][2])
+            series.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def record_request(self, endpoint, status, wall, db, render, queries, rows):
+        self.observe("lifelink_request_duration_seconds", wall, endpoint=endpoint)
+        self.observe("lifelink_request_db_seconds", db, endpoint=endpoint)
+        self.observe("lifelink_request_render_seconds", render, endpoint=endpoint)
+        self.observe("lifelink_request_queries", queries, endpoint=endpoint)
+        self.observe("lifelink_request_rows", rows, endpoint=endpoint)
+        self.inc("lifelink_responses_total", endpoint=endpoint, code=str(status))
+
+    def render(self):
+        # Prometheus text exposition format 0.0.4
+        with self._lock:
+            series = sorted(self._series.items(), key=lambda item: item[0])
+            slow = slow_queries.total
+        series.append((("lifelink_slow_queries_total", ()), slow))
+
+        lines, described = [], set()
+        for (name, labels), value in series:
+            kind, help_text, _ = METRICS[name]
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                lines.append(f"{name}{format_labels(labels)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(value.buckets, value.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', f'{bound:g}'),))} {cumulative}")
+            lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {value.count}")
+            lines.append(f"{name}_sum{format_labels(labels)} {value.sum:.9g}")
+            lines.append(f"{name}_count{format_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels) + "}"
+
+
+metrics = Metrics()
+
+
+def init_app(app, pool):
+    # call before anything takes a connection from `pool`
+    pool.factory = functools.partial(get_db, factory=TracedConnection)
+
+    handler = logging.FileHandler(SLOW_QUERY_LOG, delay=True)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(handler)
+    log.propagate = False
+
+    @app.before_request
+    def start_trace():
+        _local.trace = g.trace = RequestTrace()
+        _local.endpoint = request.endpoint
+
+    @app.after_request
+    def record_trace(response):
+        trace = g.get("trace")
+        if trace is None:
+            return response
+        wall = time.perf_counter() - trace.started
+        render = g.get("render_ms", 0.0) / 1000
+        metrics.record_request(
+            request.endpoint or "unmatched", response.status_code, wall, trace.db, render, trace.queries, trace.rows,
+        )
+        timing = f"db;dur={trace.db * 1000:.2f};desc=\"{trace.queries} queries\", total;dur={wall * 1000:.2f}"
+        existing = response.headers.get("Server-Timing")
+        response.headers["Server-Timing"] = f"{existing}, {timing}" if existing else timing
+        return response
+
+    @app.teardown_request
+    def end_trace(exc=None):
+        _local.trace = None
+        _local.endpoint = None
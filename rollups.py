@@ -0,0 +1,108 @@
+# rollups.py - check the trigger-maintained rollups against a full rebuild
+# usage: python rollups.py [path/to/db] [--repair]
+# exits 1 when a rollup has drifted from its source rows.
+import argparse
+import sqlite3
+import sys
+
+# name -> (key columns, rollup rows, rows rebuilt from scratch, repair statements)
+ROLLUPS = {
+    "camp": (
+        1,
+        "SELECT camp_id, total_donations, total_units FROM Camp WHERE total_donations <> 0 OR total_units <> 0",
+        "SELECT camp_id, COUNT(*), SUM(amount) FROM Donation WHERE camp_id IS NOT NULL GROUP BY camp_id",
+        [
+            """
+            UPDATE Camp SET
+                total_donations = (SELECT COUNT(*) FROM Donation d WHERE d.camp_id = Camp.camp_id),
+                total_units = (SELECT COALESCE(SUM(amount), 0) FROM Donation d WHERE d.camp_id = Camp.camp_id)
+            """,
+        ],
+    ),
+    "donor": (
+        1,
+        "SELECT donor_id, donations, units, last_donation FROM DonorRollup WHERE donations <> 0",
+        "SELECT donor_id, COUNT(*), COALESCE(SUM(amount), 0), MAX(donation_date) FROM Donation GROUP BY donor_id",
+        [
+            "DELETE FROM DonorRollup",
+            """
+            INSERT INTO DonorRollup (donor_id, donations, units, last_donation)
+            SELECT donor_id, COUNT(*), COALESCE(SUM(amount), 0), MAX(donation_date) FROM Donation GROUP BY donor_id
+            """,
+        ],
+    ),
+    "group_daily": (
+        2,
+        "SELECT blood_group, day, donations, units FROM GroupDailyRollup WHERE donations <> 0",
+        """
+        SELECT blood_group, collected_on, COUNT(*), SUM(units) FROM BloodLot
+        WHERE collected_on IS NOT NULL GROUP BY blood_group, collected_on
+        """,
+        [
+            "DELETE FROM GroupDailyRollup",
+            """
+            INSERT INTO GroupDailyRollup (blood_group, day, donations, units)
+            SELECT blood_group, collected_on, COUNT(*), SUM(units) FROM BloodLot
+            WHERE collected_on IS NOT NULL GROUP BY blood_group, collected_on
+            """,
+        ],
+    ),
+}
+
+
+def diff(conn, name):
+    # [(key, rollup values, rebuilt values)] for every row that disagrees
+    keys, live_sql, rebuild_sql, _ = ROLLUPS[name]
+    live = {row[:keys]: row[keys:] for row in conn.execute(live_sql)}
+    rebuilt = {row[:keys]: row[keys:] for row in conn.execute(rebuild_sql)}
+    return [
+        (key, live.get(key), rebuilt.get(key))
+        for key in sorted(live.keys() | rebuilt.keys(), key=repr)
+        if live.get(key) != rebuilt.get(key)
+    ]
+
+
+def verify(conn, names=ROLLUPS):
+    # {name: differences} for every rollup that has drifted
+    problems = {}
+    for name in names:
+        rows = diff(conn, name)
+        if rows:
+            problems[name] = rows
+    return problems
+
+
+def repair(conn, names=ROLLUPS):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for name in names:
+            for statement in ROLLUPS[name][3]:
+                conn.execute(statement)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+
+if __name__ == "__main__":
+    import db
+
+    parser = argparse.ArgumentParser(description="Diff rollup tables against a rebuild from source rows")
+    parser.add_argument("db", nargs="?", default=db.DB_FILE)
+    parser.add_argument("--repair", action="store_true", help="rebuild drifted rollups in place")
+    args = parser.parse_args()
+
+    db.DB_FILE = args.db
+    conn = db.get_db()
+    problems = verify(conn)
+    for name, rows in problems.items():
+        print(f"{name}: {len(rows)} rows differ")
+        for key, live, rebuilt in rows[:20]:
+            print(f"    {key}: rollup={live} rebuilt={rebuilt}")
+    if problems and args.repair:
+        repair(conn, problems)
+        problems = verify(conn)
+        print("repaired" if not problems else "still drifting after repair")
+    if not problems:
+        print("all rollups match")
+    sys.exit(1 if problems else 0)
@@ -1,11 +1,104 @@
-from flask import render_template, request, redirect, url_for, flash, session
+from flask import render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context, abort
 from datetime import datetime
 from db_helpers import query_db
-from db import get_db
+from allocation import allocate_request
+from matcher import matcher
+from compatibility import BLOOD_GROUPS, normalize_group
+from inventory import add_donation, positive_units
+from ingest import register_online, register_walk_in
+import ingest
+from stats import stats
+from bulk_import import KINDS as IMPORT_KINDS, import_upload
+from export import EXPORTS, FORMATS as EXPORT_FORMATS, iter_export
+from stock_history import MAX_PERIODS, RESOLUTIONS, group_report
+from pagination import LazyPage, active_filters, filter_conditions, keyset_page, page_links
+from fragments import LazyRows, fragments, render_timer, table_versions
+from db_pool import get_request_db, pool
+from events import SSE_RETRY_AFTER, hub, publish_notification, publish_stock, stream, subscription
+from notifications import mark_read, recipients as notice_recipients, send as send_notice, unread_count
+from profiling import SLOW_QUERY_MS, metrics, slow_queries
+from dashboards import (
+    admin_page, donor_summary, link_donor, notice_state, require_admin, require_user, require_user_json,
+    user_donor, user_missing, user_page,
+)
+import db_async
+import os
 import sqlite3
 
+# list filters: query-string arg -> SQL condition (all backed by indexes)
+DONOR_FILTERS = {"blood_group": "blood_group = ?", "city": "city = ?"}
+RECIPIENT_FILTERS = {"blood_group": "blood_group = ?"}
+REQUEST_FILTERS = {
+    "status": "status = ?",
+    "blood_group": "blood_group = ?",
+    "date_from": "request_date >= ?",
+    "date_to": "request_date < date(?, '+1 day')",
+}
+DONATION_FILTERS = {
+    "blood_group": "dn.blood_group = ?",
+    "date_from": "d.donation_date >= ?",
+    "date_to": "d.donation_date < date(?, '+1 day')",
+}
+REGISTRATION_FILTERS = {"camp_id": "r.camp_id = ?", "status": "r.status = ?"}
+
+# the UNIQUE (camp_id, user_id) violation, told apart from other integrity errors
+ALREADY_REGISTERED = "UNIQUE constraint failed: CampRegistrations.camp_id, CampRegistrations.user_id"
+
+
+CAMP_DATE_FORMATS = ("%Y-%m-%d", "%Y-%m-%dT%H:%M", "%Y-%m-%d %H:%M:%S", "%d-%m-%Y", "%d/%m/%Y")
+
+
+def normalize_camp_date(value):
+    # camps are stored as plain ISO dates so range predicates can use idx_camp_date
+    for fmt in CAMP_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+def list_page(cur, endpoint, sql, key, clauses, descending=False):
+    # filtered keyset page plus next/prev links for a list view, queried on
+    # first use
+    filters = active_filters(clauses)
+    if "blood_group" in filters:
+        filters["blood_group"] = normalize_group(filters["blood_group"])
+    conditions, params = filter_conditions(filters, clauses)
+    return LazyPage(
+        filters,
+        lambda: page_links(keyset_page(cur, sql, key, conditions, params, descending=descending), endpoint, filters),
+    )
+
 
 def register_routes(app):
+    # the list pages offer parquet exports only where pyarrow is installed
+    app.jinja_env.globals["export_formats"] = EXPORT_FORMATS
+
+    def form_amount():
+        # the form's amount as a positive int, None when left blank; anything
+        # else is a 400 (the number inputs only hold browsers to it)
+        value = request.form.get("amount", "").strip()
+        if not value:
+            return None
+        try:
+            return positive_units(value)
+        except ValueError as e:
+            abort(400, description=str(e))
+
+    def fill_backlog(conn, blood_group):
+        # hand newly arrived stock to waiting requests, then tell live dashboards
+        try:
+            matcher.match(conn, blood_group)
+        except sqlite3.Error as e:
+            app.logger.warning("backlog matching for %s failed: %s", blood_group, e)
+        publish_stock(conn, [blood_group])
+
+    def substitutes_note(group, draws):
+        # mention compatible groups used in place of an exact match
+        used = [f"{g}: {units} ml" for g, units in draws if g != group]
+        return f" Compatible stock used ({', '.join(used)})." if used else ""
+
     # ----------------- AUTH / COMMON ROUTES -----------------
 
     @app.route("/")
@@ -26,7 +119,7 @@ def register_routes(app):
             password = request.form["password"]
             role = request.form["role"]
 
-            conn = get_db()
+            conn = get_request_db()
             cur = conn.cursor()
             try:
                 cur.execute(
@@ -38,8 +131,6 @@ def register_routes(app):
                 return redirect("/login")
             except sqlite3.IntegrityError:
                 flash("⚠ Username already exists. Try another one.")
-            finally:
-                conn.close()
 
         return render_template("signup.html")
 
@@ -50,13 +141,12 @@ def register_routes(app):
             username = request.form["username"]
             password = request.form["password"]
 
-            conn = get_db()
+            conn = get_request_db()
             cur = conn.cursor()
             cur.execute(
                 "SELECT * FROM Users WHERE username=? AND password=?", (username, password)
             )
             user = cur.fetchone()
-            conn.close()
 
             if user:
                 session["user_id"] = user[0]
@@ -82,78 +172,16 @@ def register_routes(app):
 
     @app.route("/admin_dashboard")
     def admin_dashboard():
-        # require admin
-        if "username" not in session:
-            flash("⚠ Please login first.")
-            return redirect(url_for("login"))
-        if session.get("role") != "admin":
-            flash("⚠ Access denied. Admins only.")
-            return redirect(url_for("login"))
-
-        # dashboard stats
-        donors = query_db("SELECT COUNT(*) FROM Donor", one=True)[0]
-        stock = query_db("SELECT SUM(available_units) FROM BloodStock", one=True)[0] or 0
-        pending = query_db(
-            "SELECT COUNT(*) FROM Request WHERE status IN ('Pending', 'Partially Fulfilled')",
-            one=True,
-        )[0]
-        fulfilled = query_db("SELECT COUNT(*) FROM Request WHERE status='Fulfilled'", one=True)[0]
-        partial = query_db(
-            "SELECT COUNT(*) FROM Request WHERE status='Partially Fulfilled'", one=True
-        )[0]
-        expired_removed = 0
-
-        stock_data = query_db("SELECT blood_group, available_units FROM BloodStock")
-        chart_labels = [row[0] for row in stock_data]
-        chart_values = [row[1] for row in stock_data]
-
-        requests = query_db(
-            """
-            SELECT recipient_name, blood_group, req_units, status, fulfilled_units
-            FROM Request
-            ORDER BY request_id DESC
-            LIMIT 5
-            """
-        )
-
-        notifications = (
-            query_db(
-                """
-            SELECT title, message, created_at
-            FROM Notifications
-            ORDER BY created_at DESC
-            LIMIT 10
-            """
-            )
-            or []
-        )
-
-        camps = (
-            query_db(
-                """
-            SELECT camp_name, location, camp_date, total_donations, total_units
-            FROM Camp
-            ORDER BY camp_date DESC
-            LIMIT 10
-            """
-            )
-            or []
-        )
-
-        return render_template(
-            "admin_dashboard.html",
-            username=session["username"],
-            donors=donors,
-            stock=stock,
-            pending=pending,
-            fulfilled=fulfilled,
-            partial=partial,
-            expired=expired_removed,
-            chart_labels=chart_labels,
-            chart_values=chart_values,
-            requests=requests,
-            notifications=notifications,
-            camps=camps,
+        denied = require_admin()
+        if denied:
+            return denied
+
+        # dashboard stats (trigger-maintained counters, cached until they change);
+        # lists are only queried when their cached fragment is stale
+        conn = get_request_db()
+        return admin_page(
+            stats.get(conn, table_versions()),
+            lambda query, *args: LazyRows(lambda: query(conn, *args)),
         )
 
     # ----------------- DONORS (ADMIN) -----------------
@@ -165,47 +193,47 @@ def register_routes(app):
             flash("Access denied.")
             return redirect(url_for("login"))
 
-        conn = get_db()
+        conn = get_request_db()
         cur = conn.cursor()
 
         # camps for dropdown
-        cur.execute("SELECT camp_name, location FROM Camp ORDER BY camp_date DESC")
-        camps = cur.fetchall()
+        camps = LazyRows(lambda: conn.execute("SELECT camp_name, location FROM Camp ORDER BY camp_date DESC").fetchall())
 
         message = None
         if request.method == "POST":
             name = request.form["name"]
-            blood_group = request.form["blood_group"]
+            blood_group = normalize_group(request.form["blood_group"])
             contact = request.form.get("contact", "")
             city = request.form.get("city", "")
             aadhaar = request.form["aadhaar"]
             camp_location = request.form.get("camp_location", "")
 
-            existing = query_db("SELECT * FROM Donor WHERE aadhaar = ?", (aadhaar,), one=True)
-            if existing:
+            # the UNIQUE(aadhaar) conflict replaces a separate lookup
+            cur.execute(
+                """
+                INSERT INTO Donor (name, blood_group, contact, city, aadhaar, camp_location)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(aadhaar) DO NOTHING
+                """,
+                (name, blood_group, contact, city, aadhaar, camp_location),
+            )
+            conn.commit()
+            if cur.rowcount == 0:
                 message = "⚠ Donor with this Aadhaar number already exists!"
             else:
-                cur.execute(
-                    """
-                    INSERT INTO Donor (name, blood_group, contact, city, aadhaar, camp_location)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                    """,
-                    (name, blood_group, contact, city, aadhaar, camp_location),
-                )
-                conn.commit()
                 message = "✅ Donor added successfully!"
 
-        cur.execute(
-            """
-            SELECT donor_id, name, blood_group, contact, city, aadhaar, camp_location
-            FROM Donor
-            ORDER BY donor_id ASC
-            """
+        page = list_page(
+            cur,
+            "donors",
+            "SELECT donor_id, name, blood_group, contact, city, aadhaar, camp_location FROM Donor",
+            "donor_id",
+            DONOR_FILTERS,
         )
-        donors = cur.fetchall()
-        conn.close()
 
-        return render_template("donors.html", donors=donors, message=message, camps=camps)
+        return render_template(
+            "donors.html", donors=LazyRows(lambda: page["rows"]), page=page, message=message, camps=camps
+        )
 
     # ----------------- RECORD DONATION (ADMIN) -----------------
 
@@ -216,19 +244,18 @@ def register_routes(app):
             flash("Access denied.")
             return redirect(url_for("login"))
 
-        conn = get_db()
+        conn = get_request_db()
         cur = conn.cursor()
         message = None
 
-        # donors & camps lists
-        cur.execute("SELECT donor_id, name, blood_group FROM Donor ORDER BY name ASC")
-        donors = cur.fetchall()
-        cur.execute("SELECT camp_id, camp_name, location FROM Camp ORDER BY camp_date DESC")
-        camps = cur.fetchall()
+        # camps list (donors are picked through the typeahead)
+        camps = LazyRows(
+            lambda: conn.execute("SELECT camp_id, camp_name, location FROM Camp ORDER BY camp_date DESC").fetchall()
+        )
 
         if request.method == "POST":
             donor_id = request.form.get("donor_id")
-            amount = request.form.get("amount")
+            amount = form_amount()
             camp_id = request.form.get("camp_id")
             date = datetime.now().strftime("%Y-%m-%d")
 
@@ -246,74 +273,43 @@ def register_routes(app):
                             cur.execute("SELECT camp_name, location FROM Camp WHERE camp_id=?", (camp_id,))
                             camp = cur.fetchone()
                             camp_display = f"{camp[0]} — {camp[1]}" if camp else "N/A"
+                            camp_id = camp_id if camp else None
                         else:
                             camp_display = "N/A"
 
-                        # insert donation
-                        cur.execute(
-                            """
-                            INSERT INTO Donation (donor_id, amount, donation_date, camp_location)
-                            VALUES (?, ?, ?, ?)
-                            """,
-                            (donor_id, amount, date, camp_display),
-                        )
+                        # insert donation, its lot and the stock aggregate (camp totals by trigger)
+                        add_donation(cur, donor_id, blood_group, amount, date, camp_display, camp_id or None)
 
                         # update donor camp
                         cur.execute("UPDATE Donor SET camp_location=? WHERE donor_id=?", (camp_display, donor_id))
 
-                        # update stock
-                        cur.execute("SELECT available_units FROM BloodStock WHERE blood_group=?", (blood_group,))
-                        row = cur.fetchone()
-                        if row:
-                            cur.execute(
-                                """
-                                UPDATE BloodStock
-                                SET available_units = available_units + ?
-                                WHERE blood_group=?
-                                """,
-                                (amount, blood_group),
-                            )
-                        else:
-                            cur.execute(
-                                """
-                                INSERT INTO BloodStock (blood_group, available_units)
-                                VALUES (?, ?)
-                                """,
-                                (blood_group, amount),
-                            )
-
-                        # update camp totals
-                        if camp_id:
-                            cur.execute(
-                                """
-                                UPDATE Camp
-                                SET total_donations = total_donations + 1,
-                                    total_units = total_units + ?
-                                WHERE camp_id = ?
-                                """,
-                                (amount, camp_id),
-                            )
-
                         conn.commit()
+                        fill_backlog(conn, blood_group)
                         message = f"✅ Recorded donation for {donor_name} ({blood_group}). Updated camp totals successfully."
                     except sqlite3.Error as e:
                         conn.rollback()
                         message = f"⚠ Database error: {e}"
 
-        # latest donations
-        cur.execute(
+        # latest donations, one page at a time
+        page = list_page(
+            cur,
+            "record_donation",
             """
             SELECT d.donation_id, dn.name, dn.blood_group, d.amount, d.camp_location, d.donation_date
             FROM Donation d
             JOIN Donor dn ON d.donor_id = dn.donor_id
-            ORDER BY d.donation_id DESC
-            """
+            """,
+            "d.donation_id",
+            DONATION_FILTERS,
+            descending=True,
         )
-        donations = cur.fetchall()
-        conn.close()
 
         return render_template(
-            "record_donation.html", donors=donors, camps=camps, donations=donations, message=message
+            "record_donation.html",
+            camps=camps,
+            donations=LazyRows(lambda: page["rows"]),
+            page=page,
+            message=message,
         )
 
     # ----------------- REQUESTS (ADMIN) -----------------
@@ -337,44 +333,28 @@ def register_routes(app):
                 return redirect(url_for("requests_page"))
 
             name, group = recipient
-            available = query_db("SELECT available_units FROM BloodStock WHERE blood_group=?", (group,), one=True)
-            available_units = available[0] if available else 0
+            try:
+                _, status, fulfilled, draws = allocate_request(get_request_db(), name, group, req_units)
+            except sqlite3.Error as e:
+                flash(f"⚠ Database error: {e}")
+                return redirect(url_for("requests_page"))
+            publish_stock(get_request_db(), [g for g, _ in draws])
 
             # fulfill logic
-            if available_units >= req_units:
-                query_db(
-                    """
-                    INSERT INTO Request (recipient_name, blood_group, req_units, fulfilled_units, status)
-                    VALUES (?, ?, ?, ?, 'Fulfilled')
-                    """,
-                    (name, group, req_units, req_units),
-                )
-                query_db("UPDATE BloodStock SET available_units = available_units - ? WHERE blood_group=?", (req_units, group))
-                flash(f"✅ Request fulfilled successfully for {group}.")
-            elif available_units > 0:
-                query_db(
-                    """
-                    INSERT INTO Request (recipient_name, blood_group, req_units, fulfilled_units, status)
-                    VALUES (?, ?, ?, ?, 'Partially Fulfilled')
-                    """,
-                    (name, group, req_units, available_units),
-                )
-                query_db("UPDATE BloodStock SET available_units = 0 WHERE blood_group=?", (group,))
-                flash(f"⚠ Only partially fulfilled ({available_units} ml).")
+            if status == "Fulfilled":
+                flash(f"✅ Request fulfilled successfully for {group}.{substitutes_note(group, draws)}")
+            elif status == "Partially Fulfilled":
+                flash(f"⚠ Only partially fulfilled ({fulfilled} ml).{substitutes_note(group, draws)}")
             else:
-                query_db(
-                    """
-                    INSERT INTO Request (recipient_name, blood_group, req_units, fulfilled_units, status)
-                    VALUES (?, ?, ?, 0, 'Pending')
-                    """,
-                    (name, group, req_units),
-                )
                 flash(f"⚠ No stock for {group}. Request pending.")
 
             return redirect(url_for("requests_page"))
 
-        reqs = query_db("SELECT * FROM Request ORDER BY request_id DESC")
-        return render_template("requests.html", requests=reqs)
+        page = list_page(
+            get_request_db().cursor(), "requests_page", "SELECT * FROM Request", "request_id",
+            REQUEST_FILTERS, descending=True,
+        )
+        return render_template("requests.html", requests=page["rows"], page=page)
 
     # ----------------- RECIPIENTS (ADMIN) -----------------
 
@@ -388,157 +368,53 @@ def register_routes(app):
         message = None
         if request.method == "POST":
             name = request.form["name"]
-            blood_group = request.form["blood_group"]
+            blood_group = normalize_group(request.form["blood_group"])
             contact = request.form.get("contact", "")
             aadhaar = request.form["aadhaar"]
 
-            existing = query_db("SELECT * FROM Recipient WHERE aadhaar = ?", (aadhaar,), one=True)
-            if existing:
+            # the UNIQUE(aadhaar) conflict replaces a separate lookup
+            conn = get_request_db()
+            cur = conn.execute(
+                """
+                INSERT INTO Recipient (name, blood_group, contact, aadhaar)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(aadhaar) DO NOTHING
+                """,
+                (name, blood_group, contact, aadhaar),
+            )
+            conn.commit()
+            if cur.rowcount == 0:
                 message = "⚠ Recipient with this Aadhaar number already exists!"
             else:
-                query_db(
-                    "INSERT INTO Recipient (name, blood_group, contact, aadhaar) VALUES (?, ?, ?, ?)",
-                    (name, blood_group, contact, aadhaar),
-                )
                 message = "✅ Recipient added successfully!"
 
-        recipients = query_db("SELECT * FROM Recipient ORDER BY recipient_id ASC")
-        return render_template("recipients.html", recipients=recipients, message=message)
+        page = list_page(
+            get_request_db().cursor(), "recipients", "SELECT * FROM Recipient", "recipient_id", RECIPIENT_FILTERS
+        )
+        return render_template("recipients.html", recipients=page["rows"], page=page, message=message)
 
     # ----------------- USER DASHBOARD -----------------
 
     @app.route("/user_dashboard")
     def user_dashboard():
-        # require user
-        if "role" not in session or session.get("role") != "user":
-            flash("⚠ Access denied.")
-            return redirect("/login")
+        denied = require_user()
+        if denied:
+            return denied
 
-        conn = get_db()
-        cur = conn.cursor()
+        conn = get_request_db()
         user_id = session["user_id"]
-        username = session["username"]
 
-        # ensure user exists
-        cur.execute("SELECT user_id FROM Users WHERE user_id=?", (user_id,))
-        user_exists = cur.fetchone()
+        # ensure user exists, and get the donor linked to it
+        user_exists, donor_row = user_donor(conn, user_id)
         if not user_exists:
-            flash("⚠ User record missing in database. Please re-login.")
-            conn.close()
-            return redirect("/logout")
-
-        # get donor linked to user
-        cur.execute("SELECT donor_id, blood_group FROM Donor WHERE user_id=?", (user_id,))
-        donor_row = cur.fetchone()
-
-        if donor_row:
-            donor_id, blood_group = donor_row
-        else:
-            # try by username and link
-            cur.execute("SELECT donor_id, blood_group FROM Donor WHERE name=?", (username,))
-            name_row = cur.fetchone()
-            if name_row:
-                donor_id, blood_group = name_row
-                cur.execute("UPDATE Donor SET user_id=? WHERE donor_id=?", (user_id, donor_id))
-                conn.commit()
-            else:
-                # create temporary donor record
-                temp_aadhaar = f"TEMP{datetime.now().timestamp()}"
-                try:
-                    cur.execute(
-                        """
-                        INSERT INTO Donor (user_id, name, blood_group, contact, city, camp_location, aadhaar)
-                        VALUES (?, ?, 'Unknown', '', '', NULL, ?)
-                        """,
-                        (user_id, username, temp_aadhaar),
-                    )
-                except sqlite3.IntegrityError:
-                    cur.execute(
-                        """
-                        INSERT INTO Donor (user_id, name, blood_group, contact, city, camp_location, aadhaar)
-                        VALUES (NULL, ?, 'Unknown', '', '', NULL, ?)
-                        """,
-                        (username, temp_aadhaar),
-                    )
-
-                conn.commit()
-                donor_id = cur.lastrowid
-                blood_group = "Unknown"
-
-        # donor stats
-        cur.execute(
-            """
-            SELECT COUNT(*), COALESCE(SUM(amount), 0), MAX(donation_date)
-            FROM Donation
-            WHERE donor_id = ?
-            """,
-            (donor_id,),
-        )
-        total_donations, total_units, last_donation = cur.fetchone()
-        last_donation = last_donation or "—"
-
-        # donation history
-        cur.execute(
-            """
-            SELECT donation_date, amount
-            FROM Donation
-            WHERE donor_id = ?
-            ORDER BY donation_date
-            """,
-            (donor_id,),
-        )
-        donation_data = cur.fetchall()
-        donation_dates = [d[0] for d in donation_data]
-        donation_values = [d[1] for d in donation_data]
-
-        # recent user requests
-        cur.execute(
-            """
-            SELECT request_id, blood_group, req_units, status
-            FROM Request
-            WHERE recipient_name=?
-            ORDER BY request_id DESC LIMIT 5
-            """,
-            (username,),
-        )
-        user_requests = cur.fetchall()
-
-        # notifications
-        cur.execute(
-            """
-            SELECT title, message, created_at
-            FROM Notifications
-            ORDER BY created_at DESC LIMIT 5
-            """
-        )
-        notifications = cur.fetchall()
-
-        # user's registered camps
-        cur.execute(
-            """
-            SELECT c.camp_name, c.location, c.camp_date, c.total_donations, c.total_units
-            FROM Camp c
-            JOIN CampRegistrations r ON c.camp_id = r.camp_id
-            WHERE r.user_id = ?
-            ORDER BY c.camp_date DESC
-            """,
-            (user_id,),
-        )
-        user_camps = cur.fetchall()
-        conn.close()
-
-        return render_template(
-            "user_dashboard.html",
-            user_name=username,
-            user_blood_group=blood_group or "Unknown",
-            total_donations=total_donations or 0,
-            total_units=total_units or 0,
-            last_donation=last_donation,
-            donation_dates=donation_dates,
-            donation_values=donation_values,
-            user_requests=user_requests,
-            notifications=notifications,
-            user_camps=user_camps,
+            return user_missing()
+        donor_id, blood_group = donor_row or link_donor(conn, user_id, session["username"])
+
+        return user_page(
+            blood_group,
+            donor_summary(conn, donor_id),
+            notice_state(conn, user_id),
+            lambda query, *args: LazyRows(lambda: query(conn, *args)),
         )
 
     # ----------------- NOTIFICATIONS (ADMIN) -----------------
@@ -550,27 +426,61 @@ def register_routes(app):
             flash("Access denied.")
             return redirect(url_for("login"))
 
-        conn = get_db()
+        conn = get_request_db()
         cur = conn.cursor()
 
         if request.method == "POST":
             title = request.form["title"]
             message = request.form["message"]
+            # optional audience; leave all blank to notify everyone
+            blood_group = normalize_group(request.form.get("blood_group", "")) or None
+            city = request.form.get("city", "").strip() or None
+            camp_id = request.form.get("camp_id", type=int)
 
             if not title or not message:
                 flash("⚠ Please fill in both Title and Message fields.")
             else:
-                cur.execute("INSERT INTO Notifications (title, message) VALUES (?, ?)", (title, message))
+                notification_id, created_at, audience, delivered = send_notice(
+                    conn, title, message, blood_group, city, camp_id
+                )
                 conn.commit()
-                flash("✅ Notification sent successfully to all users.")
+                if audience is None:
+                    publish_notification(title, message, created_at)
+                    flash("✅ Notification sent successfully to all users.")
+                else:
+                    publish_notification(title, message, created_at, audience, notice_recipients(conn, notification_id))
+                    flash(f"✅ Notification sent to {delivered} user(s): {audience}.")
 
             return redirect(url_for("send_notification"))
 
         # recent notifications
-        cur.execute("SELECT title, message, created_at FROM Notifications ORDER BY created_at DESC LIMIT 10")
+        cur.execute(
+            "SELECT title, message, created_at, audience FROM Notifications ORDER BY notification_id DESC LIMIT 10"
+        )
         notifications = cur.fetchall()
-        conn.close()
-        return render_template("send_notification.html", notifications=notifications)
+        cur.execute("SELECT camp_id, camp_name, camp_date FROM Camp ORDER BY camp_date DESC LIMIT 50")
+        camps = cur.fetchall()
+        return render_template(
+            "send_notification.html", notifications=notifications, blood_groups=BLOOD_GROUPS, camps=camps
+        )
+
+    @app.route("/notifications/read", methods=["POST"])
+    def notifications_read():
+        # move the user's read cursor to the latest notification
+        if session.get("role") != "user":
+            flash("⚠ Access denied.")
+            return redirect("/login")
+
+        conn = get_request_db()
+        mark_read(conn, session["user_id"])
+        conn.commit()
+        if request.accept_mimetypes.best == "application/json":
+            return jsonify({"unread": 0})
+        return redirect(url_for("user_dashboard"))
+
+    @app.route("/notifications/unread")
+    def notifications_unread():
+        return require_user_json() or jsonify({"unread": unread_count(get_request_db(), session["user_id"])})
 
     # ----------------- CAMPS (ADMIN) -----------------
 
@@ -581,7 +491,7 @@ def register_routes(app):
             flash("Access denied.")
             return redirect("/login")
 
-        conn = get_db()
+        conn = get_request_db()
         cur = conn.cursor()
 
         if request.method == "POST":
@@ -591,7 +501,10 @@ def register_routes(app):
 
             if not camp_name or not location or not camp_date:
                 flash("⚠ Please fill in all fields.")
+            elif not normalize_camp_date(camp_date):
+                flash("⚠ Please enter a valid camp date.")
             else:
+                camp_date = normalize_camp_date(camp_date)
                 try:
                     cur.execute("INSERT INTO Camp (camp_name, location, camp_date) VALUES (?, ?, ?)",
                                 (camp_name, location, camp_date))
@@ -610,7 +523,6 @@ def register_routes(app):
             """
         )
         camps = cur.fetchall()
-        conn.close()
         return render_template("add_camp.html", camps=camps)
 
     # ----------------- DONATE (USER: CAMP REGISTRATION) -----------------
@@ -622,7 +534,7 @@ def register_routes(app):
             flash("Please login first.")
             return redirect("/login")
 
-        conn = get_db()
+        conn = get_request_db()
         cur = conn.cursor()
         username = session["username"]
         user_id = session["user_id"]
@@ -632,7 +544,7 @@ def register_routes(app):
             """
             SELECT camp_id, camp_name, location, camp_date
             FROM Camp
-            WHERE date(camp_date) >= date('now')
+            WHERE camp_date >= date('now')
             ORDER BY camp_date ASC
             """
         )
@@ -640,84 +552,41 @@ def register_routes(app):
 
         if request.method == "POST":
             camp_id = request.form.get("camp_id")
-            amount = request.form.get("amount")
+            amount = form_amount()
 
+            date = datetime.now().strftime("%Y-%m-%d")
             if not camp_id or not amount:
                 flash("⚠ Please select a camp and enter donation amount.")
+            elif ingest.journal:
+                # journal mode: durable append now, applied by the ingest worker
+                cur.execute("SELECT 1 FROM CampRegistrations WHERE camp_id=? AND user_id=?", (camp_id, user_id))
+                if cur.fetchone():
+                    flash("⚠ You already registered for this camp.")
+                else:
+                    ingest.journal.append(
+                        "online", camp_id=camp_id, user_id=user_id, username=username,
+                        amount=amount, donation_date=date,
+                    )
+                    flash("✅ Donation received! It will appear on your dashboard shortly.")
             else:
                 try:
-                    # register for camp
-                    cur.execute(
-                        """
-                        INSERT INTO CampRegistrations (camp_id, user_id, donor_name, amount, mode, status)
-                        VALUES (?, ?, ?, ?, 'online', 'Confirmed')
-                        """,
-                        (camp_id, user_id, username, amount),
-                    )
-
-                    # donor linked info
-                    cur.execute("SELECT donor_id, blood_group FROM Donor WHERE user_id=?", (user_id,))
-                    donor = cur.fetchone()
-                    if donor:
-                        donor_id, blood_group = donor
-                    else:
-                        donor_id = None
-                        blood_group = "Unknown"
-
-                    # record donation
-                    date = datetime.now().strftime("%Y-%m-%d")
-                    cur.execute(
-                        """
-                        INSERT INTO Donation (donor_id, amount, donation_date, camp_location)
-                        VALUES (?, ?, ?, (SELECT location FROM Camp WHERE camp_id=?))
-                        """,
-                        (donor_id, amount, date, camp_id),
-                    )
-
-                    # update stock
-                    cur.execute("SELECT available_units FROM BloodStock WHERE blood_group=?", (blood_group,))
-                    stock = cur.fetchone()
-                    if stock:
-                        cur.execute(
-                            """
-                            UPDATE BloodStock
-                            SET available_units = available_units + ?
-                            WHERE blood_group=?
-                            """,
-                            (amount, blood_group),
-                        )
-                    else:
-                        cur.execute(
-                            """
-                            INSERT INTO BloodStock (blood_group, available_units)
-                            VALUES (?, ?)
-                            """,
-                            (blood_group, amount),
-                        )
-
-                    # update camp totals
-                    cur.execute(
-                        """
-                        UPDATE Camp
-                        SET total_donations = total_donations + 1,
-                            total_units = total_units + ?
-                        WHERE camp_id = ?
-                        """,
-                        (amount, camp_id),
-                    )
-
+                    # registration, donation, its lot, stock and camp totals
+                    blood_group = register_online(cur, camp_id, user_id, username, amount, date)
                     conn.commit()
+                    fill_backlog(conn, blood_group)
                     flash("✅ Donation recorded successfully and camp updated!")
-                except sqlite3.IntegrityError:
-                    flash("⚠ You already registered for this camp.")
+                except sqlite3.IntegrityError as e:
+                    conn.rollback()
+                    if str(e) == ALREADY_REGISTERED:
+                        flash("⚠ You already registered for this camp.")
+                    else:
+                        flash(f"⚠ Donation rejected: {e}")
                 except sqlite3.Error as e:
                     conn.rollback()
                     flash(f"⚠ Database error: {e}")
 
-            conn.close()
             return redirect("/user_dashboard")
 
-        conn.close()
         return render_template("donate.html", camps=camps)
 
     # ----------------- REQUEST BLOOD (USER) -----------------
@@ -729,7 +598,7 @@ def register_routes(app):
             flash("Please login first.")
             return redirect("/login")
 
-        conn = get_db()
+        conn = get_request_db()
         cur = conn.cursor()
         username = session["username"]
         user_id = session["user_id"]
@@ -741,7 +610,6 @@ def register_routes(app):
             blood_group = donor[0]
         else:
             flash("⚠ Please update your blood group in your profile before requesting blood.")
-            conn.close()
             return redirect("/profile")
 
         # ensure Recipient record exists
@@ -764,57 +632,30 @@ def register_routes(app):
                 req_units = int(request.form.get("req_units", 0))
             except (TypeError, ValueError):
                 flash("⚠ Please enter a valid number for blood units.")
-                conn.close()
                 return redirect("/request_blood")
 
             if req_units <= 0:
                 flash("⚠ Please enter a valid amount of blood (in ml).")
-                conn.close()
                 return redirect("/request_blood")
 
-            # check stock
-            cur.execute("SELECT available_units FROM BloodStock WHERE blood_group=?", (blood_group,))
-            stock = cur.fetchone()
-            available_units = stock[0] if stock else 0
             request_date = datetime.now().strftime("%Y-%m-%d")
+            try:
+                _, status, fulfilled, draws = allocate_request(conn, username, blood_group, req_units, request_date)
+            except sqlite3.Error as e:
+                flash(f"⚠ Database error: {e}")
+                return redirect("/request_blood")
+            publish_stock(conn, [g for g, _ in draws])
 
-            if available_units >= req_units:
-                cur.execute(
-                    """
-                    INSERT INTO Request (recipient_name, blood_group, req_units, fulfilled_units, status, request_date)
-                    VALUES (?, ?, ?, ?, 'Fulfilled', ?)
-                    """,
-                    (username, blood_group, req_units, req_units, request_date),
-                )
-                cur.execute("UPDATE BloodStock SET available_units = available_units - ? WHERE blood_group=?",
-                            (req_units, blood_group))
-                message = f"✅ Request fulfilled successfully for {blood_group}."
-            elif available_units > 0:
-                cur.execute(
-                    """
-                    INSERT INTO Request (recipient_name, blood_group, req_units, fulfilled_units, status, request_date)
-                    VALUES (?, ?, ?, ?, 'Partially Fulfilled', ?)
-                    """,
-                    (username, blood_group, req_units, available_units, request_date),
-                )
-                cur.execute("UPDATE BloodStock SET available_units = 0 WHERE blood_group=?", (blood_group,))
-                message = f"⚠ Only partially fulfilled ({available_units} ml available)."
+            if status == "Fulfilled":
+                message = f"✅ Request fulfilled successfully for {blood_group}.{substitutes_note(blood_group, draws)}"
+            elif status == "Partially Fulfilled":
+                message = f"⚠ Only partially fulfilled ({fulfilled} ml available).{substitutes_note(blood_group, draws)}"
             else:
-                cur.execute(
-                    """
-                    INSERT INTO Request (recipient_name, blood_group, req_units, fulfilled_units, status, request_date)
-                    VALUES (?, ?, ?, 0, 'Pending', ?)
-                    """,
-                    (username, blood_group, req_units, request_date),
-                )
                 message = f"⚠ No stock for {blood_group}. Your request is pending."
 
-            conn.commit()
             flash(message)
-            conn.close()
             return redirect(url_for("user_dashboard"))
 
-        conn.close()
         return render_template("request_blood.html", group=blood_group, message=message)
 
     # ----------------- PROFILE (USER) -----------------
@@ -826,7 +667,7 @@ def register_routes(app):
             flash("Please log in first.")
             return redirect("/login")
 
-        conn = get_db()
+        conn = get_request_db()
         cur = conn.cursor()
         user_id = session["user_id"]
 
@@ -841,7 +682,7 @@ def register_routes(app):
             gender = request.form.get("gender", "")
             email = request.form.get("email", "")
             address = request.form.get("address", "")
-            blood_group = request.form.get("blood_group", "")
+            blood_group = normalize_group(request.form.get("blood_group", ""))
             city = request.form.get("city", "")
             contact = request.form.get("contact", "")
             aadhaar = request.form.get("aadhaar", "").strip()
@@ -912,7 +753,6 @@ def register_routes(app):
         else:
             data = [None] * 10
 
-        conn.close()
 
         return render_template(
             "profile.html",
@@ -936,7 +776,7 @@ def register_routes(app):
             flash("Access denied.")
             return redirect("/login")
 
-        conn = get_db()
+        conn = get_request_db()
         cur = conn.cursor()
 
         # today's camps
@@ -944,7 +784,7 @@ def register_routes(app):
             """
             SELECT camp_id, camp_name, location, camp_date
             FROM Camp
-            WHERE date(camp_date) = date('now')
+            WHERE camp_date >= date('now') AND camp_date < date('now', '+1 day')
             ORDER BY camp_date
             """
         )
@@ -953,43 +793,30 @@ def register_routes(app):
         if request.method == "POST":
             camp_id = request.form.get("camp_id")
             donor_name = request.form.get("donor_name")
-            amount = request.form.get("amount")
+            amount = form_amount()
+            # set when the name was picked from the donor typeahead
+            donor_id = request.form.get("donor_id", type=int)
 
+            date = datetime.now().strftime("%Y-%m-%d")
             if not camp_id or not donor_name or not amount:
                 flash("⚠ Please fill all fields.")
+            elif ingest.journal:
+                # journal mode: durable append now, applied by the ingest worker
+                ingest.journal.append(
+                    "walk_in", camp_id=camp_id, donor_name=donor_name, amount=amount, donation_date=date,
+                    donor_id=donor_id,
+                )
+                flash("✅ Walk-in donor registered successfully!")
             else:
                 try:
-                    cur.execute(
-                        """
-                        INSERT INTO CampRegistrations (camp_id, donor_name, amount, mode, status)
-                        VALUES (?, ?, ?, 'admin', 'Confirmed')
-                        """,
-                        (camp_id, donor_name, amount),
-                    )
-
-                    # update donation & stock
-                    cur.execute("SELECT donor_id, blood_group FROM Donor WHERE name=?", (donor_name,))
-                    donor = cur.fetchone()
-                    donor_id = donor[0] if donor else None
-                    group = donor[1] if donor else "Unknown"
-
-                    if donor_id:
-                        cur.execute(
-                            "INSERT INTO Donation (donor_id, amount, donation_date) VALUES (?, ?, date('now'))",
-                            (donor_id, amount),
-                        )
-                        cur.execute(
-                            """
-                            INSERT INTO BloodStock (blood_group, available_units)
-                            VALUES (?, ?)
-                            ON CONFLICT(blood_group) DO UPDATE
-                            SET available_units = available_units + excluded.available_units
-                            """,
-                            (group, amount),
-                        )
-
+                    # registration, plus donation & stock for a known donor
+                    group = register_walk_in(cur, camp_id, donor_name, amount, date, donor_id)
                     conn.commit()
-                    flash("✅ Walk-in donor registered successfully!")
+                    if group:
+                        fill_backlog(conn, group)
+                        flash("✅ Walk-in donor registered successfully!")
+                    else:
+                        flash("⚠ Registered, but no donor record matched — no donation was recorded.")
                 except sqlite3.Error as e:
                     conn.rollback()
                     flash(f"⚠ Error: {e}")
@@ -1001,12 +828,11 @@ def register_routes(app):
             SELECT r.registration_id, r.donor_name, c.camp_name, r.amount, r.mode, r.status, r.registered_on
             FROM CampRegistrations r
             JOIN Camp c ON r.camp_id = c.camp_id
-            WHERE date(c.camp_date) = date('now')
+            WHERE c.camp_date >= date('now') AND c.camp_date < date('now', '+1 day')
             ORDER BY r.registered_on DESC
             """
         )
         registrations = cur.fetchall()
-        conn.close()
         return render_template("camp_register_admin.html", active_camps=active_camps, registrations=registrations)
 
     # ----------------- CAMP REGISTRATIONS (ADMIN) -----------------
@@ -1018,17 +844,171 @@ def register_routes(app):
             flash("Access denied.")
             return redirect("/login")
 
-        conn = get_db()
+        conn = get_request_db()
         cur = conn.cursor()
-        cur.execute(
+        page = list_page(
+            cur,
+            "camp_registrations",
             """
             SELECT r.registration_id, r.donor_name, c.camp_name, c.location, c.camp_date,
                 r.amount, r.mode, r.status, r.registered_on
             FROM CampRegistrations r
             JOIN Camp c ON r.camp_id = c.camp_id
-            ORDER BY r.registered_on DESC
-            """
+            """,
+            "r.registration_id",
+            REGISTRATION_FILTERS,
+            descending=True,
+        )
+        return render_template("camp_registrations.html", regs=page["rows"], page=page)
+
+    # ----------------- BULK IMPORT (ADMIN) -----------------
+
+    @app.route("/bulk_import", methods=["GET", "POST"])
+    def bulk_import():
+        # require admin
+        if session.get("role") != "admin":
+            flash("Access denied.")
+            return redirect("/login")
+
+        report = None
+        if request.method == "POST":
+            kind = request.form.get("kind")
+            upload = request.files.get("file")
+            if kind not in IMPORT_KINDS or not upload or not upload.filename:
+                flash("⚠ Please choose what to import and a CSV/JSONL file.")
+                return redirect("/bulk_import")
+            try:
+                report = import_upload(get_request_db(), kind, upload, update="update" in request.form)
+            except (sqlite3.Error, UnicodeDecodeError) as e:
+                flash(f"⚠ Import failed: {e}")
+                return redirect("/bulk_import")
+
+        return render_template("bulk_import.html", report=report)
+
+    # ----------------- EXPORT (ADMIN) -----------------
+
+    @app.route("/export/<kind>")
+    def export(kind):
+        # require admin
+        if session.get("role") != "admin":
+            flash("Access denied.")
+            return redirect("/login")
+        fmt = request.args.get("format", "csv")
+        if kind not in EXPORTS or fmt not in EXPORT_FORMATS:
+            return jsonify({"error": "unknown export"}), 404
+
+        # streamed batch by batch from the cursor; nothing is buffered whole
+        filters = {name: request.args.get(name, "").strip() for name in EXPORTS[kind][1]}
+        chunks = iter_export(get_request_db(), kind, filters, fmt)
+        mimetype, extension = EXPORT_FORMATS[fmt]
+        return Response(
+            stream_with_context(chunks),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename={kind}.{extension}"},
+        )
+
+    # ----------------- STOCK HISTORY API (ADMIN) -----------------
+
+    @app.route("/api/stock_history")
+    def stock_history():
+        # require admin
+        if session.get("role") != "admin":
+            flash("Access denied.")
+            return redirect("/login")
+
+        resolution = request.args.get("resolution", "daily")
+        if resolution not in RESOLUTIONS:
+            return jsonify({"error": f"resolution must be one of {sorted(RESOLUTIONS)}"}), 400
+        try:
+            periods = max(1, min(int(request.args.get("periods", 90)), MAX_PERIODS))
+            horizon = max(1, min(int(request.args.get("horizon", 7)), 90))
+        except ValueError:
+            return jsonify({"error": "periods and horizon must be integers"}), 400
+
+        conn = get_request_db()
+        group = request.args.get("blood_group")
+        if group:
+            groups = [normalize_group(group)]
+        else:
+            groups = [g for g, in conn.execute("SELECT blood_group FROM BloodStock ORDER BY blood_group")]
+        return jsonify(
+            {
+                "resolution": resolution,
+                "groups": {g: group_report(conn, g, resolution, periods, horizon) for g in groups},
+            }
         )
-        regs = cur.fetchall()
-        conn.close()
-        return render_template("camp_registrations.html", regs=regs)
\ No newline at end of file
+
+    # ----------------- LIVE EVENTS (SSE) -----------------
+
+    @app.route("/events")
+    def events():
+        # server-sent notifications (and stock levels for admins); resumes
+        # from the Last-Event-ID header the browser sends on reconnect.
+        # asgi.py answers /events on its event loop instead; this view
+        # serves WSGI servers, a thread per stream
+        subscriber = subscription(session, request.headers, request.args)
+        if subscriber is None:
+            return jsonify({"error": "login required"}), 401
+        if not hub.open_stream():
+            # every stream slot is taken: the browser retries later, and page
+            # requests keep their threads
+            response = jsonify({"error": "too many live connections"})
+            response.status_code = 503
+            response.headers["Retry-After"] = str(SSE_RETRY_AFTER)
+            return response
+
+        response = Response(
+            stream(*subscriber),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+        response.call_on_close(hub.close_stream)
+        return response
+
+    # ----------------- POOL STATS (ADMIN) -----------------
+
+    @app.route("/pool_stats")
+    def pool_stats():
+        # require admin
+        if session.get("role") != "admin":
+            flash("Access denied.")
+            return redirect("/login")
+
+        # the request pool, plus the async views' DB threads
+        return jsonify(dict(pool.stats(), async_db=db_async.executor.stats()))
+
+    # ----------------- RENDER STATS (ADMIN) -----------------
+
+    @app.route("/render_stats")
+    def render_stats():
+        # require admin
+        if session.get("role") != "admin":
+            flash("Access denied.")
+            return redirect("/login")
+
+        return jsonify({"fragments": fragments.stats(), "render_ms": render_timer.stats()})
+
+    # ----------------- METRICS (ADMIN / SCRAPER) -----------------
+
+    def metrics_allowed():
+        # an admin session, or the scraper's bearer token when METRICS_TOKEN is set
+        token = os.environ.get("METRICS_TOKEN")
+        if token and request.headers.get("Authorization") == f"Bearer {token}":
+            return True
+        return session.get("role") == "admin"
+
+    @app.route("/metrics")
+    def prometheus_metrics():
+        if not metrics_allowed():
+            return Response("forbidden\n", status=403, mimetype="text/plain")
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    @app.route("/slow_queries")
+    def slow_query_log():
+        if not metrics_allowed():
+            return jsonify({"error": "admin only"}), 403
+        return jsonify({
+            "threshold_ms": SLOW_QUERY_MS,
+            "total": slow_queries.total,
+            "recent": slow_queries.recent(get_request_db()),
+        })
@@ -0,0 +1,115 @@
+# serve.py - production entry point: gunicorn worker processes, app preloaded
+# usage: python serve.py [--bind 0.0.0.0:8000] [--workers N] [--threads T] [--db path]
+#                        [--worker-class uvicorn_worker.UvicornWorker|gthread]
+#
+# the app is imported once in the master: schema check and migrations,
+# routes, and every template compiled, then forked into the workers, which
+# share those pages until they write to them. Each worker starts its own
+# background threads (app.start_background) after the fork.
+#
+# what keeps per-process state correct across workers:
+#   - fragment and dashboard-stats caches are keyed on TableVersion rows,
+#     bumped by triggers whichever process wrote
+#   - SSE events go through the EventLog table (EVENT_MODE=relay)
+#   - the backlog matcher's guarded UPDATE notices requests another worker
+#     filled or rejected, and reloads
+#   - the ingest journal is locked between processes, and a batch only
+#     applies at the stored offset
+# /metrics, /pool_stats and /render_stats report on the worker that answers.
+#
+# the default worker runs asgi.py on an event loop (needs uvicorn-worker and
+# a2wsgi): /events streams are coroutines there, so open dashboards never
+# hold a request thread, and pages run on --threads threads per worker.
+# Under --worker-class gthread every stream holds a thread; /events then
+# takes at most half of them (SSE_MAX_STREAMS) and answers 503 past that,
+# and the dashboards retry later.
+import argparse
+import multiprocessing
+import os
+import sys
+
+# must be set before the app (and events.py) is imported
+os.environ["LIFELINK_PRELOAD"] = "1"
+os.environ.setdefault("EVENT_MODE", "relay")
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    sys.exit("serve.py needs gunicorn: pip install gunicorn")
+
+import db
+
+WORKERS = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+THREADS = int(os.environ.get("WEB_THREADS", 4))   # at most db_pool.POOL_SIZE
+ASGI_WORKER = "uvicorn_worker.UvicornWorker"      # serves asgi.py
+
+
+def preload_templates(app):
+    # compile every template in the master so the workers inherit them
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+
+def post_fork(server, worker):
+    import app
+    app.start_background()
+
+
+class Server(BaseApplication):
+    def __init__(self, options, asgi=False):
+        self.options = options
+        self.asgi = asgi
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app import app
+        import db_pool
+
+        preload_templates(app)
+        # the master touched the database while importing; no connection
+        # may cross the fork
+        db_pool.pool.close_idle()
+        if self.asgi:
+            import asgi
+            return asgi.application
+        return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve LifeLink with gunicorn")
+    parser.add_argument("--bind", default="127.0.0.1:8000")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--threads", type=int, default=THREADS)
+    parser.add_argument("--worker-class", default=ASGI_WORKER)
+    parser.add_argument("--timeout", type=int, default=60)
+    parser.add_argument("--db", help="database file (default: db.DB_FILE)")
+    args = parser.parse_args()
+
+    if args.db:
+        db.DB_FILE = args.db
+    asgi_worker = args.worker_class == ASGI_WORKER
+    if asgi_worker:
+        try:
+            import a2wsgi  # noqa: F401
+            import uvicorn_worker  # noqa: F401
+        except ImportError:
+            sys.exit(f"{ASGI_WORKER} needs uvicorn-worker and a2wsgi: pip install uvicorn-worker a2wsgi "
+                     "(or --worker-class gthread)")
+        os.environ["WEB_THREADS"] = str(args.threads)
+    else:
+        # leave threads for the pages
+        os.environ.setdefault("SSE_MAX_STREAMS", str(max(args.threads // 2, 1)))
+    Server({
+        "bind": args.bind,
+        "workers": args.workers,
+        "threads": args.threads,
+        "worker_class": args.worker_class,
+        "timeout": args.timeout,
+        "preload_app": True,
+        "post_fork": post_fork,
+        "accesslog": None,
+    }, asgi_worker).run()
@@ -0,0 +1,39 @@
+// donor typeahead for <input data-donor-search="donor_id" list="...">:
+// suggestions come from /api/v1/donors/search, picking one fills the
+// hidden input named by data-donor-search (and the box with the bare name)
+document.querySelectorAll('input[data-donor-search]').forEach(input => {
+  const list = document.getElementById(input.getAttribute('list'));
+  const hidden = input.form.querySelector('input[name="' + input.dataset.donorSearch + '"]');
+  let timer = null, pending = null, choices = {};
+
+  input.addEventListener('input', () => {
+    const picked = choices[input.value];
+    hidden.value = picked ? picked.id : '';
+    clearTimeout(timer);
+    const q = input.value.trim();
+    if (picked || !q) return;
+    timer = setTimeout(() => {
+      if (pending) pending.abort();
+      pending = new AbortController();
+      fetch('/api/v1/donors/search?q=' + encodeURIComponent(q), {signal: pending.signal})
+        .then(r => r.json())
+        .then(data => {
+          list.innerHTML = '';
+          choices = {};
+          data.rows.forEach(([id, name, group, city]) => {
+            const label = name + ' — ' + group + (city ? ', ' + city : '') + ' (#' + id + ')';
+            choices[label] = {id: id, name: name};
+            const option = document.createElement('option');
+            option.value = label;
+            list.appendChild(option);
+          });
+        })
+        .catch(() => {});
+    }, 120);
+  });
+
+  input.form.addEventListener('submit', () => {
+    const picked = choices[input.value];
+    if (picked && input.name) input.value = picked.name;
+  });
+});
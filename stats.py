@@ -0,0 +1,50 @@
+import threading
+from migrations import SNAPSHOT_TABLES
+
+
+def dashboard_snapshot(conn):
+    # every counter plus the per-group stock, in one query over tiny tables
+    rows = conn.execute("""
+        SELECT 'counter', name, value FROM StatsCounter
+        UNION ALL
+        SELECT 'stock', blood_group, available_units FROM BloodStock
+    """).fetchall()
+    counters = {name: value for kind, name, value in rows if kind == "counter"}
+    stock = [(name, value) for kind, name, value in rows if kind == "stock"]
+    return {
+        "donors": counters.get("donors", 0),
+        "stock": counters.get("stock_units", 0),
+        "pending": counters.get("requests:Pending", 0) + counters.get("requests:Partially Fulfilled", 0),
+        "fulfilled": counters.get("requests:Fulfilled", 0),
+        "partial": counters.get("requests:Partially Fulfilled", 0),
+        "expired": counters.get("expired_lots", 0),
+        "chart_labels": [g for g, _ in stock],
+        "chart_values": [units for _, units in stock],
+    }
+
+
+class StatsCache:
+    # snapshot reused until StatsCounter or BloodStock changes. Their
+    # TableVersion rows are bumped by triggers, so a write made by any
+    # worker process is seen by every process's cache.
+
+    def __init__(self):
+        self._snapshot = None
+        self._key = None
+        self._lock = threading.Lock()
+
+    def get(self, conn, versions=None):
+        # `versions`: the request's TableVersion rows, when already read
+        if versions is None:
+            versions = dict(conn.execute("SELECT name, version FROM TableVersion"))
+        key = tuple(versions.get(table, 0) for table in SNAPSHOT_TABLES)
+        with self._lock:
+            if self._snapshot is not None and self._key == key:
+                return self._snapshot
+        snapshot = dashboard_snapshot(conn)
+        with self._lock:
+            self._snapshot, self._key = snapshot, key
+        return snapshot
+
+
+stats = StatsCache()
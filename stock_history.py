@@ -0,0 +1,101 @@
+# stock_history.py - per-group stock history and short-horizon forecasts,
+# read from the StockDaily/StockHourly aggregates (never the raw ledger)
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# resolution -> (aggregate table, bucket column, bucket width, bucket format)
+RESOLUTIONS = {
+    "daily": ("StockDaily", "day", timedelta(days=1), "%Y-%m-%d"),
+    "hourly": ("StockHourly", "hour", timedelta(hours=1), "%Y-%m-%d %H:00"),
+}
+MAX_PERIODS = 3660       # ten years of days
+SMOOTHING_ALPHA = 0.3    # exponential smoothing weight of the latest bucket
+MA_WINDOW = 7            # buckets in the moving average
+
+
+def buckets(resolution, periods, now=None):
+    # labels of the last `periods` buckets, oldest first (ledger times are UTC)
+    _, _, step, fmt = RESOLUTIONS[resolution]
+    now = now or datetime.utcnow()
+    return [(now - step * i).strftime(fmt) for i in range(periods - 1, -1, -1)]
+
+
+def history(conn, blood_group, resolution="daily", periods=90, now=None):
+    # dense (labels, units_in, units_out, closing) arrays; empty buckets
+    # have no flow and carry the previous closing balance forward
+    table, column, _, _ = RESOLUTIONS[resolution]
+    labels = buckets(resolution, periods, now)
+    rows = conn.execute(
+        f"SELECT {column}, units_in, units_out, closing FROM {table} "
+        f"WHERE blood_group = ? AND {column} >= ? ORDER BY {column}",
+        (blood_group, labels[0]),
+    ).fetchall()
+    before = conn.execute(
+        f"SELECT closing FROM {table} WHERE blood_group = ? AND {column} < ? ORDER BY {column} DESC LIMIT 1",
+        (blood_group, labels[0]),
+    ).fetchone()
+
+    position = {label: i for i, label in enumerate(labels)}
+    rows = [row for row in rows if row[0] in position]
+    at = np.array([position[row[0]] for row in rows], dtype=np.int64)
+    units_in = np.zeros(periods, dtype=np.int64)
+    units_out = np.zeros(periods, dtype=np.int64)
+    units_in[at] = [row[1] for row in rows]
+    units_out[at] = [row[2] for row in rows]
+
+    # forward fill: each bucket takes the closing of the latest bucket with data
+    known = np.full(periods, -1, dtype=np.int64)
+    known[at] = at
+    latest = np.maximum.accumulate(known)
+    closing_at = np.zeros(periods, dtype=np.int64)
+    closing_at[at] = [row[3] for row in rows]
+    closing = np.where(latest >= 0, closing_at[np.maximum(latest, 0)], before[0] if before else 0)
+    return labels, units_in, units_out, closing
+
+
+def smoothed(series, alpha=SMOOTHING_ALPHA):
+    # last level of simple exponential smoothing, as one dot product:
+    # level = sum(alpha * (1 - alpha)^k * x[n-1-k]) + (1 - alpha)^n * x[0]
+    if not len(series):
+        return 0.0
+    decay = (1 - alpha) ** np.arange(len(series) - 1, -1, -1)
+    level = alpha * decay @ series + (1 - alpha) ** len(series) * series[0]
+    # the weights sum to 1 only up to rounding; a steady 20/day must stay
+    # 20, not 19.999..., or periods_until_empty rounds up a bucket
+    return round(float(level), 9)
+
+
+def forecast(units_in, units_out, closing, horizon=7, alpha=SMOOTHING_ALPHA, window=MA_WINDOW):
+    # project the balance `horizon` buckets ahead from the smoothed net flow
+    rate_in, rate_out = smoothed(units_in, alpha), smoothed(units_out, alpha)
+    net = rate_in - rate_out
+    last = int(closing[-1]) if len(closing) else 0
+    projected = np.clip(last + net * np.arange(1, horizon + 1), 0, None)
+    return {
+        "method": "exponential smoothing",
+        "alpha": alpha,
+        "rate_in": round(rate_in, 2),
+        "rate_out": round(rate_out, 2),
+        "moving_average_out": round(float(units_out[-window:].mean()), 2) if len(units_out) else 0.0,
+        "projected": [round(float(units), 1) for units in projected],
+        "periods_until_empty": int(np.ceil(last / -net)) if net < 0 else None,
+    }
+
+
+def group_report(conn, blood_group, resolution="daily", periods=90, horizon=7):
+    labels, units_in, units_out, closing = history(conn, blood_group, resolution, periods)
+    _, _, step, fmt = RESOLUTIONS[resolution]
+    last = datetime.strptime(labels[-1], fmt)
+    return {
+        "history": {
+            "labels": labels,
+            "units_in": units_in.tolist(),
+            "units_out": units_out.tolist(),
+            "closing": closing.tolist(),
+        },
+        "forecast": dict(
+            forecast(units_in, units_out, closing, horizon),
+            labels=[(last + step * i).strftime(fmt) for i in range(1, horizon + 1)],
+        ),
+    }
@@ -0,0 +1,292 @@
+# synth.py - synthetic LifeLink database for load tests and benchmarks
+# usage: python synth.py [path/to/db] [--donors N] [--days D] [--seed S]
+#
+# rows go in through the normal schema, so every trigger-maintained table
+# (stock ledger, rollups, counters, search index) comes out consistent;
+# rollups.verify() checks that at the end. Every synthetic user's password
+# is SYNTH_PASSWORD, and there is one admin (admin / SYNTH_PASSWORD).
+# Scale: about 6 rows per donor across all tables (--donors 10000 .. 2000000
+# gives roughly 60k .. 12M rows).
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+import db
+from bulk_import import with_check_digit
+from inventory import SHELF_LIFE_DAYS
+
+SYNTH_PASSWORD = "password"
+CHUNK = 50_000             # rows per executemany/commit
+
+# per-donor ratios
+USERS_PER_DONOR = 0.4      # donors with a login
+DONATIONS_PER_DONOR = 2.5
+REQUESTS_PER_DONOR = 0.15
+DONORS_PER_CAMP = 400
+CAMP_SHARE = 0.4           # donations made at a camp
+REGISTERED_SHARE = 0.7     # camp donations with a CampRegistrations row
+NOTIFICATIONS_PER_DONOR = 0.001
+
+# blood groups in the Indian donor population (approximate shares)
+BLOOD_GROUP_WEIGHTS = {
+    "O+": 36.5, "B+": 32.1, "A+": 22.9, "AB+": 6.6, "O-": 0.8, "B-": 0.7, "A-": 0.3, "AB-": 0.1,
+}
+CITY_WEIGHTS = {
+    "Delhi": 18, "Mumbai": 16, "Bengaluru": 11, "Kolkata": 9, "Chennai": 9, "Hyderabad": 8, "Pune": 6,
+    "Ahmedabad": 6, "Jaipur": 4, "Lucknow": 4, "Kanpur": 3, "Nagpur": 3, "Indore": 2, "Bhopal": 2, "Patna": 2,
+    "Dehradun": 1, "Surat": 1, "Agra": 1,
+}
+FIRST_NAMES = (
+    "Aarav Vivaan Aditya Vihaan Arjun Sai Reyansh Ayaan Krishna Ishaan Shaurya Atharv Dhruv Kabir Ramesh "
+    "Suresh Mahesh Ganesh Rajesh Dinesh Mukesh Naresh Amit Sumit Rohit Mohit Vikas Vikram Rahul Sanjay Ajay "
+    "Vijay Manoj Anil Sunil Ravi Gopal Hari Mohan Karan Arun Varun Nikhil Sachin Nitin Priya Ananya Diya "
+    "Saanvi Aadhya Anika Navya Myra Sara Kiara Riya Meera Kavya Pooja Neha Sunita Anita Geeta Rekha Seema "
+    "Asha Lakshmi Deepa Ritu Swati Shreya Nisha Jyoti Komal Preeti Sneha Divya Aishwarya Fatima Zoya Imran "
+    "Farhan Salman Harpreet Gurpreet Manpreet Joseph Thomas Mary"
+).split()
+LAST_NAMES = (
+    "Sharma Verma Gupta Singh Kumar Patel Shah Mehta Joshi Reddy Rao Nair Iyer Menon Pillai Das Bose Sen "
+    "Ghosh Chatterjee Banerjee Mukherjee Roy Dutta Mishra Pandey Tiwari Dubey Yadav Chauhan Rathore Thakur "
+    "Kapoor Khanna Malhotra Chopra Arora Bhatia Sethi Anand Saxena Srivastava Agarwal Jain Bansal Goyal "
+    "Mittal Garg Sinha Prasad Khan Ahmed Siddiqui Gill Sandhu Fernandes D'Souza"
+).split()
+REQUEST_STATUS_WEIGHTS = {"Fulfilled": 70, "Partially Fulfilled": 10, "Pending": 5, "Rejected": 15}
+
+
+def weighted(rng, weights):
+    population, cum = list(weights), []
+    total = 0
+    for value in weights.values():
+        total += value
+        cum.append(total)
+    return lambda: rng.choices(population, cum_weights=cum)[0]
+
+
+def chunked(conn, sql, rows):
+    # executemany in CHUNK-sized transactions; returns the rows inserted
+    batch, count = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= CHUNK:
+            count += conn.executemany(sql, batch).rowcount
+            conn.commit()
+            batch = []
+    if batch:
+        count += conn.executemany(sql, batch).rowcount
+        conn.commit()
+    return count
+
+
+def generate(conn, donors=100_000, days=3 * 365, seed=1, today=None, log=print):
+    # fills an empty, migrated database; returns {table: rows inserted}
+    rng = random.Random(seed)
+    today = today or date.today()
+    start = today - timedelta(days=days)
+    group_of = weighted(rng, BLOOD_GROUP_WEIGHTS)
+    city_of = weighted(rng, CITY_WEIGHTS)
+    status_of = weighted(rng, REQUEST_STATUS_WEIGHTS)
+    name_of = lambda: f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    day_of = lambda: start + timedelta(days=rng.randrange(days + 1))
+    counts = {}
+
+    def step(table, count):
+        counts[table] = counts.get(table, 0) + count
+        log(f"  {table:<18} {count:>10,} rows")
+
+    # users (user_id i belongs to donor i) and one admin
+    users = int(donors * USERS_PER_DONOR)
+    step("Users", chunked(
+        conn, "INSERT INTO Users (user_id, username, password, role) VALUES (?, ?, ?, ?)",
+        ((i, f"user{i}", SYNTH_PASSWORD, "user") for i in range(1, users + 1)),
+    ))
+    conn.execute("INSERT INTO Users (username, password, role) VALUES ('admin', ?, 'admin')", (SYNTH_PASSWORD,))
+    conn.commit()
+
+    groups, cities, names = [], [], []
+    def donor_rows():
+        for i in range(1, donors + 1):
+            group, city, name = group_of(), city_of(), name_of()
+            groups.append(group)
+            cities.append(city)
+            names.append(name)
+            contact = f"9{rng.randrange(10**9):09d}"
+            aadhaar = with_check_digit(f"{2 + i // 10**10}{i % 10**10:010d}")
+            yield i, i if i <= users else None, name, group, contact, city, aadhaar
+    step("Donor", chunked(
+        conn,
+        "INSERT INTO Donor (donor_id, user_id, name, blood_group, contact, city, aadhaar) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        donor_rows(),
+    ))
+
+    # camps across the period, plus one per city today (the camp-day scenario)
+    camp_cities, camp_days = [], []
+    def camp_rows():
+        count = max(1, donors // DONORS_PER_CAMP)
+        for i in range(1, count + 1):
+            city, day = city_of(), day_of()
+            camp_cities.append(city)
+            camp_days.append(day)
+            yield i, f"{city} Camp {i}", city, day.isoformat()
+        for j, city in enumerate(CITY_WEIGHTS, start=count + 1):
+            camp_cities.append(city)
+            camp_days.append(today)
+            yield j, f"{city} Camp Day", city, today.isoformat()
+    step("Camp", chunked(conn, "INSERT INTO Camp (camp_id, camp_name, location, camp_date) VALUES (?, ?, ?, ?)",
+                         camp_rows()))
+    camps_before_today = len(camp_days) - len(CITY_WEIGHTS)
+
+    # donations, their lots and (for camp donations) registrations
+    donations = int(donors * DONATIONS_PER_DONOR)
+    registrations = []
+    def donation_rows():
+        for donation_id in range(1, donations + 1):
+            donor = rng.randrange(1, donors + 1)
+            amount = rng.choice((350, 350, 450))
+            camp_id = rng.randrange(1, camps_before_today + 1) if rng.random() < CAMP_SHARE else None
+            if camp_id:
+                day, location = camp_days[camp_id - 1], camp_cities[camp_id - 1]
+                if rng.random() < REGISTERED_SHARE:
+                    online = donor <= users
+                    registrations.append((
+                        camp_id, donor if online else None, names[donor - 1], amount,
+                        "online" if online else "admin", day.isoformat(),
+                    ))
+            else:
+                day, location = day_of(), cities[donor - 1]
+            yield (
+                donation_id, donor, amount, day.isoformat(), (day + timedelta(days=SHELF_LIFE_DAYS)).isoformat(),
+                location, camp_id,
+            )
+    step("Donation", chunked(
+        conn,
+        """
+        INSERT INTO Donation (donation_id, donor_id, amount, donation_date, expiry_date, camp_location, camp_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        donation_rows(),
+    ))
+    # (a donor gives at most once per camp: repeats are dropped)
+    step("CampRegistrations", chunked(
+        conn,
+        """
+        INSERT OR IGNORE INTO CampRegistrations (camp_id, user_id, donor_name, amount, mode, status, registered_on)
+        VALUES (?, ?, ?, ?, ?, 'Confirmed', ?)
+        """,
+        iter(registrations),
+    ))
+    registrations.clear()
+
+    # lots: everything still in date is on the shelf; older lots were mostly
+    # used, one in ten expired unused (expired through an UPDATE, like the
+    # sweeper does, so the expired-lots counter follows)
+    for low in range(0, donations, CHUNK):
+        conn.execute(
+            """
+            INSERT INTO BloodLot (donation_id, blood_group, units, remaining_units, collected_on, expiry_date)
+            SELECT d.donation_id, n.blood_group, d.amount,
+                   CASE WHEN d.expiry_date >= ? OR d.donation_id % 10 = 0 THEN d.amount ELSE 0 END,
+                   d.donation_date, d.expiry_date
+            FROM Donation d JOIN Donor n ON n.donor_id = d.donor_id
+            WHERE d.donation_id > ? AND d.donation_id <= ?
+            """,
+            (today.isoformat(), low, low + CHUNK),
+        )
+        conn.commit()
+    step("BloodLot", donations)
+    conn.execute(
+        "UPDATE BloodLot SET expired_units = remaining_units, remaining_units = 0 "
+        "WHERE expiry_date < ? AND remaining_units > 0",
+        (today.isoformat(),),
+    )
+    # stock = what is on the shelf (recorded in the ledger as one movement per group)
+    conn.executemany(
+        "INSERT OR IGNORE INTO BloodStock (blood_group, available_units) VALUES (?, 0)",
+        [(group,) for group in BLOOD_GROUP_WEIGHTS],
+    )
+    conn.execute(
+        """
+        UPDATE BloodStock SET
+            available_units = (SELECT COALESCE(SUM(remaining_units), 0) FROM BloodLot l
+                               WHERE l.blood_group = BloodStock.blood_group),
+            expiry_date = (SELECT MIN(expiry_date) FROM BloodLot l
+                           WHERE l.blood_group = BloodStock.blood_group AND remaining_units > 0)
+        """
+    )
+    conn.commit()
+
+    # recipients and their requests
+    requests = int(donors * REQUESTS_PER_DONOR)
+    recipients = max(1, int(requests * 0.7))
+    recipient_groups = [group_of() for _ in range(recipients)]
+    recipient_names = [name_of() for _ in range(recipients)]
+    step("Recipient", chunked(
+        conn, "INSERT INTO Recipient (recipient_id, name, blood_group, contact, aadhaar) VALUES (?, ?, ?, ?, ?)",
+        (
+            (i, recipient_names[i - 1], recipient_groups[i - 1], f"8{rng.randrange(10**9):09d}",
+             with_check_digit(f"9{i:010d}"))
+            for i in range(1, recipients + 1)
+        ),
+    ))
+
+    def request_rows():
+        for _ in range(requests):
+            r = rng.randrange(recipients)
+            units = rng.choice((350, 450, 700, 900))
+            status = status_of()
+            fulfilled = {"Fulfilled": units, "Partially Fulfilled": units // 2}.get(status, 0)
+            moment = f"{day_of().isoformat()} {rng.randrange(24):02d}:{rng.randrange(60):02d}:00"
+            yield recipient_names[r], recipient_groups[r], units, fulfilled, status, moment
+    step("Request", chunked(
+        conn,
+        """
+        INSERT INTO Request (recipient_name, blood_group, req_units, fulfilled_units, status, request_date)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        request_rows(),
+    ))
+
+    step("Notifications", chunked(
+        conn, "INSERT INTO Notifications (title, message, created_at) VALUES (?, ?, ?)",
+        (
+            (f"Camp update {i}", "Synthetic notification", f"{day_of().isoformat()} 09:00:00")
+            for i in range(max(1, int(donors * NOTIFICATIONS_PER_DONOR)))
+        ),
+    ))
+    return counts
+
+
+if __name__ == "__main__":
+    import rollups
+
+    parser = argparse.ArgumentParser(description="Build a synthetic LifeLink database")
+    parser.add_argument("db", nargs="?", default="synthetic.db")
+    parser.add_argument("--donors", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=3 * 365, help="history length")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--force", action="store_true", help="replace an existing file")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        if not args.force:
+            sys.exit(f"{args.db} exists (use --force to replace it)")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+
+    db.DB_FILE = args.db
+    db.init_db()
+    conn = db.get_db()
+    started = time.perf_counter()
+    counts = generate(conn, args.donors, args.days, args.seed)
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    print(f"{total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+
+    conn.execute("PRAGMA optimize")
+    problems = rollups.verify(conn)
+    if problems:
+        sys.exit(f"rollups drifted: {', '.join(problems)}")
+    print("rollups consistent")
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    # a migrated database file of its own for each test
+    path = str(tmp_path / "blood_bank.db")
+    monkeypatch.setattr(db, "DB_FILE", path)
+    db.init_db()
+    return path
+
+
+@pytest.fixture
+def client(db_file):
+    # a test client for the app on this test's database
+    import index_advisor
+
+    return index_advisor.load_app().test_client()
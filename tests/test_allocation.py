@@ -0,0 +1,79 @@
+import random
+import threading
+from datetime import date
+
+import db
+from allocation import allocate_request
+from compatibility import BLOOD_GROUPS
+from inventory import add_donation
+
+THREADS = 8
+REQUESTS_PER_THREAD = 40
+
+
+def seed_stock(conn):
+    conn.execute("INSERT INTO Donor (name, blood_group, aadhaar) VALUES ('seed', 'O-', '1')")
+    today = date.today().isoformat()
+    rnd = random.Random(7)
+    for group in BLOOD_GROUPS:
+        for _ in range(5):
+            add_donation(conn.cursor(), 1, group, rnd.randint(100, 450), today)
+    conn.commit()
+
+
+def test_concurrent_allocations_keep_stock_consistent(db_file):
+    conn = db.get_db()
+    seed_stock(conn)
+    initial = sum(units for (units,) in conn.execute("SELECT available_units FROM BloodStock"))
+
+    errors = []
+
+    def worker(seed):
+        rnd = random.Random(seed)
+        own = db.get_db()
+        try:
+            for i in range(REQUESTS_PER_THREAD):
+                allocate_request(own, f"r{seed}-{i}", rnd.choice(BLOOD_GROUPS), rnd.randint(50, 600))
+        except Exception as e:  # surfaced below; a thread's exception is otherwise lost
+            errors.append(e)
+        finally:
+            own.close()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+    requests, allocated, fulfilled = conn.execute(
+        """
+        SELECT (SELECT COUNT(*) FROM Request),
+               (SELECT COALESCE(SUM(units), 0) FROM RequestAllocation),
+               (SELECT COALESCE(SUM(fulfilled_units), 0) FROM Request)
+        """
+    ).fetchone()
+    assert requests == THREADS * REQUESTS_PER_THREAD
+
+    # stock never went negative (the CHECK would have failed the request) and
+    # nothing was handed out twice
+    assert conn.execute("SELECT MIN(available_units) FROM BloodStock").fetchone()[0] >= 0
+    assert allocated == fulfilled
+    left = conn.execute("SELECT SUM(available_units) FROM BloodStock").fetchone()[0]
+    assert initial - left == allocated
+
+    # lots were consumed by exactly what each group's stock lost
+    per_group = conn.execute(
+        """
+        SELECT s.blood_group, s.available_units,
+               (SELECT COALESCE(SUM(remaining_units), 0) FROM BloodLot l WHERE l.blood_group = s.blood_group)
+        FROM BloodStock s
+        """
+    ).fetchall()
+    for group, stock, lots in per_group:
+        assert stock == lots, group
+
+    # the dashboard counter followed every decrement
+    counter = conn.execute("SELECT value FROM StatsCounter WHERE name = 'stock_units'").fetchone()[0]
+    assert counter == left
+    conn.close()
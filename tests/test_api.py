@@ -0,0 +1,73 @@
+from datetime import date
+
+import pytest
+
+import api
+import db
+from inventory import add_donation
+
+
+@pytest.fixture
+def admin(client):
+    conn = db.get_db()
+    conn.executemany(
+        "INSERT INTO Donor (name, blood_group, city, aadhaar) VALUES (?, ?, 'Pune', ?)",
+        [("Asha", "O-", "1"), ("Ravi", "A+", "2")],
+    )
+    add_donation(conn.cursor(), 1, "O-", 450, date.today().isoformat())
+    conn.commit()
+    conn.close()
+    client.post("/signup", data={"username": "admin", "password": "pw", "role": "admin"})
+    client.post("/login", data={"username": "admin", "password": "pw"})
+    return client
+
+
+def revalidate(client, path, etag):
+    return client.get(path, headers={"If-None-Match": f'"{etag}"'})
+
+
+@pytest.mark.parametrize("path", ["/api/v1/donors", "/api/v1/donors?blood_group=O-", "/api/v1/donors/1"])
+def test_an_unchanged_resource_answers_304_without_its_query(admin, monkeypatch, path):
+    first = admin.get(path)
+    etag, _ = first.get_etag()
+    assert first.status_code == 200 and etag
+
+    def no_query(*args, **kwargs):
+        raise AssertionError("ran the query for a 304")
+
+    monkeypatch.setattr(api, "keyset_page", no_query)
+    monkeypatch.setattr(api, "get_request_db", no_query)
+    cached = revalidate(admin, path, etag)
+    assert cached.status_code == 304
+    assert cached.get_data() == b""
+    assert cached.get_etag() == (etag, False)
+
+
+def test_a_write_changes_the_etag(admin):
+    etag, _ = admin.get("/api/v1/donors").get_etag()
+    assert admin.get("/api/v1/donors?fields=name").get_etag()[0] != etag    # another slice
+
+    conn = db.get_db()
+    conn.execute("INSERT INTO Donor (name, blood_group, aadhaar) VALUES ('Mira', 'B+', '3')")
+    conn.commit()
+    conn.close()
+
+    fresh = revalidate(admin, "/api/v1/donors", etag)
+    assert fresh.status_code == 200
+    assert fresh.get_etag()[0] != etag
+    assert [row[1] for row in fresh.get_json()["rows"]] == ["Asha", "Ravi", "Mira"]
+    assert revalidate(admin, "/api/v1/donors", fresh.get_etag()[0]).status_code == 304
+
+
+def test_stock_etag_follows_allocations(admin):
+    first = admin.get("/api/v1/stock")
+    etag, _ = first.get_etag()
+    assert first.get_json()["total"] == 450
+    assert revalidate(admin, "/api/v1/stock", etag).status_code == 304
+
+    created = admin.post("/api/v1/requests", json={"recipient_name": "r", "blood_group": "AB+", "units": 100})
+    assert created.status_code == 201
+    fresh = revalidate(admin, "/api/v1/stock", etag)
+    assert fresh.status_code == 200
+    assert fresh.get_json()["total"] == 350
+    assert fresh.get_etag()[0] != etag
@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import pytest
+
+import async_views
+import db_async
+
+# role -> pages that have an async version
+PAGES = {
+    "user": ["/user_dashboard", "/notifications/unread", "/api/v1/stock"],
+    "admin": ["/admin_dashboard", "/api/v1/stock"],
+}
+
+
+@pytest.fixture
+def application(client, monkeypatch):
+    # asgi.py with ASYNC_VIEWS=1, on DB threads of this test's database
+    pytest.importorskip("a2wsgi")
+    import asgi
+
+    executor = db_async.DBExecutor(threads=2)
+    monkeypatch.setattr(db_async, "executor", executor)
+    monkeypatch.setattr(async_views, "executor", executor)
+    return asgi.Application(client.application, views=async_views.VIEWS)
+
+
+def get(application, path, cookie=None):
+    # -> (a GET through the ASGI app, to await; the messages it sends)
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    headers = [(b"host", b"localhost")] + ([(b"cookie", f"session={cookie}".encode())] if cookie else [])
+    scope = {
+        "type": "http", "method": "GET", "path": path, "query_string": b"", "headers": headers,
+        "http_version": "1.1", "root_path": "", "scheme": "http", "server": ("localhost", 80),
+    }
+    return application(scope, receive, send), sent
+
+
+def responses(client, fetch):
+    # {(role, path): (status, body)}, logged out and as each role
+    seen = {}
+    for role, paths in [(None, PAGES["user"] + PAGES["admin"]), *PAGES.items()]:
+        with client.session_transaction() as session:
+            session.clear()
+        if role:
+            client.post("/login", data={"username": role, "password": "pw"})
+        for path in paths:
+            seen[role, path] = fetch(path)
+    return seen
+
+
+def test_async_views_are_off_by_default():
+    assert not async_views.ASYNC_VIEWS
+
+
+def test_async_views_serve_what_the_sync_views_do(client, application):
+    for role in PAGES:
+        client.post("/signup", data={"username": role, "password": "pw", "role": role})
+    client.post("/login", data={"username": "user", "password": "pw"})
+    client.get("/user_dashboard")    # the first visit links a donor record
+
+    def sync(path):
+        response = client.get(path)
+        return response.status_code, response.get_data()
+
+    def through_the_loop(path):
+        cookie = client.get_cookie("session")
+        call, sent = get(application, path, cookie.value if cookie else None)
+        asyncio.run(call)
+        return sent[0]["status"], sent[1]["body"]
+
+    expected = responses(client, sync)
+    assert [status for (role, _), (status, _) in expected.items() if role] == [200] * 5
+    completed = db_async.executor.stats()["completed"]
+    assert responses(client, through_the_loop) == expected
+    assert db_async.executor.stats()["completed"] > completed
+
+
+def test_async_views_overlap_on_the_loop(client, application, monkeypatch):
+    # requests wait on the DB threads together instead of one at a time
+    client.post("/signup", data={"username": "user", "password": "pw", "role": "user"})
+    client.post("/login", data={"username": "user", "password": "pw"})
+    cookie = client.get_cookie("session").value
+
+    def slow_unread(conn, user_id):
+        time.sleep(0.2)
+        return 3
+
+    monkeypatch.setattr(async_views, "unread_count", slow_unread)
+
+    async def together():
+        calls = [get(application, "/notifications/unread", cookie) for _ in range(2)]
+        await asyncio.gather(*(call for call, _ in calls))
+        return [sent for _, sent in calls]
+
+    start = time.perf_counter()
+    sent = asyncio.run(together())
+    assert time.perf_counter() - start < 0.35
+    assert [messages[1]["body"] for messages in sent] == [b'{"unread":3}\n'] * 2
+
+
+def test_a_full_db_queue_answers_503(client, application, monkeypatch):
+    client.post("/signup", data={"username": "user", "password": "pw", "role": "user"})
+    client.post("/login", data={"username": "user", "password": "pw"})
+
+    def full(fn, *args):
+        raise db_async.Overloaded()
+
+    monkeypatch.setattr(db_async.executor, "submit", full)
+    call, sent = get(application, "/notifications/unread", client.get_cookie("session").value)
+    asyncio.run(call)
+    assert sent[0]["status"] == 503
+    assert (b"retry-after", b"1") in sent[0]["headers"]
@@ -0,0 +1,72 @@
+import io
+
+import db
+import rollups
+from bulk_import import import_stream, with_check_digit
+from migrations import BULK_DEFERRED
+
+DONORS = "\n".join([
+    "name,blood_group,contact,city,aadhaar,camp_location",
+    f"Ramesh Kumar,O+,9000000001,Pune,{with_check_digit('23456789012')},",
+    f"Sita Rao,ab-,9000000002,Delhi,{with_check_digit('23456789013')},",
+    f"Duplicate,A+,,,{with_check_digit('23456789012')},",
+    "No Aadhaar,B+,,,123,",
+    f"Anil Shah,B+,9000000003,Pune,{with_check_digit('23456789014')},",
+])
+
+DONATIONS = "\n".join([
+    "donor_aadhaar,amount,donation_date,camp_location",
+    f"{with_check_digit('23456789012')},350,2025-01-10,",
+    f"{with_check_digit('23456789012')},450,2025-03-02,",
+    f"{with_check_digit('23456789013')},350,2025-02-01,",
+    f"{with_check_digit('23456789099')},350,2025-02-01,",
+    f"{with_check_digit('23456789014')},350,2025-13-01,",
+])
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA schema_version").fetchone()[0]
+
+
+def test_import_keeps_trigger_maintained_tables_in_step(db_file):
+    conn = db.get_db()
+    before = schema_version(conn)
+    versions = dict(conn.execute("SELECT name, version FROM TableVersion"))
+
+    report = import_stream(conn, "donors", io.StringIO(DONORS), batch_size=2)
+    assert (report.rows, report.inserted, report.skipped, report.error_count) == (5, 3, 1, 1)
+    report = import_stream(conn, "donations", io.StringIO(DONATIONS), batch_size=2)
+    assert (report.rows, report.inserted, report.skipped, report.error_count) == (5, 3, 1, 1)
+
+    # the deferred triggers' work was done once per batch instead
+    assert conn.execute("SELECT value FROM StatsCounter WHERE name = 'donors'").fetchone()[0] == 3
+    assert conn.execute("SELECT rowid FROM DonorSearch WHERE DonorSearch MATCH 'ramesh'").fetchall() == [(1,)]
+    assert conn.execute("SELECT donations, units, last_donation FROM DonorRollup WHERE donor_id = 1").fetchone() == (
+        2, 800, "2025-03-02",
+    )
+    assert rollups.verify(conn) == {}
+    after = dict(conn.execute("SELECT name, version FROM TableVersion"))
+    assert after["Donor"] > versions["Donor"] and after["Donation"] > versions["Donation"]
+
+    # no DDL on the way (prepared statements stay valid), no guard left
+    # behind, and the triggers still fire for rows that come in one at a time
+    assert schema_version(conn) == before
+    assert conn.execute("SELECT COUNT(*) FROM BulkLoad").fetchone()[0] == 0
+    names = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    assert {name for name, _, _, _ in BULK_DEFERRED} <= names
+    conn.execute("INSERT INTO Donor (name, blood_group, aadhaar) VALUES ('Late Comer', 'O+', '1')")
+    conn.commit()
+    assert conn.execute("SELECT value FROM StatsCounter WHERE name = 'donors'").fetchone()[0] == 4
+    conn.close()
+
+
+def test_update_mode_reindexes_renamed_donors(db_file):
+    conn = db.get_db()
+    import_stream(conn, "donors", io.StringIO(DONORS))
+    renamed = DONORS.replace("Sita Rao", "Gita Rao")
+    report = import_stream(conn, "donors", io.StringIO(renamed), update=True)
+    assert report.inserted == 4    # three conflicts updated, the duplicate line updates again
+    assert conn.execute("SELECT COUNT(*) FROM DonorSearch WHERE DonorSearch MATCH 'sita'").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM DonorSearch WHERE DonorSearch MATCH 'gita'").fetchone()[0] == 1
+    assert conn.execute("SELECT value FROM StatsCounter WHERE name = 'donors'").fetchone()[0] == 3
+    conn.close()
@@ -0,0 +1,52 @@
+import pytest
+
+from allocation import plan_draws
+from compatibility import (
+    BLOOD_GROUPS, can_donate, donor_groups, normalize_group, preference_order, recipient_groups,
+)
+
+# recipient -> groups whose red cells it can take, from the standard chart
+CHART = {
+    "O-": {"O-"},
+    "O+": {"O-", "O+"},
+    "A-": {"O-", "A-"},
+    "A+": {"O-", "O+", "A-", "A+"},
+    "B-": {"O-", "B-"},
+    "B+": {"O-", "O+", "B-", "B+"},
+    "AB-": {"O-", "A-", "B-", "AB-"},
+    "AB+": set(BLOOD_GROUPS),
+}
+
+
+@pytest.mark.parametrize("recipient", BLOOD_GROUPS)
+def test_matrix_matches_the_chart(recipient):
+    for donor in BLOOD_GROUPS:
+        assert can_donate(donor, recipient) == (donor in CHART[recipient]), (donor, recipient)
+    assert set(donor_groups(recipient)) == CHART[recipient]
+    assert set(recipient_groups(recipient)) == {r for r in BLOOD_GROUPS if recipient in CHART[r]}
+
+
+def test_groups_are_normalised_and_unknown_ones_match_only_themselves():
+    assert normalize_group("ab +") == "AB+"
+    assert normalize_group("o-") == "O-"
+    assert can_donate("o -", "ab+")
+    assert normalize_group("Unknown") == "Unknown"
+    assert donor_groups("Unknown") == ("Unknown",)
+    assert can_donate("Unknown", "Unknown")
+    assert not can_donate("Unknown", "AB+")
+
+
+def test_substitutes_come_after_the_exact_group_most_stock_first():
+    stock = {"O-": 50, "O+": 300, "A-": 120, "A+": 80, "B+": 999}
+    assert preference_order("A+", stock) == ["A+", "O+", "A-", "O-"]
+    # no exact stock: compatible groups only, never an incompatible one
+    assert preference_order("A+", dict(stock, **{"A+": 0})) == ["O+", "A-", "O-"]
+    assert preference_order("O-", stock) == ["O-"]
+
+
+def test_draws_follow_the_substitution_order():
+    stock = {"O-": 50, "O+": 300, "A-": 120, "A+": 80}
+    assert plan_draws("A+", 450, stock) == [("A+", 80), ("O+", 300), ("A-", 70)]
+    assert plan_draws("A-", 500, stock) == [("A-", 120), ("O-", 50)]
+    assert plan_draws("B-", 10, stock) == [("O-", 10)]
+    assert plan_draws("B-", 10, dict(stock, **{"O-": 0})) == []
@@ -0,0 +1,61 @@
+import db
+from db_pool import pool
+
+
+def login_user(client):
+    client.post("/signup", data={"username": "bob", "password": "pw", "role": "user"})
+    client.post("/login", data={"username": "bob", "password": "pw"})
+    client.get("/user_dashboard")    # links a donor record
+    flashes(client)
+
+
+def flashes(client):
+    with client.session_transaction() as session:
+        return [message for _, message in session.pop("_flashes", [])]
+
+
+def registrations(conn):
+    return conn.execute("SELECT COUNT(*) FROM CampRegistrations").fetchone()[0]
+
+
+def test_second_registration_is_reported_and_rolled_back(client):
+    conn = db.get_db()
+    conn.execute("INSERT INTO Camp (camp_name, location, camp_date) VALUES ('C1', 'Pune', date('now', '+1 day'))")
+    conn.commit()
+    login_user(client)
+
+    client.post("/donate", data={"camp_id": "1", "amount": "350"})
+    assert flashes(client) == ["✅ Donation recorded successfully and camp updated!"]
+    client.post("/donate", data={"camp_id": "1", "amount": "350"})
+    assert flashes(client) == ["⚠ You already registered for this camp."]
+    assert registrations(conn) == 1
+    assert conn.execute("SELECT total_donations FROM Camp").fetchone()[0] == 1
+
+    # pooled connections came back without an open transaction
+    with pool.connection() as pooled:
+        assert not pooled.in_transaction
+    conn.close()
+
+
+def test_a_user_without_a_donor_is_not_told_they_registered(client):
+    conn = db.get_db()
+    conn.execute("INSERT INTO Camp (camp_name, location, camp_date) VALUES ('C1', 'Pune', date('now', '+1 day'))")
+    conn.commit()
+    client.post("/signup", data={"username": "ann", "password": "pw", "role": "user"})
+    client.post("/login", data={"username": "ann", "password": "pw"})
+    flashes(client)
+
+    client.post("/donate", data={"camp_id": "1", "amount": "350"})
+    assert flashes(client) == ["⚠ Donation rejected: NOT NULL constraint failed: Donation.donor_id"]
+    assert registrations(conn) == 0
+    conn.close()
+
+
+def test_other_integrity_errors_are_not_called_duplicates(client):
+    conn = db.get_db()
+    login_user(client)
+    client.post("/donate", data={"camp_id": "99", "amount": "350"})
+    [message] = flashes(client)
+    assert message.startswith("⚠ Donation rejected: FOREIGN KEY constraint failed")
+    assert registrations(conn) == 0
+    conn.close()
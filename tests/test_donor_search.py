@@ -0,0 +1,75 @@
+import pytest
+
+import db
+import donor_search
+from donor_search import edit_distance, search
+
+
+@pytest.fixture
+def conn(db_file):
+    conn = db.get_db()
+    donor_search.term_snapshot.clear()
+    yield conn
+    conn.close()
+
+
+def add_donors(conn, names):
+    conn.executemany(
+        "INSERT INTO Donor (name, blood_group, city, aadhaar) VALUES (?, 'O+', 'Pune', ?)",
+        [(name, str(i)) for i, name in enumerate(names, start=1000)],
+    )
+    conn.commit()
+
+
+def names(rows):
+    return [row[1] for row in rows]
+
+
+def test_top_k_is_the_best_ranked_not_the_first_found(conn):
+    add_donors(conn, [f"Ram Kumar Verma {i}" for i in range(30)] + ["Ram Ram"])
+    assert names(search(conn, "ram", limit=1)) == ["Ram Ram"]
+
+
+def test_prefix_distance_allows_insertions_and_deletions():
+    assert edit_distance("ramsh", "ramesh", 1, prefix=True) == 1     # letter dropped
+    assert edit_distance("rammes", "ramesh", 1, prefix=True) == 1    # letter added
+    assert edit_distance("ramsh", "ramesh", 1) == 1
+    assert edit_distance("ramsh", "rames", 1) == 2                  # as a whole word
+
+
+@pytest.mark.parametrize("typed", ["ramsh", "rammesh", "rmesh", "armesh", "ramseh", "ramsh sha"])
+def test_typos_fall_back_to_close_words(conn, typed):
+    add_donors(conn, ["Ramesh Sharma", "Suresh Patel"])
+    assert names(search(conn, typed)) == ["Ramesh Sharma"]
+
+
+def test_filtered_search_is_ranked_within_the_group_and_city(conn):
+    add_donors(conn, ["Ram Kumar Verma", "Ram Ram", "Ramesh Rao"])
+    conn.executemany(
+        "INSERT INTO Donor (name, blood_group, city, aadhaar) VALUES (?, ?, ?, ?)",
+        [("Ram Ram Ram", "A+", "Pune", "1"), ("Ram Ram Ram", "O+", "Delhi", "2")],
+    )
+    conn.commit()
+    assert names(search(conn, "ram", "O+", "Pune")) == ["Ram Ram", "Ramesh Rao", "Ram Kumar Verma"]
+    assert names(search(conn, "ram", "O+")) == ["Ram Ram Ram", "Ram Ram", "Ramesh Rao", "Ram Kumar Verma"]
+    conn.execute("UPDATE Donor SET city = 'Pune' WHERE aadhaar = '2'")
+    assert names(search(conn, "ram", "O+", "Pune", limit=1)) == ["Ram Ram Ram"]
+
+
+def test_a_broad_prefix_ranks_only_the_first_candidates(conn, monkeypatch):
+    monkeypatch.setattr(donor_search, "RANK_CANDIDATES", 5)
+    add_donors(conn, [f"Ram Kumar {i}" for i in range(20)])
+    assert len(search(conn, "ra", limit=10)) == 5
+
+
+def test_typos_are_matched_within_the_filters(conn):
+    add_donors(conn, ["Ramesh Sharma"])
+    assert names(search(conn, "ramsh", "O+", "Pune")) == ["Ramesh Sharma"]
+    assert search(conn, "ramsh", "A+", "Pune") == []
+
+
+def test_an_indexed_word_is_not_corrected(conn):
+    # "sita" is a name of its own: only the typo'd "rau" is corrected
+    add_donors(conn, ["Sita Rao", "Gita Rao"])
+    assert names(search(conn, "sita rau")) == ["Sita Rao"]
+    assert donor_search.fuzzy_query(conn, ["sita", "rau"]) == '("sita"*) AND ("rau"* OR "rao"*)'
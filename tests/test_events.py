@@ -0,0 +1,104 @@
+import asyncio
+import threading
+
+import pytest
+
+import events
+from events import EventHub, astream
+
+
+def login_as(client, role, user_id=1):
+    with client.session_transaction() as session:
+        session.update(username=role, role=role, user_id=user_id)
+
+
+def test_wait_async_wakes_on_a_publish_from_another_thread():
+    hub = EventHub()
+
+    async def main():
+        waiters = [asyncio.ensure_future(hub.wait_async(0, timeout=5)) for _ in range(100)]
+        await asyncio.sleep(0.05)
+        threading.Thread(target=hub.publish, args=("notification", {"n": 1})).start()
+        return await asyncio.wait_for(asyncio.gather(*waiters), 2)
+
+    results = asyncio.run(main())
+    assert all(reset is False and [event[0] for event in batch] == [1] for batch, reset in results)
+
+
+def test_wait_async_times_out_without_events():
+    hub = EventHub()
+    assert asyncio.run(hub.wait_async(0, timeout=0.05)) == ([], False)
+
+
+def test_astream_filters_topics_and_recipients():
+    hub = EventHub()
+    hub.publish("stock", {"blood_group": "O+"})
+    hub.publish("notification", {"title": "for 2"}, recipients=frozenset({2}))
+    hub.publish("notification", {"title": "for all"})
+
+    async def frames():
+        gen = astream(0, events.TOPICS["user"], 1, hub)
+        try:
+            return [await gen.__anext__(), await gen.__anext__()]
+        finally:
+            await gen.aclose()
+
+    retry, text = asyncio.run(frames())
+    assert retry == "retry: 3000\n\n"
+    assert text == 'id: 3\nevent: notification\ndata: {"title":"for all"}\n\n'
+
+
+def test_events_past_the_cap_get_503(client, monkeypatch):
+    assert client.get("/events").status_code == 401
+    login_as(client, "admin")
+    monkeypatch.setattr(events.hub, "streams", events.SSE_MAX_STREAMS)
+    response = client.get("/events")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(events.SSE_RETRY_AFTER)
+
+    monkeypatch.setattr(events.hub, "streams", 0)
+    response = client.get("/events")
+    assert response.status_code == 200
+    assert events.hub.streams == 1
+    response.close()
+    assert events.hub.streams == 0
+
+
+def test_asgi_streams_events_until_the_client_leaves(client):
+    pytest.importorskip("a2wsgi")
+    import asgi
+
+    login_as(client, "admin")
+    cookie = client.get_cookie("session").value
+    app = asgi.Application(client.application)
+
+    async def call(headers):
+        sent, leave = [], asyncio.Event()
+
+        async def receive():
+            await leave.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if message.get("body", b"").startswith(b"id:"):
+                leave.set()
+
+        scope = {
+            "type": "http", "method": "GET", "path": "/events", "query_string": b"", "headers": headers,
+            "http_version": "1.1", "root_path": "",
+        }
+        task = asyncio.ensure_future(app(scope, receive, send))
+        await asyncio.sleep(0.05)
+        events.hub.publish("notification", {"title": "t"})
+        await asyncio.wait_for(task, 2)
+        return sent
+
+    sent = asyncio.run(call([]))
+    assert sent[0]["status"] == 401
+
+    sent = asyncio.run(call([(b"cookie", f"session={cookie}".encode())]))
+    assert sent[0]["status"] == 200
+    bodies = [message["body"] for message in sent[1:]]
+    assert bodies[0] == b"retry: 3000\n\n"
+    assert b'event: notification\ndata: {"title":"t"}' in bodies[1]
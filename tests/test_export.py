@@ -0,0 +1,97 @@
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import db
+import export
+from inventory import add_donation
+
+EXPORT_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "export.py")
+
+
+@pytest.fixture
+def conn(db_file):
+    conn = db.get_db()
+    conn.execute("INSERT INTO Donor (name, blood_group, aadhaar) VALUES ('Ramesh', 'O+', '1')")
+    conn.execute("INSERT INTO Donor (name, blood_group, aadhaar) VALUES ('Sita', 'AB-', '2')")
+    for i in range(25):
+        add_donation(conn.cursor(), 1 + i % 2, "O+" if i % 2 == 0 else "AB-", 300 + i, f"2025-01-{1 + i:02d}")
+    statuses = ("Pending", "Fulfilled", "Partially Fulfilled")
+    conn.executemany(
+        "INSERT INTO Request (recipient_name, blood_group, req_units, fulfilled_units, status, request_date) "
+        "VALUES (?, 'O+', 450, 0, ?, '2025-02-01')",
+        [(f"r{i}", statuses[i % 3]) for i in range(30)],
+    )
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def export_text(conn, kind, filters, fmt):
+    out = io.StringIO()
+    rows = export.export_to(conn, kind, filters, out, fmt)
+    return rows, out.getvalue()
+
+
+def test_formats_carry_the_same_rows(conn):
+    filters = {"blood_group": "o+", "date_from": "2025-01-05"}
+    rows, text = export_text(conn, "donations", filters, "csv")
+    table = list(csv.reader(io.StringIO(text)))
+    header, body = table[0], table[1:]
+    assert rows == len(body) == 11
+    expected = [dict(zip(header, row)) for row in body]
+
+    _, text = export_text(conn, "donations", filters, "jsonl")
+    assert [{k: str(v) if v is not None else "" for k, v in json.loads(line).items()} for line in text.splitlines()] == expected
+
+    # columns: a fields line, then one line of columns per fetched batch
+    _, text = export_text(conn, "donations", filters, "columns")
+    lines = [json.loads(line) for line in text.splitlines()]
+    assert lines[0] == {"fields": header}
+    columns = lines[1]["columns"]
+    assert lines[1]["rows"] == 11 and len(lines) == 2
+    assert [dict(zip(header, (str(v) if v is not None else "" for v in row))) for row in zip(*columns)] == expected
+
+
+def test_columns_batches_follow_fetch_size(conn):
+    chunks = list(export.iter_chunks(conn, "requests", {}, "columns", size=7))
+    assert [count for _, count in chunks] == [7, 7, 7, 7, 2]
+    lines = [json.loads(line) for text, _ in chunks for line in text.splitlines()]
+    assert [line.get("rows") for line in lines[1:]] == [7, 7, 7, 7, 2]
+
+
+def test_parquet_round_trip(conn, monkeypatch):
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.parquet
+
+    monkeypatch.setattr(export, "ROW_GROUP_SIZE", 8)
+    chunks = list(export.iter_chunks(conn, "requests", {"status": "Pending"}, "parquet", size=3))
+    assert all(isinstance(chunk, bytes) for chunk, _ in chunks)
+    assert sum(count for _, count in chunks) == 10
+    parquet = pyarrow.parquet.ParquetFile(pyarrow.BufferReader(b"".join(chunk for chunk, _ in chunks)))
+    assert parquet.metadata.num_row_groups == 2
+    table = parquet.read()
+    assert table.column("status").to_pylist() == ["Pending"] * 10
+    assert table.schema.field("req_units").type == pyarrow.int64()
+    assert table.column("request_id").to_pylist() == list(range(1, 31, 3))
+
+
+def test_cli_status_filter(conn, db_file):
+    result = subprocess.run(
+        [sys.executable, EXPORT_PY, "requests", "--status", "Fulfilled", "--format", "jsonl"],
+        cwd=os.path.dirname(db_file), capture_output=True, text=True, check=True,
+    )
+    statuses = {json.loads(line)["status"] for line in result.stdout.splitlines()}
+    assert statuses == {"Fulfilled"}
+    assert result.stderr.startswith("10 rows")
+
+    result = subprocess.run(
+        [sys.executable, EXPORT_PY, "donations", "--status", "Pending"],
+        cwd=os.path.dirname(db_file), capture_output=True, text=True,
+    )
+    assert result.returncode == 2 and "--status does not apply" in result.stderr
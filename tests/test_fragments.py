@@ -0,0 +1,9 @@
+import os
+import stat
+
+
+def test_bytecode_cache_directory_is_private(client):
+    directory = client.application.jinja_env.bytecode_cache.directory
+    info = os.stat(directory)
+    assert info.st_uid == os.getuid()
+    assert stat.S_IMODE(info.st_mode) == 0o700
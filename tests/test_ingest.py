@@ -0,0 +1,84 @@
+import sqlite3
+
+import pytest
+
+import db
+import ingest
+from ingest import Journal, applied_offset, replay
+
+
+@pytest.fixture
+def conn(db_file):
+    conn = db.get_db()
+    conn.execute("INSERT INTO Donor (name, blood_group, aadhaar) VALUES ('Asha', 'O-', '1')")
+    conn.execute("INSERT INTO Camp (camp_name, location, camp_date) VALUES ('C1', 'Pune', date('now'))")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = Journal(str(tmp_path / "journal.jsonl"))
+    yield journal
+    journal.close()
+
+
+def walk_in(journal, n):
+    for i in range(n):
+        journal.append("walk_in", camp_id=1, donor_name="Asha", amount=350, donation_date="2025-01-01")
+
+
+def donations(conn):
+    return conn.execute("SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM Donation").fetchone()
+
+
+def test_replay_after_a_crash_applies_each_event_once(conn, journal, monkeypatch):
+    walk_in(journal, 5)
+
+    # the process dies with the batch written but not committed
+    def crash(conn, offset):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    with monkeypatch.context() as m:
+        m.setattr(ingest, "set_offset", crash)
+        with pytest.raises(sqlite3.OperationalError):
+            replay(conn, journal, batch=2)
+    assert donations(conn) == (0, 0)
+
+    # restarted: everything once, and nothing on a second replay
+    reopened = Journal(journal.path)
+    assert replay(conn, reopened, batch=2) == 5
+    assert donations(conn) == (5, 1750)
+    assert replay(conn, reopened) == 0
+    assert donations(conn) == (5, 1750)
+    reopened.close()
+
+
+def test_a_torn_final_line_is_cut_and_never_applied(conn, journal):
+    walk_in(journal, 2)
+    with open(journal.path, "ab") as f:
+        f.write(b'{"type":"walk_in","camp_id":1,"donor_na')
+    assert len(journal.read(0)[0]) == 2     # a partial line is not read
+
+    reopened = Journal(journal.path)      # what a restart does
+    with open(journal.path, "rb") as f:
+        assert f.read().endswith(b"}\n")
+    walk_in(reopened, 1)
+    assert replay(conn, reopened) == 3
+    assert donations(conn) == (3, 1050)
+    reopened.close()
+
+
+def test_malformed_events_are_skipped(conn, journal):
+    walk_in(journal, 1)
+    with open(journal.path, "ab") as f:
+        f.write(b'[]\n1\n"walk_in"\nnot json\n{"type":"refund"}\n')
+    journal.append("walk_in", camp_id=1, donor_name="Asha", amount="abc", donation_date="2025-01-01")
+    journal.append("walk_in", camp_id=1, donor_name="Asha", bogus=1)
+    walk_in(journal, 1)
+
+    events, end = journal.read(0)
+    assert ingest.apply_batch(conn, events, end) == ({"O-"}, 7)
+    assert donations(conn) == (2, 700)
+    assert applied_offset(conn) == end
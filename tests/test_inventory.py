@@ -0,0 +1,62 @@
+import pytest
+
+import db
+from ingest import register_walk_in
+from inventory import add_donation, positive_units
+
+
+def login_as(client, role, user_id=1):
+    with client.session_transaction() as session:
+        session.update(username=role, role=role, user_id=user_id)
+
+
+def counts(conn):
+    return [conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("Donation", "BloodLot", "CampRegistrations")]
+
+
+@pytest.mark.parametrize("value, units", [("350", 350), (" 450 ", 450), (300, 300), (250.0, 250)])
+def test_positive_units_accepts_whole_positive_numbers(value, units):
+    assert positive_units(value) == units
+
+
+@pytest.mark.parametrize("value", ["abc", "", None, "3.5", 3.5, 0, "-100", True, [350]])
+def test_positive_units_rejects_the_rest(value):
+    with pytest.raises(ValueError):
+        positive_units(value)
+
+
+def test_a_text_amount_never_becomes_a_lot(db_file):
+    conn = db.get_db()
+    conn.execute("INSERT INTO Donor (name, blood_group, aadhaar) VALUES ('Asha', 'O-', '1')")
+    conn.execute("INSERT INTO Camp (camp_name, location, camp_date) VALUES ('C1', 'Pune', date('now'))")
+    with pytest.raises(ValueError):
+        add_donation(conn.cursor(), 1, "O-", "abc", "2025-01-01")
+    # a journal walk-in goes through the same check, before its registration row
+    with pytest.raises(ValueError):
+        register_walk_in(conn.cursor(), 1, "Asha", "abc", "2025-01-01")
+    assert counts(conn) == [0, 0, 0]
+    conn.close()
+
+
+@pytest.mark.parametrize("role, path, form", [
+    ("admin", "/record_donation", {"donor_id": "1", "camp_id": "1"}),
+    ("admin", "/camp_register_admin", {"camp_id": "1", "donor_name": "Asha"}),
+    ("user", "/donate", {"camp_id": "1"}),
+])
+@pytest.mark.parametrize("amount", ["abc", "-5", "2.5"])
+def test_bad_amounts_are_a_400(client, role, path, form, amount):
+    conn = db.get_db()
+    conn.execute("INSERT INTO Users (user_id, username, password, role) VALUES (1, 'user', 'pw', 'user')")
+    conn.execute("INSERT INTO Donor (user_id, name, blood_group, aadhaar) VALUES (1, 'Asha', 'O-', '1')")
+    conn.execute("INSERT INTO Camp (camp_name, location, camp_date) VALUES ('C1', 'Pune', date('now'))")
+    conn.commit()
+    login_as(client, role)
+
+    response = client.post(path, data={**form, "amount": amount})
+    assert response.status_code == 400
+    assert counts(conn) == [0, 0, 0]
+
+    client.post(path, data={**form, "amount": "350"})
+    assert counts(conn)[0] == 1
+    conn.close()
@@ -0,0 +1,27 @@
+import db
+import migrations
+
+
+def test_camp_dates_are_normalised_in_ranges(db_file, monkeypatch):
+    monkeypatch.setattr(migrations, "BACKFILL_BATCH", 2)
+    monkeypatch.setattr(migrations, "BACKFILL_YIELD", 0)
+    conn = db.get_db()
+    conn.execute("PRAGMA user_version = 1")
+    dates = ["2025-03-01T10:00", "2025-03-02", "2025-03-03 09:30:00", "soon", "2025-03-05T08:00:00Z"]
+    conn.executemany(
+        "INSERT INTO Camp (camp_name, location, camp_date) VALUES (?, 'Pune', ?)",
+        [(f"C{i}", date) for i, date in enumerate(dates)],
+    )
+    conn.commit()
+
+    (number, _, statements, backfills), = migrations.plan(conn, target=2)
+    assert (number, statements, backfills) == (2, 0, [("Camp", 5, 0)])
+
+    ranges = []
+    migrations.apply_migrations(conn, target=2, report=lambda number, table, hi, top: ranges.append((table, hi)))
+    assert ranges == [("Camp", 2), ("Camp", 4), ("Camp", 5)]
+    assert [date for (date,) in conn.execute("SELECT camp_date FROM Camp ORDER BY camp_id")] == [
+        "2025-03-01", "2025-03-02", "2025-03-03", "soon", "2025-03-05",
+    ]
+    assert migrations.current_version(conn) == 2
+    conn.close()
@@ -0,0 +1,80 @@
+import pytest
+
+import db
+from notifications import feed, last_seen, mark_read, send, unread_count
+
+
+@pytest.fixture
+def conn(db_file):
+    # user 1 is an O- donor in Pune, user 2 an A+ donor in Delhi
+    conn = db.get_db()
+    conn.executemany(
+        "INSERT INTO Users (user_id, username, password, role) VALUES (?, ?, 'pw', 'user')",
+        [(1, "asha"), (2, "ravi")],
+    )
+    conn.executemany(
+        "INSERT INTO Donor (name, blood_group, city, aadhaar, user_id) VALUES (?, ?, ?, ?, ?)",
+        [("Asha", "O-", "Pune", "1", 1), ("Ravi", "A+", "Delhi", "2", 2)],
+    )
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def unread(conn):
+    return unread_count(conn, 1), unread_count(conn, 2)
+
+
+def test_unread_counts_broadcasts_and_own_targeted_notifications(conn):
+    assert unread(conn) == (0, 0)
+    send(conn, "Drive", "Saturday")
+    assert unread(conn) == (1, 1)
+
+    _, _, audience, delivered = send(conn, "Urgent", "O- needed", blood_group="O-")
+    assert (audience, delivered) == ("O- donors", 1)
+    _, _, audience, delivered = send(conn, "Local", "Pune camp", city="Pune")
+    assert (audience, delivered) == ("users in Pune", 1)
+    assert unread(conn) == (3, 1)
+    assert send(conn, "Nobody", "", blood_group="B-")[3] == 0
+    assert unread(conn) == (3, 1)
+    conn.commit()
+
+    assert [row[0] for row in feed(conn, 1)] == ["Local", "Urgent", "Drive"]
+    assert [row[0] for row in feed(conn, 2)] == ["Drive"]
+
+
+def test_mark_read_moves_only_that_users_cursor(conn):
+    send(conn, "Drive", "Saturday")
+    latest = send(conn, "Urgent", "O- needed", blood_group="O-")[0]
+    mark_read(conn, 1)
+    conn.commit()
+    assert unread(conn) == (0, 1)
+    assert last_seen(conn, 1) == latest
+    assert last_seen(conn, 2) == 0
+
+    # only what arrives after the cursor counts; reading again is a no-op
+    send(conn, "Later", "Sunday")
+    send(conn, "Ravi only", "A+ needed", blood_group="A+")
+    assert unread(conn) == (1, 3)
+    mark_read(conn, 1)
+    mark_read(conn, 1)
+    mark_read(conn, 2)
+    conn.commit()
+    assert unread(conn) == (0, 0)
+    send(conn, "Urgent again", "O- needed", blood_group="O-")
+    assert unread(conn) == (1, 0)
+
+
+def test_read_and_unread_routes(client):
+    client.post("/signup", data={"username": "user", "password": "pw", "role": "user"})
+    client.post("/login", data={"username": "user", "password": "pw"})
+    conn = db.get_db()
+    send(conn, "Drive", "Saturday")
+    send(conn, "Camp", "Sunday")
+    conn.commit()
+    conn.close()
+
+    assert client.get("/notifications/unread").get_json() == {"unread": 2}
+    read = client.post("/notifications/read", headers={"Accept": "application/json"})
+    assert read.get_json() == {"unread": 0}
+    assert client.get("/notifications/unread").get_json() == {"unread": 0}
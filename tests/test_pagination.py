@@ -0,0 +1,75 @@
+import sqlite3
+from urllib.parse import urlencode
+
+import pytest
+from flask import Flask
+
+from pagination import keyset_page
+
+app = Flask(__name__)
+CLAUSES = ["grp = ?"]
+
+
+@pytest.fixture
+def cur():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE Item (item_id INTEGER PRIMARY KEY, grp TEXT)")
+    conn.executemany("INSERT INTO Item VALUES (?, ?)", [(i, "odd" if i % 2 else "even") for i in range(1, 21)])
+    yield conn.cursor()
+    conn.close()
+
+
+def page(cur, descending=False, grp=None, **args):
+    # -> (ids on the page, next cursor, prev cursor)
+    with app.test_request_context("/?" + urlencode(args)):
+        result = keyset_page(
+            cur, "SELECT item_id FROM Item", "item_id",
+            CLAUSES if grp else (), [grp] if grp else (), descending=descending,
+        )
+    return [row[0] for row in result["rows"]], result["next"], result["prev"]
+
+
+def test_pages_that_end_exactly_on_the_last_row(cur):
+    # 10 odd ids in pages of 5: no empty third page, no prev on the first
+    assert page(cur, grp="odd", size=5) == ([1, 3, 5, 7, 9], 9, None)
+    assert page(cur, grp="odd", size=5, after=9) == ([11, 13, 15, 17, 19], None, 11)
+    assert page(cur, grp="odd", size=5, before=11) == ([1, 3, 5, 7, 9], 9, None)
+
+
+def test_descending_pages_and_their_boundaries(cur):
+    assert page(cur, descending=True, grp="even", size=4) == ([20, 18, 16, 14], 14, None)
+    assert page(cur, descending=True, grp="even", size=4, after=14) == ([12, 10, 8, 6], 6, 12)
+    assert page(cur, descending=True, grp="even", size=4, after=6) == ([4, 2], None, 4)
+    assert page(cur, descending=True, grp="even", size=4, before=4) == ([12, 10, 8, 6], 6, 12)
+    assert page(cur, descending=True, grp="even", size=4, before=12) == ([20, 18, 16, 14], 14, None)
+
+
+def test_cursors_past_either_end(cur):
+    assert page(cur, size=5, after=20) == ([], None, None)
+    assert page(cur, size=5, before=1) == ([], None, None)
+    assert page(cur, size=5, after="x") == ([1, 2, 3, 4, 5], 5, None)     # not a cursor: first page
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("grp", [None, "odd"])
+@pytest.mark.parametrize("size", [1, 3, 4, 7, 10, 25])
+def test_walking_forward_and_back_visits_every_row_once(cur, descending, grp, size):
+    expected = [i for i in range(1, 21) if grp is None or i % 2]
+    if descending:
+        expected.reverse()
+
+    forward, args = [], {"size": size}
+    while True:
+        ids, next_id, prev_id = page(cur, descending, grp, **args)
+        forward.append(ids)
+        if next_id is None:
+            break
+        args = {"size": size, "after": next_id}
+    assert sum(forward, []) == expected
+    assert all(len(ids) == size for ids in forward[:-1])
+
+    backward = [ids]
+    while prev_id is not None:
+        ids, _, prev_id = page(cur, descending, grp, size=size, before=prev_id)
+        backward.append(ids)
+    assert backward[::-1] == forward
@@ -0,0 +1,51 @@
+import json
+import logging
+
+import profiling
+from profiling import slow_queries
+
+
+class Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(record.getMessage())
+
+
+def test_slow_queries_keep_parameter_types_not_values(client, monkeypatch):
+    collect = Collect()
+    monkeypatch.setattr(profiling.log, "handlers", [collect])
+    monkeypatch.setattr(profiling, "SLOW_QUERY_MS", 0)
+    monkeypatch.setattr(slow_queries, "_recent", type(slow_queries._recent)(maxlen=1000))
+
+    client.post("/signup", data={"username": "bob", "password": "hunter2-secret", "role": "user"})
+    client.post("/login", data={"username": "bob", "password": "hunter2-secret"})
+
+    assert collect.lines
+    assert not any("hunter2" in line for line in collect.lines)
+    entries = slow_queries.recent()
+    assert not any("hunter2" in json.dumps(entry) for entry in entries)
+    login = next(entry for entry in entries if entry["sql"] == "SELECT * FROM Users WHERE username=? AND password=?")
+    assert login["params"] == ["str", "str"]
+    # nothing explained on the request's own thread
+    assert all("plan" not in entry for entry in entries)
+
+
+def test_slow_query_plans_are_explained_when_served(client, monkeypatch):
+    monkeypatch.setattr(profiling.log, "handlers", [Collect()])
+    monkeypatch.setattr(slow_queries, "_recent", type(slow_queries._recent)(maxlen=10))
+    with client.session_transaction() as session:
+        session.update(username="admin", role="admin", user_id=1)
+
+    import db
+    conn = db.get_db(factory=profiling.TracedConnection)
+    monkeypatch.setattr(profiling, "SLOW_QUERY_MS", 0)
+    conn.execute("SELECT username FROM Users WHERE user_id = ?", (1,)).fetchall()
+    monkeypatch.setattr(profiling, "SLOW_QUERY_MS", 1e9)
+    conn.close()
+
+    entry = client.get("/slow_queries").get_json()["recent"][0]
+    assert entry["params"] == ["int"]
+    assert any("Users USING INTEGER PRIMARY KEY" in step for step in entry["plan"])
@@ -0,0 +1,38 @@
+import pytest
+
+import db
+import index_advisor
+
+
+@pytest.fixture(scope="module")
+def walked(tmp_path_factory):
+    # every page and API endpoint in index_advisor.VISITS, run once against
+    # a seeded database; yields the statements they executed
+    saved = db.DB_FILE
+    index_advisor.seed(str(tmp_path_factory.mktemp("plans") / "plans.db"))
+    statements, failures = index_advisor.walk(index_advisor.load_app())
+    conn = db.get_db()
+    yield conn, statements, failures
+    conn.close()
+    db.DB_FILE = saved
+
+
+def test_walk_reaches_every_route(walked):
+    conn, statements, failures = walked
+    assert failures == []
+    # the allocation, notification and search paths all ran
+    assert any(sql.startswith("INSERT INTO Request ") for sql in statements)
+    assert any(sql.startswith("INSERT INTO NotificationInbox") for sql in statements)
+    assert any("DonorSearch MATCH" in sql for sql in statements)
+
+
+def test_no_full_scans_of_large_tables(walked):
+    conn, statements, failures = walked
+    problems = index_advisor.check(conn, statements)
+    assert problems == {}, "\n".join(f"{'; '.join(scans)}: {sql}" for sql, scans in problems.items())
+
+
+def test_check_flags_an_unindexed_filter(walked):
+    conn, statements, failures = walked
+    sql = "SELECT * FROM Donation WHERE amount = ?"
+    assert index_advisor.check(conn, {sql: (350,)}) == {sql: ["SCAN Donation"]}
@@ -0,0 +1,68 @@
+import pytest
+
+import db
+import rollups
+from inventory import add_donation
+
+
+@pytest.fixture
+def conn(db_file):
+    conn = db.get_db()
+    conn.executemany(
+        "INSERT INTO Donor (name, blood_group, aadhaar) VALUES (?, ?, ?)",
+        [("Asha", "O+", "1"), ("Ravi", "A-", "2")],
+    )
+    conn.execute("INSERT INTO Camp (camp_name, location, camp_date) VALUES ('Drive', 'Pune', '2026-01-05')")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def totals(conn):
+    return (
+        conn.execute("SELECT total_donations, total_units FROM Camp").fetchone(),
+        conn.execute("SELECT donor_id, donations, units, last_donation FROM DonorRollup ORDER BY donor_id").fetchall(),
+        conn.execute("SELECT blood_group, day, donations, units FROM GroupDailyRollup ORDER BY 1, 2").fetchall(),
+    )
+
+
+def test_rollups_follow_donation_inserts_and_deletes(conn):
+    cur = conn.cursor()
+    first = add_donation(cur, 1, "O+", 450, "2026-01-05", "Pune", 1)
+    add_donation(cur, 1, "O+", 350, "2026-01-01")
+    last = add_donation(cur, 2, "A-", 300, "2026-01-05", "Pune", 1)
+    conn.commit()
+
+    assert totals(conn) == (
+        (2, 750),
+        [(1, 2, 800, "2026-01-05"), (2, 1, 300, "2026-01-05")],
+        [("A-", "2026-01-05", 1, 300), ("O+", "2026-01-01", 1, 350), ("O+", "2026-01-05", 1, 450)],
+    )
+    assert rollups.verify(conn) == {}
+
+    # the lot goes with its donation, and the group/day rollup with the lot
+    conn.execute("DELETE FROM Donation WHERE donation_id IN (?, ?)", (first, last))
+    conn.commit()
+    camp, donors, groups = totals(conn)
+    assert camp == (0, 0)
+    assert donors[0] == (1, 1, 350, "2026-01-01")     # last_donation re-read
+    assert donors[1][1:3] == (0, 0)
+    assert [row for row in groups if row[2]] == [("O+", "2026-01-01", 1, 350)]
+    assert rollups.verify(conn) == {}
+
+
+def test_verify_reports_drift_and_repair_rebuilds(conn):
+    add_donation(conn.cursor(), 1, "O+", 450, "2026-01-05", "Pune", 1)
+    conn.commit()
+    conn.execute("UPDATE Camp SET total_units = 999")
+    conn.execute("UPDATE DonorRollup SET donations = 5")
+    conn.commit()
+
+    problems = rollups.verify(conn)
+    assert problems == {
+        "camp": [((1,), (1, 999), (1, 450))],
+        "donor": [((1,), (5, 450, "2026-01-05"), (1, 450, "2026-01-05"))],
+    }
+    rollups.repair(conn, problems)
+    assert rollups.verify(conn) == {}
+    assert totals(conn)[0] == (1, 450)
@@ -0,0 +1,125 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+import db
+from allocation import allocate_request
+from inventory import add_donation, expire_lots
+from stock_history import forecast, history
+
+
+@pytest.fixture
+def conn(db_file):
+    conn = db.get_db()
+    conn.execute("INSERT INTO Donor (name, blood_group, aadhaar) VALUES ('seed', 'O-', '1')")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def stock(conn):
+    return dict(conn.execute("SELECT blood_group, available_units FROM BloodStock"))
+
+
+def ledger(conn, table):
+    # {group: (units in - units out, latest closing)} from an aggregate table
+    column = "hour" if table == "StockHourly" else "day"
+    return {
+        group: (net, closing)
+        for group, net, closing in conn.execute(
+            f"""
+            SELECT blood_group, SUM(units_in) - SUM(units_out),
+                   (SELECT closing FROM {table} t WHERE t.blood_group = a.blood_group ORDER BY {column} DESC LIMIT 1)
+            FROM {table} a GROUP BY blood_group
+            """
+        )
+    }
+
+
+def test_ledger_totals_follow_blood_stock(conn):
+    today = date.today().isoformat()
+    stale = (date.today() - timedelta(days=60)).isoformat()
+    cur = conn.cursor()
+    add_donation(cur, 1, "O-", 450, today)
+    add_donation(cur, 1, "O-", 350, today)
+    add_donation(cur, 1, "A+", 300, today)
+    add_donation(cur, 1, "B+", 200, stale)    # already past its shelf life
+    conn.commit()
+
+    allocate_request(conn, "r1", "A+", 500)   # 300 A+, then 200 O-
+    allocate_request(conn, "r2", "O-", 100)
+    conn.execute("BEGIN IMMEDIATE")
+    assert expire_lots(conn, ["B+"]) == 1
+    conn.commit()
+
+    assert stock(conn) == {"O-": 500, "A+": 0, "B+": 0}
+    movements = dict(conn.execute("SELECT blood_group, SUM(delta) FROM StockMovement GROUP BY blood_group"))
+    assert movements == stock(conn)
+    # every movement's balance is the stock level right after it
+    last = conn.execute(
+        "SELECT blood_group, balance FROM StockMovement WHERE movement_id IN "
+        "(SELECT MAX(movement_id) FROM StockMovement GROUP BY blood_group)"
+    )
+    assert dict(last) == stock(conn)
+
+    expected = {group: (units, units) for group, units in stock(conn).items()}
+    assert ledger(conn, "StockHourly") == expected
+    assert ledger(conn, "StockDaily") == expected
+    units_in, units_out = conn.execute(
+        "SELECT units_in, units_out FROM StockDaily WHERE blood_group = 'O-'"
+    ).fetchone()
+    assert (units_in, units_out) == (800, 300)
+
+
+def test_unchanged_stock_writes_no_movement(conn):
+    add_donation(conn.cursor(), 1, "O-", 450, date.today().isoformat())
+    conn.commit()
+    before = conn.execute("SELECT COUNT(*) FROM StockMovement").fetchone()[0]
+    conn.execute("UPDATE BloodStock SET available_units = available_units WHERE blood_group = 'O-'")
+    conn.execute("UPDATE BloodStock SET expiry_date = NULL WHERE blood_group = 'O-'")
+    assert conn.execute("SELECT COUNT(*) FROM StockMovement").fetchone()[0] == before
+
+
+def test_history_matches_the_ledger(conn):
+    add_donation(conn.cursor(), 1, "O-", 450, date.today().isoformat())
+    conn.commit()
+    allocate_request(conn, "r1", "O-", 150)
+
+    labels, units_in, units_out, closing = history(conn, "O-", periods=3)
+    assert labels[-1] == datetime.utcnow().strftime("%Y-%m-%d")
+    assert units_in.tolist() == [0, 0, 450]
+    assert units_out.tolist() == [0, 0, 150]
+    assert closing[-1] == stock(conn)["O-"] == 300
+
+    _, hourly_in, hourly_out, hourly_closing = history(conn, "O-", "hourly", periods=2)
+    assert (hourly_in.sum(), hourly_out.sum(), hourly_closing[-1]) == (450, 150, 300)
+
+
+def test_history_carries_the_closing_balance_over_empty_days(conn):
+    conn.executemany(
+        "INSERT INTO StockDaily (blood_group, day, units_in, units_out, closing) VALUES ('O-', ?, ?, ?, ?)",
+        [("2026-01-01", 100, 0, 100), ("2026-01-03", 50, 20, 130), ("2026-01-06", 0, 30, 100)],
+    )
+    now = datetime(2026, 1, 7)
+    labels, units_in, units_out, closing = history(conn, "O-", periods=6, now=now)
+    assert labels == ["2026-01-02", "2026-01-03", "2026-01-04", "2026-01-05", "2026-01-06", "2026-01-07"]
+    assert units_in.tolist() == [0, 50, 0, 0, 0, 0]
+    assert units_out.tolist() == [0, 20, 0, 0, 30, 0]
+    # the first day takes the balance from before the window
+    assert closing.tolist() == [100, 130, 130, 130, 100, 100]
+
+
+def test_forecast_projects_the_smoothed_net_flow():
+    units_in = np.zeros(10, dtype=np.int64)
+    units_out = np.full(10, 20, dtype=np.int64)
+    closing = np.arange(300, 100, -20)
+    result = forecast(units_in, units_out, closing, horizon=3)
+    assert result["rate_out"] == 20.0
+    assert result["moving_average_out"] == 20.0
+    assert result["projected"] == [100.0, 80.0, 60.0]
+    assert result["periods_until_empty"] == 6
+
+    steady = forecast(units_out, units_out, closing, horizon=2)
+    assert steady["projected"] == [120.0, 120.0]
+    assert steady["periods_until_empty"] is None